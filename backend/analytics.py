@@ -0,0 +1,199 @@
+# analytics.py — 投資組合風險指標（NumPy 向量化，資料來自 price_store）
+#
+# 全部以「基準指數的交易日」為日曆對齊：
+#   prices[t, i]：第 i 檔在第 t 個交易日的收盤價（缺值往前補，上市前為 NaN）
+# 個股之間的相關係數用 pairwise-complete（兩檔都有報酬的日子才算）。
+import datetime as dt
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from price_store import PriceHistory
+
+TRADING_DAYS = 252
+
+# 年化無風險利率（Sharpe 用）
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.0"))
+
+
+def align_closes(calendar: np.ndarray, histories: List[PriceHistory]) -> np.ndarray:
+    """
+    calendar：基準指數的日期（datetime64[D]，遞增）
+    回傳 (T, N) 收盤價矩陣；某天沒成交 → 沿用前一天，第一筆之前 → NaN
+    """
+    prices = np.full((len(calendar), len(histories)), np.nan)
+
+    for i, h in enumerate(histories):
+        if len(h) == 0:
+            continue
+        pos = np.searchsorted(calendar, h.dates)
+        inside = pos < len(calendar)
+        pos, dates, closes = pos[inside], h.dates[inside], h.close[inside]
+        match = calendar[pos] == dates
+        prices[pos[match], i] = closes[match]
+
+    # 向量化 forward fill：每格取「到目前為止最後一個有值的列」
+    rows = np.where(np.isnan(prices), 0, np.arange(len(calendar))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = prices[rows, np.arange(prices.shape[1])]
+    return filled
+
+
+def daily_returns(prices: np.ndarray) -> np.ndarray:
+    """簡單報酬 (T-1, N)；任一端缺值 → NaN"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return prices[1:] / prices[:-1] - 1.0
+
+
+def max_drawdown(prices: np.ndarray) -> np.ndarray:
+    """每欄的最大回撤（負數，例如 -0.35）；全部缺值 → NaN"""
+    peaks = np.fmax.accumulate(prices, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = prices / peaks - 1.0
+    valid = ~np.isnan(drawdowns)
+    return np.where(valid.any(axis=0), np.min(np.where(valid, drawdowns, 0.0), axis=0), np.nan)
+
+
+def pairwise_corr(returns: np.ndarray) -> np.ndarray:
+    """
+    pairwise-complete 相關係數矩陣：只用兩檔同時有報酬的日子
+    以矩陣乘法一次算完（N 檔 → 幾個 (N, N) 矩陣），不逐對迴圈
+    """
+    mask = (~np.isnan(returns)).astype(float)
+    x = np.where(mask > 0, returns, 0.0)
+
+    n = mask.T @ mask
+    sx = x.T @ mask              # sx[i, j]：i 在 (i, j) 都有值的日子的總和
+    sxx = (x * x).T @ mask
+    sxy = x.T @ x
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx * sx / n
+        corr = cov / np.sqrt(var_i * var_i.T)
+    corr[n < 3] = np.nan
+    np.fill_diagonal(corr, np.where(np.diag(n) >= 3, 1.0, np.nan))
+    return np.clip(corr, -1.0, 1.0)
+
+
+def _beta(returns: np.ndarray, market: np.ndarray) -> np.ndarray:
+    """每欄對大盤的 beta（只用兩者都有值的日子）"""
+    both = ~np.isnan(returns) & ~np.isnan(market)[:, None]
+    n = both.sum(axis=0)
+    r = np.where(both, returns, 0.0)
+    m = np.where(both, market[:, None], 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_mean = r.sum(axis=0) / n
+        m_mean = m.sum(axis=0) / n
+        cov = (r * m).sum(axis=0) / n - r_mean * m_mean
+        var = (m * m).sum(axis=0) / n - m_mean * m_mean
+        beta = cov / var
+    return np.where(n >= 3, beta, np.nan)
+
+
+def _annualized(returns: np.ndarray) -> tuple:
+    """(年化報酬, 年化波動, Sharpe)"""
+    count = np.sum(~np.isnan(returns), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.nansum(returns, axis=0) / count
+        centered = np.where(np.isnan(returns), 0.0, returns - mean)
+        std = np.sqrt((centered * centered).sum(axis=0) / (count - 1))
+        annual_return = mean * TRADING_DAYS
+        annual_vol = std * np.sqrt(TRADING_DAYS)
+        sharpe = (annual_return - RISK_FREE_RATE) / annual_vol
+    invalid = count < 2
+    return (
+        np.where(invalid, np.nan, annual_return),
+        np.where(invalid, np.nan, annual_vol),
+        np.where(invalid | ~np.isfinite(sharpe), np.nan, sharpe),
+    )
+
+
+def _num(v) -> Optional[float]:
+    v = float(v)
+    return round(v, 6) if np.isfinite(v) else None
+
+
+def _to_list(a: np.ndarray) -> list:
+    """整個矩陣一次轉 JSON 可用的巢狀 list（NaN → None）"""
+    rounded = np.round(a, 6).astype(object)
+    rounded[~np.isfinite(a)] = None
+    return rounded.tolist()
+
+
+def portfolio_analytics(
+    symbols: List[str],
+    shares: List[float],
+    histories: List[PriceHistory],
+    benchmark: PriceHistory,
+) -> Dict:
+    """
+    symbols / shares / histories 一一對應；benchmark 決定交易日日曆。
+    權重 = 最新市值占比；組合每日報酬 = 當天有報酬的個股依權重加權（重新正規化）。
+    """
+    calendar = benchmark.dates
+    if len(calendar) < 3:
+        return {"observations": 0, "portfolio": None, "symbols": [], "correlation": None}
+
+    prices = align_closes(calendar, histories)
+    market_prices = align_closes(calendar, [benchmark])[:, 0]
+
+    returns = daily_returns(prices)
+    market = daily_returns(market_prices[:, None])[:, 0]
+
+    last = prices[-1]
+    values = np.where(np.isnan(last), 0.0, last * np.asarray(shares, dtype=float))
+    total = values.sum()
+    weights = values / total if total > 0 else np.zeros_like(values)
+
+    # 組合報酬：當天缺值的個股不計入，其餘權重重新正規化
+    present = ~np.isnan(returns)
+    w = np.where(present, weights, 0.0)
+    w_sum = w.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        port = np.where(w_sum > 0, np.where(present, returns, 0.0) @ weights / w_sum, np.nan)
+    port_curve = np.concatenate([[1.0], np.cumprod(1.0 + np.nan_to_num(port))])
+
+    ann_ret, ann_vol, sharpe = _annualized(returns)
+    betas = _beta(returns, market)
+    drawdowns = max_drawdown(prices)
+
+    p_ret, p_vol, p_sharpe = _annualized(port[:, None])
+    p_beta = _beta(port[:, None], market)
+    p_dd = max_drawdown(port_curve[:, None])
+
+    corr = pairwise_corr(returns)
+
+    return {
+        "observations": int(len(calendar)),
+        "start": str(calendar[0]),
+        "end": str(calendar[-1]),
+        "portfolio": {
+            "annual_return": _num(p_ret[0]),
+            "annual_volatility": _num(p_vol[0]),
+            "beta": _num(p_beta[0]),
+            "max_drawdown": _num(p_dd[0]),
+            "sharpe": _num(p_sharpe[0]),
+        },
+        "symbols": [
+            {
+                "symbol": symbol,
+                "weight": _num(weights[i]),
+                "annual_return": _num(ann_ret[i]),
+                "annual_volatility": _num(ann_vol[i]),
+                "beta": _num(betas[i]),
+                "max_drawdown": _num(drawdowns[i]),
+                "sharpe": _num(sharpe[i]),
+            }
+            for i, symbol in enumerate(symbols)
+        ],
+        "correlation": {
+            "symbols": symbols,
+            "matrix": _to_list(corr),
+        },
+    }
+
+
+def window_start(end: dt.date, years: float) -> dt.date:
+    return end - dt.timedelta(days=int(round(365.25 * years)))
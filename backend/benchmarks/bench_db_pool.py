@@ -0,0 +1,132 @@
+# bench_db_pool.py — SQLite 連線池前後 requests/sec 比較
+#
+# 用法（在 backend/ 底下）：
+#   python benchmarks/bench_db_pool.py                 # 兩種模式都跑並比較
+#   python benchmarks/bench_db_pool.py --mode pooled   # 只跑一種
+#
+# legacy：每次 get_db() 都 sqlite3.connect、預設 rollback journal（連線池之前的行為）
+# pooled：database.ConnectionPool（WAL + synchronous=NORMAL + cache/mmap）
+#
+# 每種模式在獨立 process + 全新的暫存 DB 執行，避免 WAL 設定互相影響。
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LegacyPool:
+    """模擬連線池之前的 get_db()：每次開新連線，close 即關閉"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def acquire(self):
+        # check_same_thread=False：只為了讓 request 連線 dependency 能在不同 thread 關閉
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+def run_mode(mode: str, requests: int, concurrency: int, holdings: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_db_{mode}_")
+    os.chdir(workdir)
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ["DB_PATH"] = os.path.join(workdir, "news.db")
+    sys.path.insert(0, BACKEND_DIR)
+
+    import database
+
+    if mode == "legacy":
+        database.pool = LegacyPool(database.DB_PATH)
+
+    import main
+    from fastapi.testclient import TestClient
+
+    results = {"mode": mode, "requests": requests, "concurrency": concurrency}
+
+    with TestClient(main.app) as client:
+        client.post("/auth/register", json={"email": "bench@example.com", "password": "pw"})
+        token = client.post(
+            "/auth/login", json={"email": "bench@example.com", "password": "pw"}
+        ).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        for i in range(holdings):
+            client.post(
+                "/holdings",
+                json={"symbol": f"SYM{i}", "shares": 1, "cost_basis": 10},
+                headers=headers,
+            )
+
+        for path in ("/me", "/holdings"):
+            per_worker = requests // concurrency
+            errors = []
+
+            def worker():
+                for _ in range(per_worker):
+                    r = client.get(path, headers=headers)
+                    if r.status_code != 200:
+                        errors.append(r.status_code)
+
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+
+            results[path] = {
+                "rps": round(per_worker * concurrency / elapsed, 1),
+                "errors": len(errors),
+            }
+
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["legacy", "pooled"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--holdings", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.requests, args.concurrency, args.holdings)))
+        return
+
+    runs = {}
+    for mode in ("legacy", "pooled"):
+        out = subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--mode", mode,
+                "--requests", str(args.requests),
+                "--concurrency", str(args.concurrency),
+                "--holdings", str(args.holdings),
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs[mode] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    print(f"{'endpoint':<12}{'legacy rps':>12}{'pooled rps':>12}{'speedup':>10}")
+    for path in ("/me", "/holdings"):
+        before = runs["legacy"][path]["rps"]
+        after = runs["pooled"][path]["rps"]
+        print(f"{path:<12}{before:>12}{after:>12}{after / before:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
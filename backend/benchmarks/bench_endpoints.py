@@ -0,0 +1,275 @@
+# bench_endpoints.py — 主要 API 的延遲分佈（p50 / p95 / p99），完全離線
+#
+# 用法（在 backend/ 底下）：
+#   python benchmarks/bench_endpoints.py
+#   python benchmarks/bench_endpoints.py --holdings 1,10,50 --concurrency 1,8,32 --requests 200
+#   python benchmarks/bench_endpoints.py --llm-latency-ms 1500 --llm-error-rate 0.05
+#   python benchmarks/bench_endpoints.py --output after.json --compare before.json
+#
+# - FastAPI app 在同一個 process 內執行（httpx.ASGITransport），暫存 DB / price store
+# - yfinance / NewsAPI / OpenAI / Gemini 全部換成 fakes.py 的假上游（延遲 / 失敗率可調）
+# - 每個情境先送一次 warm-up（記為 cold_ms），再量測 steady state
+# - 結果寫成 JSON（含 git commit），可用 --compare 與另一次的結果比較
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 表格輸出到真正的 stdout；app 本身的 print log 預設丟掉（--verbose 保留）
+REPORT = sys.stdout
+
+# 與持股數無關的情境只跑一次（holdings = None）
+SCENARIOS = {
+    "auth_login": {"method": "POST", "path": "/auth/login", "per_holdings": False},
+    "auth_me": {"method": "GET", "path": "/me", "per_holdings": False},
+    "news": {"method": "GET", "path": "/news", "per_holdings": False},
+    "portfolio_summary": {"method": "GET", "path": "/portfolio/summary", "per_holdings": True},
+    "reports_today": {"method": "GET", "path": "/reports/today", "per_holdings": True},
+}
+
+
+def setup_env():
+    workdir = tempfile.mkdtemp(prefix="bench_endpoints_")
+    os.chdir(workdir)
+    os.environ.setdefault("SECRET_KEY", "bench-secret")
+    os.environ["DB_PATH"] = os.path.join(workdir, "news.db")
+    os.environ["PRICE_STORE_DIR"] = os.path.join(workdir, "price_store")
+    os.environ.setdefault("NEWS_SUMMARIZER_PROVIDER", "openai")
+    os.environ.setdefault("OPENAI_API_KEY", "bench-openai-key")
+    os.environ.setdefault("NEWS_API_KEY", "bench-newsapi-key")
+    return workdir
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+async def create_user(client, email: str, holdings: int) -> dict:
+    password = "bench-password"
+    await client.post("/auth/register", json={"email": email, "password": password})
+    token = (
+        await client.post("/auth/login", json={"email": email, "password": password})
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for i in range(holdings):
+        r = await client.post(
+            "/holdings",
+            json={"symbol": f"BN{i:04d}", "shares": 10 + i, "cost_basis": 50 + i},
+            headers=headers,
+        )
+        r.raise_for_status()
+    return {"email": email, "password": password, "headers": headers}
+
+
+async def send(client, scenario: str, user: dict):
+    spec = SCENARIOS[scenario]
+    if scenario == "auth_login":
+        return await client.post(
+            spec["path"], json={"email": user["email"], "password": user["password"]}
+        )
+    return await client.request(spec["method"], spec["path"], headers=user["headers"])
+
+
+async def run_scenario(client, scenario: str, user: dict, concurrency: int, requests: int) -> dict:
+    start = time.perf_counter()
+    warm = await send(client, scenario, user)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            t0 = time.perf_counter()
+            try:
+                r = await send(client, scenario, user)
+                if r.status_code >= 400:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    lat = np.array(latencies)
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "warmup_status": warm.status_code,
+        "cold_ms": round(cold_ms, 2),
+        "mean_ms": round(float(lat.mean()), 2),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "rps": round(requests / elapsed, 1),
+    }
+
+
+async def run_suite(args, main_module) -> list:
+    import httpx
+
+    results = []
+    transport = httpx.ASGITransport(app=main_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        shared_user = await create_user(client, "bench-shared@example.com", 1)
+
+        for concurrency in args.concurrency:
+            for scenario, spec in SCENARIOS.items():
+                if spec["per_holdings"] or scenario not in args.scenarios:
+                    continue
+                r = await run_scenario(client, scenario, shared_user, concurrency, args.requests)
+                r["holdings"] = None
+                results.append(r)
+                print_row(r)
+
+        for holdings in args.holdings:
+            user = await create_user(client, f"bench-{holdings}@example.com", holdings)
+            for concurrency in args.concurrency:
+                for scenario, spec in SCENARIOS.items():
+                    if not spec["per_holdings"] or scenario not in args.scenarios:
+                        continue
+                    r = await run_scenario(client, scenario, user, concurrency, args.requests)
+                    r["holdings"] = holdings
+                    results.append(r)
+                    print_row(r)
+
+    return results
+
+
+def print_row(r: dict):
+    holdings = "-" if r["holdings"] is None else r["holdings"]
+    print(
+        f"{r['scenario']:<18}{holdings!s:>9}{r['concurrency']:>6}"
+        f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+        f"{r['rps']:>9.1f}{r['errors']:>7}",
+        file=REPORT,
+        flush=True,
+    )
+
+
+def result_key(r: dict) -> tuple:
+    return r["scenario"], r["holdings"], r["concurrency"]
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+
+    print(f"\ncompared with {baseline_path}", file=REPORT)
+    print(f"{'scenario':<18}{'holdings':>9}{'conc':>6}{'p95 before':>12}{'p95 after':>11}{'change':>9}", file=REPORT)
+    for r in results:
+        before = baseline.get(result_key(r))
+        if not before:
+            continue
+        change = (r["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        holdings = "-" if r["holdings"] is None else r["holdings"]
+        print(
+            f"{r['scenario']:<18}{holdings!s:>9}{r['concurrency']:>6}"
+            f"{before['p95_ms']:>12.1f}{r['p95_ms']:>11.1f}{change:>+8.1f}%",
+            file=REPORT,
+        )
+
+
+def int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--holdings", type=int_list, default=[1, 10, 50])
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=100, help="每個情境的量測 request 數")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--yf-latency-ms", type=float, default=80.0)
+    parser.add_argument("--yf-error-rate", type=float, default=0.0)
+    parser.add_argument("--news-latency-ms", type=float, default=150.0)
+    parser.add_argument("--news-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_endpoints.json")
+    parser.add_argument("--compare", help="之前的結果 JSON，比較 p95")
+    parser.add_argument("--verbose", action="store_true", help="保留 app 的 log 輸出")
+    args = parser.parse_args()
+    args.scenarios = [s for s in args.scenarios.split(",") if s in SCENARIOS]
+
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    setup_env()
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+
+    import fakes
+    import main
+
+    cfg = fakes.FakeConfig(
+        yf_latency_ms=args.yf_latency_ms,
+        yf_error_rate=args.yf_error_rate,
+        news_latency_ms=args.news_latency_ms,
+        news_error_rate=args.news_error_rate,
+        llm_latency_ms=args.llm_latency_ms,
+        llm_error_rate=args.llm_error_rate,
+        seed=args.seed,
+    )
+    fakes.install(main, cfg)
+    main.init_db()
+
+    print(
+        f"{'scenario':<18}{'holdings':>9}{'conc':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>9}{'errors':>7}",
+        file=REPORT,
+    )
+    results = asyncio.run(run_suite(args, main))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "fakes": vars(cfg),
+            "requests_per_scenario": args.requests,
+        },
+        "upstream_calls": fakes.upstream_stats(),
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nresults written to {output}", file=REPORT)
+
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main_cli()
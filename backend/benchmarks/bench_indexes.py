@@ -0,0 +1,129 @@
+# bench_indexes.py — migration 2（索引）前後的熱門查詢速度
+#
+# 用法（在 backend/ 底下）：
+#   python benchmarks/bench_indexes.py                       # 100k users / 1M holdings / 每個查詢 50 次
+#   python benchmarks/bench_indexes.py --users 10000 --holdings-per-user 10
+#
+# 流程：暫存 DB 只升級到 schema v1（無索引）→ 灌合成資料 → 量測
+#      → 套用剩下的 migration → 再量測一次。
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import migrate  # noqa: E402
+
+SYMBOLS = [f"S{i:04d}" for i in range(3000)] + [f"{2000 + i}.TW" for i in range(500)]
+
+QUERIES = {
+    "news by category": (
+        """
+        SELECT translated_title, summary_en, summary_zh, sentiment,
+               source, url, image_url, published_at
+        FROM news_cache WHERE category = ? ORDER BY created_at DESC LIMIT 5
+        """,
+        lambda rnd, users: (rnd.choice(["international", "us_finance"]),),
+    ),
+    "holdings by user (sorted)": (
+        """
+        SELECT id, symbol, shares, cost_basis, purchase_date
+        FROM holdings WHERE user_id=? ORDER BY created_at DESC
+        """,
+        lambda rnd, users: (rnd.randint(1, users),),
+    ),
+    "holding by user+symbol": (
+        "SELECT id FROM holdings WHERE user_id=? AND symbol=?",
+        lambda rnd, users: (rnd.randint(1, users), rnd.choice(SYMBOLS)),
+    ),
+    "user by nickname": (
+        "SELECT id, email, nickname, password_hash FROM users WHERE nickname=?",
+        lambda rnd, users: (f"user{rnd.randint(1, users)}",),
+    ),
+}
+
+
+def seed(conn, users: int, holdings_per_user: int, news_rows: int):
+    rnd = random.Random(42)
+    cur = conn.cursor()
+
+    cur.executemany(
+        "INSERT INTO users (id, email, password_hash, nickname) VALUES (?, ?, 'x', ?)",
+        ((i, f"user{i}@example.com", f"user{i}") for i in range(1, users + 1)),
+    )
+
+    def holding_rows():
+        for uid in range(1, users + 1):
+            for symbol in rnd.sample(SYMBOLS, holdings_per_user):
+                yield (uid, symbol, rnd.randint(1, 500), rnd.uniform(10, 900))
+
+    cur.executemany(
+        "INSERT INTO holdings (user_id, symbol, shares, cost_basis) VALUES (?, ?, ?, ?)",
+        holding_rows(),
+    )
+
+    cur.executemany(
+        """
+        INSERT INTO news_cache (category, translated_title, created_at)
+        VALUES (?, ?, datetime('now', ?))
+        """,
+        (
+            (rnd.choice(["international", "us_finance"]), f"news {i}", f"-{i} minutes")
+            for i in range(news_rows)
+        ),
+    )
+    conn.commit()
+
+
+def measure(conn, users: int, iterations: int) -> dict:
+    rnd = random.Random(7)
+    results = {}
+    for name, (sql, make_params) in QUERIES.items():
+        params = [make_params(rnd, users) for _ in range(iterations)]
+        start = time.perf_counter()
+        for p in params:
+            conn.execute(sql, p).fetchall()
+        results[name] = (time.perf_counter() - start) / iterations * 1e6  # µs / query
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--holdings-per-user", type=int, default=10)
+    parser.add_argument("--news", type=int, default=20_000)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_idx_"), "bench.db")
+    conn = sqlite3.connect(path)
+
+    migrate(conn, target=1)
+
+    start = time.perf_counter()
+    seed(conn, args.users, args.holdings_per_user, args.news)
+    print(
+        f"seeded {args.users:,} users / {args.users * args.holdings_per_user:,} holdings "
+        f"/ {args.news:,} news rows in {time.perf_counter() - start:.1f}s"
+    )
+
+    before = measure(conn, args.users, args.iterations)
+
+    start = time.perf_counter()
+    version = migrate(conn)
+    print(f"migrated to v{version} in {time.perf_counter() - start:.1f}s")
+
+    after = measure(conn, args.users, args.iterations)
+
+    print(f"{'query':<28}{'before µs':>12}{'after µs':>12}{'speedup':>10}")
+    for name in QUERIES:
+        print(f"{name:<28}{before[name]:>12.1f}{after[name]:>12.1f}{before[name] / after[name]:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,318 @@
+# fakes.py — benchmark 用的本地假上游（yfinance / NewsAPI / OpenAI / Gemini）
+#
+# 用法：
+#   import fakes
+#   cfg = fakes.FakeConfig(llm_latency_ms=800, llm_error_rate=0.05)
+#   fakes.install(main, cfg)      # main = 已 import 的 backend/main.py
+#
+# - 回應內容固定（同一 symbol 永遠同一個價格），延遲 / 失敗率可調
+# - 延遲用 sleep（yfinance / LLM 是同步呼叫，會佔住 thread，與真實情況相同）
+# - NewsAPI 以 httpx.MockTransport 攔截，fetch_news_from_newsapi 本身的程式碼照常執行
+
+import asyncio
+import datetime as dt
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import types
+from dataclasses import dataclass, field
+from typing import Dict
+
+import httpx
+import numpy as np
+import pandas as pd
+import yfinance
+
+
+@dataclass
+class FakeConfig:
+    yf_latency_ms: float = 80.0
+    yf_error_rate: float = 0.0
+    news_latency_ms: float = 150.0
+    news_error_rate: float = 0.0
+    llm_latency_ms: float = 800.0
+    llm_error_rate: float = 0.0
+    jitter: float = 0.2          # 延遲 ±20% 隨機
+    seed: int = 42
+
+
+class FakeUpstreamError(RuntimeError):
+    pass
+
+
+@dataclass
+class Upstream:
+    """一個假上游：延遲、失敗率、呼叫次數"""
+    name: str
+    latency_ms: float
+    error_rate: float
+    jitter: float
+    rng: random.Random
+    calls: int = 0
+    errors: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency_ms / 1000 * (1 + self.rng.uniform(-self.jitter, self.jitter))
+            fail = self.rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return max(delay, 0.0), fail
+
+    def call(self):
+        delay, fail = self._draw()
+        time.sleep(delay)
+        if fail:
+            raise FakeUpstreamError(f"fake {self.name} error")
+
+    async def acall(self):
+        delay, fail = self._draw()
+        await asyncio.sleep(delay)
+        return fail
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "errors": self.errors}
+
+
+UPSTREAMS: Dict[str, Upstream] = {}
+
+
+def _base_price(symbol: str) -> float:
+    digest = hashlib.sha256(symbol.encode("utf-8")).digest()
+    return 20 + int.from_bytes(digest[:4], "little") % 98000 / 100
+
+
+# ============================================================
+# yfinance
+# ============================================================
+
+def fake_download(tickers, period=None, start=None, interval="1d", **kwargs):
+    UPSTREAMS["yfinance"].call()
+
+    symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+    end = dt.date.today()
+    if start:
+        first = dt.date.fromisoformat(str(start)[:10])
+    else:
+        first = end - dt.timedelta(days=7)
+    days = pd.bdate_range(first, end)
+    if period == "5d":
+        days = days[-5:]
+
+    frames = {}
+    for symbol in symbols:
+        base = _base_price(symbol)
+        # 以日期決定價格 → 同一天同一檔永遠相同
+        t = (days.values.astype("datetime64[D]").astype(np.int64) % 97) / 97
+        close = base * (1 + 0.05 * np.sin(t * 2 * np.pi))
+        frames[symbol] = pd.DataFrame(
+            {
+                "Open": close * 0.995,
+                "High": close * 1.01,
+                "Low": close * 0.99,
+                "Close": close,
+                "Adj Close": close,
+                "Volume": np.full(len(days), 1_000_000.0),
+            },
+            index=days,
+        )
+    return pd.concat(frames, axis=1)
+
+
+class FakeTicker:
+    def __init__(self, symbol: str, *args, **kwargs):
+        self.symbol = symbol.upper()
+
+    @property
+    def fast_info(self):
+        UPSTREAMS["yfinance"].call()
+        price = _base_price(self.symbol)
+        return {"lastPrice": price, "previousClose": price * 0.99}
+
+    @property
+    def info(self):
+        UPSTREAMS["yfinance"].call()
+        price = _base_price(self.symbol)
+        return {
+            "symbol": self.symbol,
+            "shortName": f"{self.symbol} Inc.",
+            "longName": f"{self.symbol} Incorporated",
+            "regularMarketPrice": price,
+            "currency": "TWD" if self.symbol.endswith(".TW") else "USD",
+        }
+
+    def history(self, *args, **kwargs):
+        return fake_download([self.symbol], *args, **kwargs)[self.symbol]
+
+
+# ============================================================
+# NewsAPI（httpx.MockTransport）
+# ============================================================
+
+def _newsapi_articles(url: str, count: int = 10) -> list:
+    tag = "us" if "top-headlines" in url else "intl"
+    today = dt.date.today().isoformat()
+    return [
+        {
+            "source": {"name": "Bench Wire"},
+            "title": f"{tag} market headline {i} {today}",
+            "description": f"Synthetic description {i} for benchmarking.",
+            "content": "Markets moved today as investors weighed earnings. " * 8,
+            "url": f"https://example.com/{tag}/{today}/{i}",
+            "urlToImage": f"https://example.com/{tag}/{i}.jpg",
+            "publishedAt": f"{today}T00:{i:02d}:00Z",
+        }
+        for i in range(count)
+    ]
+
+
+async def _newsapi_handler(request: httpx.Request) -> httpx.Response:
+    failed = await UPSTREAMS["newsapi"].acall()
+    if failed:
+        return httpx.Response(500, json={"status": "error", "message": "fake newsapi error"})
+    return httpx.Response(
+        200,
+        json={"status": "ok", "articles": _newsapi_articles(str(request.url))},
+    )
+
+
+_RealAsyncClient = httpx.AsyncClient
+
+
+class FakeNewsAsyncClient(_RealAsyncClient):
+    """沒指定 transport 的 AsyncClient → 一律導向假 NewsAPI（benchmark 自己的 client 不受影響）"""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("transport", httpx.MockTransport(_newsapi_handler))
+        super().__init__(*args, **kwargs)
+
+
+# ============================================================
+# OpenAI / Gemini
+# ============================================================
+
+def fake_llm_text(prompt: str) -> str:
+    """依 prompt 內容回傳 main.py 各解析器看得懂的格式"""
+    if '{"items"' in prompt and "新聞：" in prompt:
+        articles = json.loads(prompt[prompt.index("新聞：") + 3 :].strip())
+        return json.dumps(
+            {
+                "items": [
+                    {
+                        "id": a["id"],
+                        "title_zh": f"標題 {a['title']}",
+                        "summary_en": "Synthetic English summary.",
+                        "summary_zh": "合成的中文摘要。",
+                        "sentiment": "中性",
+                    }
+                    for a in articles
+                ]
+            },
+            ensure_ascii=False,
+        )
+
+    if "MARKET_ZH" in prompt:
+        return (
+            "MARKET_ZH: 今日市場震盪整理。\n"
+            "SUGGEST_ZH: 維持既有部位，觀察量能。\n"
+            "MARKET_EN: Markets were range-bound today.\n"
+            "SUGGEST_EN: Hold positions and watch volume."
+        )
+
+    if "JSON array" in prompt:
+        symbols = re.findall(r"^(\S+) \| 現價", prompt, re.M)
+        return json.dumps(
+            [
+                {"symbol": s, "action": "HOLD", "reason_zh": f"{s} 走勢持平，建議續抱觀察。", "risk_level": "MEDIUM"}
+                for s in symbols
+            ],
+            ensure_ascii=False,
+        )
+
+    if "ADVICE_ZH" in prompt:
+        return "ADVICE_ZH: 續抱觀察。\nADVICE_EN: Hold and observe."
+
+    return (
+        "TITLE_ZH: 合成新聞標題\n"
+        "ZH: 合成的中文摘要。\n"
+        "EN: Synthetic English summary.\n"
+        "SENTIMENT: 中性"
+    )
+
+
+def _usage(prompt: str, text: str):
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(text) // 4
+    return types.SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+
+
+class _FakeCompletions:
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        prompt = "\n".join(m["content"] for m in messages if isinstance(m.get("content"), str))
+        UPSTREAMS["openai"].call()
+        text = fake_llm_text(prompt)
+
+        if stream:
+            def chunks():
+                for i in range(0, len(text), 16):
+                    delta = types.SimpleNamespace(content=text[i : i + 16])
+                    yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+            return chunks()
+
+        message = types.SimpleNamespace(content=text)
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=message)],
+            usage=_usage(prompt, text),
+        )
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.chat = types.SimpleNamespace(completions=_FakeCompletions())
+
+
+class _FakeGeminiModels:
+    def generate_content(self, model=None, contents=None, **kwargs):
+        prompt = contents if isinstance(contents, str) else json.dumps(contents, default=str)
+        UPSTREAMS["gemini"].call()
+        text = fake_llm_text(prompt)
+        return types.SimpleNamespace(text=text, usage_metadata=_usage(prompt, text))
+
+
+class FakeGemini:
+    def __init__(self):
+        self.models = _FakeGeminiModels()
+
+
+# ============================================================
+# 安裝
+# ============================================================
+
+def install(main_module, cfg: FakeConfig):
+    """把 main.py 用到的上游全部換成假的（需在送出任何 request 前呼叫）"""
+    rng = random.Random(cfg.seed)
+    UPSTREAMS["yfinance"] = Upstream("yfinance", cfg.yf_latency_ms, cfg.yf_error_rate, cfg.jitter, random.Random(rng.random()))
+    UPSTREAMS["newsapi"] = Upstream("newsapi", cfg.news_latency_ms, cfg.news_error_rate, cfg.jitter, random.Random(rng.random()))
+    UPSTREAMS["openai"] = Upstream("openai", cfg.llm_latency_ms, cfg.llm_error_rate, cfg.jitter, random.Random(rng.random()))
+    UPSTREAMS["gemini"] = Upstream("gemini", cfg.llm_latency_ms, cfg.llm_error_rate, cfg.jitter, random.Random(rng.random()))
+
+    yfinance.download = fake_download
+    yfinance.Ticker = FakeTicker
+    httpx.AsyncClient = FakeNewsAsyncClient
+
+    main_module.openai_client = FakeOpenAI()
+    main_module.gemini_client = FakeGemini()
+    main_module.NEWS_API_KEY = main_module.NEWS_API_KEY or "bench-newsapi-key"
+
+
+def upstream_stats() -> Dict[str, Dict[str, int]]:
+    return {name: u.stats() for name, u in UPSTREAMS.items()}
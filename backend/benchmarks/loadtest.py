@@ -0,0 +1,406 @@
+# loadtest.py — 模擬使用者負載，找出單一 backend process 的容量上限
+#
+# 用法（在 backend/ 底下）：
+#   python benchmarks/loadtest.py                                   # in-process + 假上游
+#   python benchmarks/loadtest.py --users 200 --holdings 15 --concurrency 25,100,400
+#   python benchmarks/loadtest.py --think-ms 0 --concurrency 1,4,16          # 最大吞吐量
+#   python benchmarks/loadtest.py --base-url http://127.0.0.1:8000  # 打真正在跑的 server
+#   python benchmarks/loadtest.py --mix me=30,news=25,portfolio_summary=30,reports_today=15
+#
+# 流程：
+#   1. 經由 /auth/register + /holdings 建立 N 個使用者，各 M 檔持股（symbol 有重疊）
+#   2. 依序以各個 concurrency（同時在線的虛擬使用者數）跑 --step-seconds 秒：
+#      每個虛擬使用者送完一個 request，停頓 --think-ms（±50%）再送下一個
+#   3. 每一階段記錄 throughput / 錯誤率 / 延遲，並取樣資源指標：
+#      - executor：/health/executor 的排隊深度與排隊等待時間
+#      - event loop：in-process 量 loop lag；remote 量 GET /health 的延遲
+#      - SQLite：database is locked 次數（in-process）、連線池外額外開的連線數
+#      - CPU：process 使用的 CPU 核心數（in-process；含 load generator 本身）
+#   4. 輸出容量曲線，並指出最先飽和的資源
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_endpoints import git_commit, setup_env  # noqa: E402
+
+# 前端頁面實際呼叫的 API（App 載入 → /me；首頁 / 新聞頁 → /news；
+# 持股頁 → /portfolio/summary；報告頁 → /reports/today）
+DEFAULT_MIX = {"me": 30, "news": 25, "portfolio_summary": 30, "reports_today": 15}
+PATHS = {
+    "me": "/me",
+    "news": "/news",
+    "portfolio_summary": "/portfolio/summary",
+    "reports_today": "/reports/today",
+}
+
+# 飽和判定門檻
+EXECUTOR_WAIT_LIMIT_MS = 50.0
+LOOP_LAG_LIMIT_MS = 50.0
+CPU_LIMIT_CORES = 0.9  # Python 受 GIL 限制，接近 1 核即已滿載
+ERROR_RATE_LIMIT = 0.01
+
+REPORT = sys.stdout
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in PATHS:
+            raise argparse.ArgumentTypeError(f"unknown endpoint in mix: {name}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+async def seed_users(client, users: int, holdings: int, symbols: int, seed: int) -> list:
+    rnd = random.Random(seed)
+    pool = [f"LT{i:04d}" for i in range(symbols)]
+    sem = asyncio.Semaphore(16)
+
+    async def one(i: int):
+        async with sem:
+            email = f"load-{i}@example.com"
+            await client.post("/auth/register", json={"email": email, "password": "load-pw"})
+            r = await client.post("/auth/login", json={"email": email, "password": "load-pw"})
+            r.raise_for_status()
+            headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+            for symbol in rnd.sample(pool, min(holdings, len(pool))):
+                await client.post(
+                    "/holdings",
+                    json={"symbol": symbol, "shares": rnd.randint(1, 200), "cost_basis": rnd.uniform(10, 500)},
+                    headers=headers,
+                )
+            return headers
+
+    return await asyncio.gather(*(one(i) for i in range(users)))
+
+
+def classify(exc: Exception) -> str:
+    if isinstance(exc, sqlite3.OperationalError) and "locked" in str(exc):
+        return "sqlite_busy"
+    return type(exc).__name__
+
+
+async def sample_health(client, samples: list, stop: asyncio.Event, interval: float):
+    """定期取樣 /health/executor、/health/cache 與 /health 本身的延遲"""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            await client.get("/health")
+            health_ms = (time.perf_counter() - t0) * 1000
+            executor = (await client.get("/health/executor")).json()
+            cache = (await client.get("/health/cache")).json()
+            samples.append(
+                {
+                    "t": time.perf_counter(),
+                    "health_ms": health_ms,
+                    "executor": executor.get("executor", executor),
+                    "db_pool": cache.get("db_pool", {}),
+                }
+            )
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def probe_loop_lag(lags: list, stop: asyncio.Event, interval: float = 0.02):
+    """in-process：量 event loop 實際延遲（sleep 比預期晚了多久）"""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - t0 - interval) * 1000)
+
+
+def executor_wait_ms(first: dict, last: dict) -> float:
+    """兩次取樣之間「新開始執行的工作」平均排隊時間"""
+    def totals(s):
+        started = s.get("completed", 0) + s.get("active", 0)
+        return started, s.get("avg_wait_ms", 0.0) * started
+
+    n0, w0 = totals(first)
+    n1, w1 = totals(last)
+    return (w1 - w0) / (n1 - n0) if n1 > n0 else 0.0
+
+
+async def run_step(client, users: list, mix: dict, concurrency: int, args, in_process: bool) -> dict:
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    rnd = random.Random(args.seed + concurrency)
+
+    latencies = []
+    errors = {}
+    by_endpoint = {n: [] for n in names}
+    deadline = time.perf_counter() + args.step_seconds
+
+    async def virtual_user(i: int):
+        headers = users[i % len(users)]
+        while time.perf_counter() < deadline:
+            name = rnd.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                r = await client.get(PATHS[name], headers=headers)
+                if r.status_code >= 400:
+                    key = f"http_{r.status_code}"
+                    errors[key] = errors.get(key, 0) + 1
+            except Exception as e:
+                key = classify(e)
+                errors[key] = errors.get(key, 0) + 1
+            ms = (time.perf_counter() - t0) * 1000
+            latencies.append(ms)
+            by_endpoint[name].append(ms)
+            if args.think_ms:
+                await asyncio.sleep(args.think_ms / 1000 * rnd.uniform(0.5, 1.5))
+
+    stop = asyncio.Event()
+    samples, lags = [], []
+    monitors = [asyncio.create_task(sample_health(client, samples, stop, args.sample_interval))]
+    if in_process:
+        monitors.append(asyncio.create_task(probe_loop_lag(lags, stop)))
+
+    t0 = time.perf_counter()
+    cpu0 = time.process_time()
+    await asyncio.gather(*(virtual_user(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    stop.set()
+    await asyncio.gather(*monitors)
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    total = len(latencies)
+    error_count = sum(errors.values())
+
+    step = {
+        "concurrency": concurrency,
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "error_rate": round(error_count / total, 4) if total else 0.0,
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(lat, 50)), 1),
+        "p95_ms": round(float(np.percentile(lat, 95)), 1),
+        "p99_ms": round(float(np.percentile(lat, 99)), 1),
+        "endpoints": {
+            n: {
+                "requests": len(v),
+                "p95_ms": round(float(np.percentile(v, 95)), 1) if v else None,
+            }
+            for n, v in by_endpoint.items()
+        },
+        "sqlite_busy": errors.get("sqlite_busy", 0),
+    }
+
+    if samples:
+        step["executor_wait_ms"] = round(executor_wait_ms(samples[0]["executor"], samples[-1]["executor"]), 1)
+        step["executor_queue_max"] = max(s["executor"].get("queue_depth", 0) for s in samples)
+        step["executor_workers"] = samples[-1]["executor"].get("workers")
+        step["db_conns_opened"] = samples[-1]["db_pool"].get("created", 0) - samples[0]["db_pool"].get("created", 0)
+        step["health_p95_ms"] = round(float(np.percentile([s["health_ms"] for s in samples], 95)), 1)
+    if in_process:
+        step["cpu_cores"] = round(cpu / elapsed, 2)
+    if lags:
+        step["loop_lag_p95_ms"] = round(float(np.percentile(lags, 95)), 1)
+        step["loop_lag_max_ms"] = round(float(max(lags)), 1)
+
+    return step
+
+
+def saturated_resources(step: dict) -> list:
+    """這個階段哪些資源已超過門檻"""
+    found = []
+    if step.get("executor_wait_ms", 0) > EXECUTOR_WAIT_LIMIT_MS:
+        found.append("executor_queue")
+    lag = step.get("loop_lag_p95_ms", step.get("health_p95_ms", 0))
+    if lag > LOOP_LAG_LIMIT_MS:
+        found.append("event_loop")
+    if step.get("sqlite_busy", 0) > 0:
+        found.append("sqlite_lock")
+    if step.get("cpu_cores", 0) > CPU_LIMIT_CORES:
+        found.append("cpu")
+    if step["error_rate"] > ERROR_RATE_LIMIT:
+        found.append("errors")
+    return found
+
+
+def analyze(steps: list) -> dict:
+    """
+    knee：throughput 增加不到 10% 但 p95 增加超過 50%（或錯誤率超過門檻）的第一個階段
+    first_saturated：最早超過門檻的資源（同一階段多個 → 依 saturated_resources 的順序）
+    """
+    knee = None
+    for prev, cur in zip(steps, steps[1:]):
+        flat = cur["rps"] < prev["rps"] * 1.10
+        slower = cur["p95_ms"] > prev["p95_ms"] * 1.5
+        if (flat and slower) or cur["error_rate"] > ERROR_RATE_LIMIT:
+            knee = cur["concurrency"]
+            break
+
+    first = None
+    for step in steps:
+        found = saturated_resources(step)
+        if found:
+            first = {"resource": found[0], "concurrency": step["concurrency"], "all": found}
+            break
+
+    best = max(steps, key=lambda s: s["rps"]) if steps else None
+    return {
+        "peak_rps": best["rps"] if best else None,
+        "peak_concurrency": best["concurrency"] if best else None,
+        "knee_concurrency": knee,
+        "first_saturated": first,
+    }
+
+
+def print_step(step: dict):
+    lag = step.get("loop_lag_p95_ms", step.get("health_p95_ms", float("nan")))
+    print(
+        f"{step['concurrency']:>6}{step['rps']:>9.1f}{step['error_rate'] * 100:>7.1f}%"
+        f"{step['p50_ms']:>9.1f}{step['p95_ms']:>9.1f}{step['p99_ms']:>9.1f}"
+        f"{step.get('executor_wait_ms', float('nan')):>10.1f}{step.get('executor_queue_max', 0):>7}"
+        f"{lag:>9.1f}{step['sqlite_busy']:>7}{step.get('db_conns_opened', 0):>7}"
+        f"{step.get('cpu_cores', float('nan')):>6.2f}"
+        f"  {','.join(saturated_resources(step)) or '-'}",
+        file=REPORT,
+        flush=True,
+    )
+
+
+async def run(args, app=None) -> dict:
+    import httpx
+
+    if app is not None:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=300)
+    else:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=300)
+
+    async with client:
+        t0 = time.perf_counter()
+        users = await seed_users(client, args.users, args.holdings, args.symbols, args.seed)
+        print(
+            f"seeded {len(users)} users × {args.holdings} holdings in {time.perf_counter() - t0:.1f}s",
+            file=REPORT,
+        )
+
+        # 暖機：每位使用者的今日報告 / 個人化建議先產生一次（與每日排程後的狀態相同）
+        if args.warmup:
+            sem = asyncio.Semaphore(16)
+
+            async def warm(headers):
+                async with sem:
+                    for path in PATHS.values():
+                        await client.get(path, headers=headers)
+
+            await asyncio.gather(*(warm(h) for h in users))
+
+        print(
+            f"{'conc':>6}{'rps':>9}{'err':>8}{'p50':>9}{'p95':>9}{'p99':>9}"
+            f"{'exec wait':>10}{'queue':>7}{'lag p95':>9}{'busy':>7}{'conns':>7}{'cpu':>6}  saturated",
+            file=REPORT,
+        )
+        steps = []
+        for concurrency in args.concurrency:
+            step = await run_step(client, users, args.mix, concurrency, args, app is not None)
+            steps.append(step)
+            print_step(step)
+
+    return {"steps": steps, "summary": analyze(steps)}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", help="打既有的 server（省略 → in-process + 假上游）")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--holdings", type=int, default=10)
+    parser.add_argument("--symbols", type=int, default=120, help="symbol 池大小（使用者之間會重疊）")
+    parser.add_argument("--concurrency", type=int_list, default=[10, 25, 50, 100, 200, 400])
+    parser.add_argument("--step-seconds", type=float, default=10.0)
+    parser.add_argument("--think-ms", type=float, default=1000.0)
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX)
+    parser.add_argument("--sample-interval", type=float, default=0.25)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--yf-latency-ms", type=float, default=80.0)
+    parser.add_argument("--news-latency-ms", type=float, default=150.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="loadtest.json")
+    parser.add_argument("--verbose", action="store_true", help="保留 app 的 log 輸出")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    app = None
+    fake_cfg = None
+
+    if not args.base_url:
+        setup_env()
+        if not args.verbose:
+            sys.stdout = open(os.devnull, "w")
+
+        import fakes
+        import main
+
+        fake_cfg = fakes.FakeConfig(
+            yf_latency_ms=args.yf_latency_ms,
+            news_latency_ms=args.news_latency_ms,
+            llm_latency_ms=args.llm_latency_ms,
+            llm_error_rate=args.llm_error_rate,
+            seed=args.seed,
+        )
+        fakes.install(main, fake_cfg)
+        main.init_db()
+        app = main.app
+
+    result = asyncio.run(run(args, app))
+    summary = result["summary"]
+
+    print("", file=REPORT)
+    print(f"peak throughput: {summary['peak_rps']} rps at concurrency {summary['peak_concurrency']}", file=REPORT)
+    print(f"knee (throughput flat, latency climbing): concurrency {summary['knee_concurrency']}", file=REPORT)
+    first = summary["first_saturated"]
+    if first:
+        print(f"first saturated resource: {first['resource']} at concurrency {first['concurrency']}", file=REPORT)
+    else:
+        print("no resource crossed its threshold in the tested range", file=REPORT)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "target": args.base_url or "in-process",
+            "users": args.users,
+            "holdings": args.holdings,
+            "mix": args.mix,
+            "step_seconds": args.step_seconds,
+            "think_ms": args.think_ms,
+            "fakes": vars(fake_cfg) if fake_cfg else None,
+            "thresholds": {
+                "executor_wait_ms": EXECUTOR_WAIT_LIMIT_MS,
+                "loop_lag_ms": LOOP_LAG_LIMIT_MS,
+                "cpu_cores": CPU_LIMIT_CORES,
+                "error_rate": ERROR_RATE_LIMIT,
+            },
+        },
+        **result,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {output}", file=REPORT)
+
+
+if __name__ == "__main__":
+    main_cli()
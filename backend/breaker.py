@@ -0,0 +1,127 @@
+# breaker.py — 外部服務的 circuit breaker（yfinance / OpenAI / Gemini）
+#
+# closed    ：正常呼叫；連續失敗 BREAKER_FAILURE_THRESHOLD 次 → open
+# open      ：直接拒絕（不打上游），BREAKER_RESET_SECONDS 後 → half_open
+# half_open ：只放一個探測呼叫；成功 → closed，失敗 → 再 open 一輪
+#
+# 超過 slow_call_seconds 的呼叫即使成功也算失敗（上游變慢時一樣會跳脫）。
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """breaker 為 open：這次呼叫沒有送到上游"""
+
+    def __init__(self, name: str):
+        super().__init__(f"circuit '{name}' is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+        slow_call_seconds: Optional[float] = None,
+    ):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_seconds = reset_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """這次可以呼叫上游嗎？half_open 時只有一個 caller 拿到 True（探測）"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, elapsed: float = 0.0):
+        if self.slow_call_seconds is not None and elapsed > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state != CLOSED:
+                print(f"[breaker] {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                print(f"[breaker] {self.name} open after {self.failures} failures")
+
+    @contextmanager
+    def guard(self):
+        """
+        with breakers["openai"].guard():
+            ...
+        open → 直接丟 CircuitOpenError；例外 → 記失敗；正常結束 → 記成功
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record_failure()
+            raise
+        self.record_success(time.perf_counter() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(self.reset_seconds - (time.monotonic() - self.opened_at), 0.0), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "retry_in_seconds": retry_in,
+            }
+
+
+breakers: Dict[str, CircuitBreaker] = {
+    "yfinance": CircuitBreaker(
+        "yfinance",
+        slow_call_seconds=float(os.getenv("YFINANCE_SLOW_CALL_SECONDS", "10")),
+    ),
+    "openai": CircuitBreaker("openai"),
+    "gemini": CircuitBreaker("gemini"),
+}
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {name: b.stats() for name, b in breakers.items()}
@@ -0,0 +1,156 @@
+# compression.py — 回應壓縮 middleware（brotli 優先，沒裝 brotli 套件 → 只用 gzip）
+#
+# - 只壓縮一次送完的 body（JSON 等）；串流回應（SSE）原樣通過，不延遲任何 chunk
+# - body 小於 COMPRESSION_MIN_BYTES 不壓（壓了反而更大 / 不划算）
+# - 已經有 Content-Encoding 的回應不動
+# - 強 ETag 依編碼加後綴（"abc" → "abc-br"），同一版本不同編碼不共用 validator；
+#   比對 If-None-Match 時用 strip_etag_encoding 去掉後綴；
+#   304 沒有 body 可壓，但 ETag 要跟 client 手上那份（壓縮過的）200 一致 → 同樣加後綴
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用套件
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+# 已經是壓縮格式的內容不再壓
+_SKIP_TYPES = (b"image/", b"video/", b"audio/", b"application/zip", b"application/gzip", b"text/event-stream")
+
+
+def _accepted(header: str) -> set:
+    """Accept-Encoding → 可接受的編碼（q=0 視為拒絕）"""
+    accepted = set()
+    for part in header.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            key, _, value = p.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def strip_etag_encoding(tag: str) -> str:
+    """'"abc-br"' → '"abc"'（W/ 前綴也去掉）"""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    inner = tag.strip('"')
+    for suffix in ENCODING_SUFFIXES:
+        if inner.endswith(suffix):
+            inner = inner[: -len(suffix)]
+            break
+    return f'"{inner}"'
+
+
+def encoded_etag(tag: str, encoding: str) -> str:
+    """'"abc"' + gzip → '"abc-gzip"'（弱 ETag 不動）"""
+    if tag.startswith("W/") or not tag.endswith('"'):
+        return tag
+    return f'{tag[:-1]}-{encoding}"'
+
+
+def _rewrite_etag(headers, encoding: str) -> list:
+    return [
+        (k, encoded_etag(v.decode("latin-1"), encoding).encode("latin-1") if k.lower() == b"etag" else v)
+        for k, v in headers or []
+    ]
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                response_headers = dict(message.get("headers") or [])
+                content_type = response_headers.get(b"content-type", b"")
+                if message.get("status") == 304:
+                    # client 手上的是壓縮版（If-None-Match 帶 -gzip / -br）→ 304 回同一個 validator
+                    passthrough = True
+                    etag = response_headers.get(b"etag", b"").decode("latin-1")
+                    if etag and encoded_etag(etag, encoding) in if_none_match:
+                        message = {**message, "headers": _rewrite_etag(message.get("headers"), encoding)}
+                    await send(message)
+                elif b"content-encoding" in response_headers or content_type.startswith(_SKIP_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message  # 等 body 決定要不要壓
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            # 串流回應或太小 → 原樣送出
+            if more_body or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            new_headers = [
+                (k, v)
+                for k, v in _rewrite_etag(start_message.get("headers"), encoding)
+                if k.lower() != b"content-length"
+            ]
+            new_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start_message, "headers": new_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
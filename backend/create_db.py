@@ -1,26 +1,6 @@
-import sqlite3
+# create_db.py — 手動建立 / 升級 SQLite 資料庫（與 app 啟動時相同的 migration）
+from database import DB_PATH, init_db
 
-conn = sqlite3.connect("news.db")
-cur = conn.cursor()
+init_db()
 
-cur.execute("""
-CREATE TABLE IF NOT EXISTS news_cache (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    category TEXT,
-    original_title TEXT,
-    translated_title TEXT,
-    summary_en TEXT,
-    summary_zh TEXT,
-    sentiment TEXT,
-    source TEXT,
-    url TEXT,
-    published_at TEXT,
-    image_url TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
-""")
-
-conn.commit()
-conn.close()
-
-print("SQLite 資料庫建立完成：news.db")
+print(f"SQLite 資料庫建立完成：{DB_PATH}")
@@ -1,28 +1,186 @@
-# database.py — SQLite 連線 & Table 初始化
+# database.py — SQLite 連線池 & Table 初始化
 import sqlite3
 import os
+import queue
+import threading
 
-DB_PATH = "news.db"
+import tracing
 
+DB_PATH = os.getenv("DB_PATH", "news.db")
 
-def get_db():
+# 連線池：最多保留幾條閒置連線（0 → 每次都開新連線、close 即關閉）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+# PRAGMA 調校
+DB_BUSY_TIMEOUT_SECONDS = float(os.getenv("DB_BUSY_TIMEOUT_SECONDS", "5"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", str(16 * 1024)))  # 每條連線 page cache
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+
+class TracedCursor:
     """
-    回傳 SQLite 連線（請記得用完後 close）
+    sqlite3.Cursor 的包裝：每條 SQL 是一個 tracing span（只有在追蹤中的 request 才會用到）
+    只記 statement，不記參數。
     """
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # 讓結果可 dict 取值
-    return conn
 
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
 
-def init_db():
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, sql, parameters=()):
+        with tracing.span("sql", statement=tracing.sql_text(sql)):
+            self._cursor.execute(sql, parameters)
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        with tracing.span("sql", statement=tracing.sql_text(sql), many=True):
+            self._cursor.executemany(sql, seq_of_parameters)
+        return self
+
+    def executescript(self, script):
+        with tracing.span("sql", statement=tracing.sql_text(script), script=True):
+            self._cursor.executescript(script)
+        return self
+
+    def fetchall(self):
+        # SQLite 在 fetch 時才真正逐列執行查詢 → 大結果集的成本在這裡
+        with tracing.span("sql.fetchall") as sp:
+            rows = self._cursor.fetchall()
+            if sp is not None:
+                sp.attrs["rows"] = len(rows)
+        return rows
+
+
+class PooledConnection:
     """
-    初始化所有需要的資料表
-    若資料表已存在，不會覆蓋。
+    sqlite3.Connection 的薄包裝：
+    用法與原本相同，但 close() 是把連線還給連線池，而不是真的關閉。
     """
-    print("[DB] Initializing database tables...")
 
+    def __init__(self, pool: "ConnectionPool", conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def cursor(self, *args):
+        cur = self.__getattr__("cursor")(*args)
+        return TracedCursor(cur) if tracing.active() else cur
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """
+    SQLite 連線池：
+    - 連線在 thread 之間可借用（check_same_thread=False），同一時間只會有一個借用者
+    - 每條新連線開 WAL、synchronous=NORMAL、page cache、mmap
+    - 歸還時若還有未 commit 的 transaction → rollback，避免污染下一個借用者
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = max(size, 0)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row  # 讓結果可 dict 取值
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.reused += 1
+        except queue.Empty:
+            conn = self._connect()
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "created": self.created,
+            "reused": self.reused,
+        }
+
+
+pool = ConnectionPool(DB_PATH, DB_POOL_SIZE)
+
+
+def get_db():
+    """
+    從連線池借一條 SQLite 連線（請記得用完後 close → 歸還連線池）
+    """
+    return pool.acquire()
+
+
+def get_db_conn():
+    """
+    FastAPI dependency：同一個 request 內共用一條連線，request 結束時自動歸還。
+    """
     conn = get_db()
-    cur = conn.cursor()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+# ============================================================
+# Migrations：以 PRAGMA user_version 記錄目前 schema 版本
+# ============================================================
+
+def _migration_001_base_tables(cur):
+    """
+    初始資料表（舊版 init_db 建立的內容）
+    全部 IF NOT EXISTS：既有 DB 升級時不會覆蓋。
+    """
 
     # =============================
     # Users 用戶資料表
@@ -87,6 +245,20 @@ def init_db():
     );
     """)
 
+    # =============================
+    # News Summaries 新聞摘要（以內容 hash 為 key，跨 refresh 重複使用）
+    # =============================
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS news_summaries (
+        content_hash TEXT PRIMARY KEY,
+        translated_title TEXT,
+        summary_en TEXT,
+        summary_zh TEXT,
+        sentiment TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
   # =============================
     # Personal Stock Advice 個人化操作建議
     # =============================
@@ -104,7 +276,188 @@ def init_db():
     """)
 
 
-    conn.commit()
-    conn.close()
+def _migration_002_hot_query_indexes(cur):
+    """
+    main.py 熱門查詢用的索引：
+    - news_cache WHERE category=? ORDER BY created_at DESC
+    - holdings WHERE user_id=? ORDER BY created_at DESC
+    - holdings WHERE user_id=? AND symbol=?（同 user 不可重複 → UNIQUE）
+    - users WHERE nickname=?（登入）
+    - news_summaries 依 created_at 清除過期摘要
+    """
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_news_cache_category_created
+    ON news_cache(category, created_at DESC);
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_holdings_user_created
+    ON holdings(user_id, created_at DESC);
+    """)
+
+    # 舊資料若已有重複 (user_id, symbol)，不能建 UNIQUE → 退回一般索引，不動使用者資料
+    cur.execute("""
+    SELECT COUNT(*) FROM (
+        SELECT 1 FROM holdings GROUP BY user_id, symbol HAVING COUNT(*) > 1
+    )
+    """)
+    duplicates = cur.fetchone()[0]
+    if duplicates:
+        print(f"[DB] {duplicates} duplicated (user_id, symbol) holdings, skip UNIQUE index")
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_holdings_user_symbol
+        ON holdings(user_id, symbol);
+        """)
+    else:
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_holdings_user_symbol
+        ON holdings(user_id, symbol);
+        """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_users_nickname
+    ON users(nickname);
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_news_summaries_created
+    ON news_summaries(created_at);
+    """)
+
+
+def _migration_003_symbol_advice_cache(cur):
+    """
+    每日「個股 × 損益區間」分析快取：
+    同一天持有同一檔、損益落在同一區間的使用者共用同一份 GPT 分析
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS symbol_advice_cache (
+        symbol TEXT NOT NULL,
+        date TEXT NOT NULL,
+        band TEXT NOT NULL,
+        action TEXT,
+        reason_zh TEXT,
+        risk_level TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY(symbol, date, band)
+    );
+    """)
+
+
+def _migration_004_llm_cache(cur):
+    """
+    LLM 回覆快取（llm_cache.py）：key = provider + model + temperature + prompt hash
+    時間欄位用 epoch 秒，方便比較 TTL
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        call_site TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        model TEXT NOT NULL,
+        response TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        last_used_at REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used
+    ON llm_cache(last_used_at);
+    """)
+
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_llm_cache_expires
+    ON llm_cache(expires_at);
+    """)
+
+
+def _migration_005_portfolio_value_history(cur):
+    """
+    每位使用者每日的持股總市值 / 總成本（排程每天往後加一筆；改持股時從該日起重算）
+    """
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS portfolio_value_history (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        value REAL NOT NULL,
+        cost REAL NOT NULL,
+        PRIMARY KEY(user_id, date),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    );
+    """)
+
+
+def _migration_006_news_summary_last_used(cur):
+    """
+    news_summaries 改依 last_used_at 清除（每次被沿用就更新）：
+    ALTER TABLE 不能用 CURRENT_TIMESTAMP 當預設值 → 寫入時由程式填，舊資料沿用 created_at
+    """
+    cur.execute("ALTER TABLE news_summaries ADD COLUMN last_used_at TIMESTAMP")
+    cur.execute("UPDATE news_summaries SET last_used_at = created_at")
+
+    cur.execute("DROP INDEX IF EXISTS idx_news_summaries_created")
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_news_summaries_last_used
+    ON news_summaries(last_used_at);
+    """)
+
+
+# (version, 說明, function)：只能往後加，已發佈的 migration 不要改
+MIGRATIONS = [
+    (1, "base tables", _migration_001_base_tables),
+    (2, "hot query indexes", _migration_002_hot_query_indexes),
+    (3, "symbol advice cache", _migration_003_symbol_advice_cache),
+    (4, "llm response cache", _migration_004_llm_cache),
+    (5, "portfolio value history", _migration_005_portfolio_value_history),
+    (6, "news summary last used", _migration_006_news_summary_last_used),
+]
+
+
+def migrate(conn, target: int = None) -> int:
+    """
+    依序套用尚未執行的 migration（每個 migration 一個 transaction）。
+    target：只升級到指定版本（預設最新）。回傳最後的 schema 版本。
+    """
+    cur = conn.cursor()
+
+    for version, name, apply in MIGRATIONS:
+        if target is not None and version > target:
+            break
+
+        # BEGIN IMMEDIATE：多個 worker 同時啟動時，只有一個能執行 migration
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            current = cur.execute("PRAGMA user_version").fetchone()[0]
+            if version <= current:
+                conn.rollback()
+                continue
+
+            print(f"[DB] Applying migration {version}: {name}")
+            apply(cur)
+            cur.execute(f"PRAGMA user_version={version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    return cur.execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db():
+    """
+    初始化 / 升級所有需要的資料表與索引
+    若資料表已存在，不會覆蓋。
+    """
+    print("[DB] Initializing database tables...")
+
+    conn = get_db()
+    try:
+        version = migrate(conn)
+    finally:
+        conn.close()
 
-    print("[DB] All tables are ready.")
+    print(f"[DB] All tables are ready (schema version {version}).")
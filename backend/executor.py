@@ -0,0 +1,119 @@
+# executor.py — 阻塞呼叫（LLM / yfinance / SQLite）專用 thread pool
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+# 同時最多幾個阻塞呼叫在跑（超過的排隊）
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))
+
+
+class BlockingExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor + 排隊統計：
+    - queue_depth：已送出但還沒開始執行的工作數
+    - wait：從 submit 到真正開始執行的時間
+    """
+
+    def __init__(self, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix="blocking")
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, fn, /, *args, **kwargs):
+        enqueued = time.perf_counter()
+        with self._stats_lock:
+            self.queued += 1
+
+        def run():
+            wait = time.perf_counter() - enqueued
+            with self._stats_lock:
+                self.queued -= 1
+                self.active += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        return super().submit(run)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            started = self.completed + self.active
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self.queued,
+                "active": self.active,
+                "completed": self.completed,
+                "avg_wait_ms": round(self.total_wait / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+            }
+
+
+blocking_executor = BlockingExecutor(BLOCKING_POOL_SIZE)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """
+    在 blocking_executor 執行同步函式，不卡住 event loop。
+    會帶上目前的 contextvars（與 asyncio.to_thread 相同）。
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await loop.run_in_executor(blocking_executor, call)
+
+
+async def iterate_blocking(fn, *args, **kwargs):
+    """
+    在 blocking_executor 跑同步 generator，逐項 async yield（例如 LLM 串流回覆）。
+    呼叫端中途停止 → 背景 thread 在下一項時結束。
+    """
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    finished = object()
+    stopped = threading.Event()
+
+    def emit(item, error=None):
+        try:
+            loop.call_soon_threadsafe(items.put_nowait, (item, error))
+        except RuntimeError:
+            stopped.set()  # event loop 已關閉
+
+    def pump():
+        try:
+            for item in fn(*args, **kwargs):
+                if stopped.is_set():
+                    return
+                emit(item)
+        except BaseException as e:
+            emit(finished, e)
+            return
+        emit(finished)
+
+    task = asyncio.ensure_future(run_blocking(pump))
+    try:
+        while True:
+            item, error = await items.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+        if task.done():
+            task.exception()
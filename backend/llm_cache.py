@@ -0,0 +1,134 @@
+# llm_cache.py — LLM 回覆快取（SQLite，多個 worker / 重啟後共用）
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from database import get_db
+
+# 全部快取回覆加總最多幾 bytes，超過就從最久沒用的開始刪
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# 每寫入幾次才檢查一次總大小 / 清掉過期資料
+LLM_CACHE_EVICT_EVERY = int(os.getenv("LLM_CACHE_EVICT_EVERY", "20"))
+
+_lock = threading.Lock()
+_puts = 0
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def _normalize(prompt: Any) -> str:
+    """prompt 可以是字串或 messages list；空白差異不影響 key"""
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, ensure_ascii=False, sort_keys=True)
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def make_key(provider: str, model: str, temperature: Optional[float], prompt: Any) -> str:
+    raw = "\n".join([provider, model, repr(temperature), _normalize(prompt)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _count(call_site: str, field: str):
+    with _lock:
+        site = _stats.setdefault(call_site, {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0})
+        site[field] += 1
+
+
+def get(key: str, call_site: str) -> Optional[str]:
+    now = time.time()
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT response FROM llm_cache WHERE cache_key=? AND expires_at > ?",
+            (key, now),
+        )
+        row = cur.fetchone()
+        if row:
+            cur.execute(
+                "UPDATE llm_cache SET last_used_at=?, hits=hits+1 WHERE cache_key=?",
+                (now, key),
+            )
+            conn.commit()
+    finally:
+        conn.close()
+
+    _count(call_site, "hits" if row else "misses")
+    return row["response"] if row else None
+
+
+def put(key: str, call_site: str, provider: str, model: str, response: str, ttl_seconds: float):
+    global _puts
+
+    now = time.time()
+    conn = get_db()
+    try:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO llm_cache
+            (cache_key, call_site, provider, model, response, size,
+             created_at, expires_at, last_used_at, hits)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """,
+            (
+                key,
+                call_site,
+                provider,
+                model,
+                response,
+                len(response.encode("utf-8")),
+                now,
+                now + ttl_seconds,
+                now,
+            ),
+        )
+        conn.commit()
+
+        with _lock:
+            _puts += 1
+            should_evict = _puts % max(LLM_CACHE_EVICT_EVERY, 1) == 0
+        if should_evict:
+            evict(conn)
+    finally:
+        conn.close()
+
+    _count(call_site, "stores")
+
+
+def evict(conn=None):
+    """刪掉過期資料；總大小超過 LLM_CACHE_MAX_BYTES → 從最久沒用的開始刪"""
+    own = conn is None
+    if own:
+        conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+        total = cur.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total > LLM_CACHE_MAX_BYTES:
+            overflow = total - LLM_CACHE_MAX_BYTES
+            cur.execute("SELECT cache_key, size FROM llm_cache ORDER BY last_used_at")
+            doomed = []
+            for row in cur.fetchall():
+                if overflow <= 0:
+                    break
+                doomed.append((row["cache_key"],))
+                overflow -= row["size"]
+            cur.executemany("DELETE FROM llm_cache WHERE cache_key=?", doomed)
+        conn.commit()
+    finally:
+        if own:
+            conn.close()
+
+
+def record_bypass(call_site: str):
+    _count(call_site, "bypassed")
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {site: dict(counts) for site, counts in _stats.items()}
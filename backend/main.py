@@ -5,26 +5,46 @@
 import os
 import re
 import json
+import asyncio
 import base64
+import hashlib
+import importlib.util
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 import datetime as dt
 from datetime import datetime, timedelta, date
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Iterable
 import httpx
-import yfinance as yf
+import numpy as np
 import bcrypt
 
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import tzlocal  # APScheduler 的相依套件
 from dotenv import load_dotenv
 
 from openai import OpenAI
 
-from database import get_db, init_db  # 你提供的 database.py
+import database
+from database import get_db, get_db_conn, init_db  # 你提供的 database.py
+import analytics
+import breaker
+import compression
+import llm_cache
+import metrics
+import price_store
+import tracing
+from executor import blocking_executor, iterate_blocking, run_blocking
+from breaker import breakers
+from quotes import TTLCache, get_quotes, get_quotes_within, get_quote, get_info, cache_stats as quote_cache_stats
 
 
 # ============================================================
@@ -49,6 +69,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus 指標：每個 route 的延遲 / 進行中 request（GET /metrics）
+app.add_middleware(metrics.MetricsMiddleware, routes_app=app)
+
+# 每個 request 的 span tree / 慢 request 紀錄（TRACE_ENABLED=1 才開，GET /debug/traces）
+app.add_middleware(tracing.TracingMiddleware, routes_app=app)
+
+# gzip / brotli（COMPRESSION_MIN_BYTES 以上才壓；SSE 串流不壓）
+app.add_middleware(compression.CompressionMiddleware)
+
 # ============================================================
 # Security / Auth
 # ============================================================
@@ -63,6 +92,10 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 7 * 24 * 60
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# 已驗證 token → User 快取（最多幾筆 / 最長存活秒數，另受 token exp 限制）
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+
 # ============================================================
 # 基本設定 & DB 連線
 # ============================================================
@@ -117,8 +150,95 @@ class NewsItem(BaseModel):
     sentiment: Optional[str] = None  # 利多 / 中性 / 利空
 
 
+class PrincipalCache:
+    """
+    token → User 的 LRU 快取：
+    - 過期時間取 min(現在 + AUTH_CACHE_TTL_SECONDS, token exp)
+    - 使用者資料變更 / 刪除時用 invalidate_user() 清掉該使用者所有 token
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max(max_size, 1)
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # token -> (expires_at, User)
+        self._by_user: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, token: str):
+        _, user = self._data.pop(token)
+        tokens = self._by_user.get(user.id)
+        if tokens:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user.id]
+
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._data.get(token)
+            if entry and entry[0] > time.time():
+                self._data.move_to_end(token)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                self._drop(token)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user: User, token_exp: Optional[float]):
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            if token in self._data:
+                self._drop(token)
+            self._data[token] = (expires_at, user)
+            self._by_user.setdefault(user.id, set()).add(token)
+            while len(self._data) > self.max_size:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._drop(token)
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_MAX_SIZE, AUTH_CACHE_TTL_SECONDS)
+
+
 def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    """JWT -> uid -> DB user"""
+    """JWT -> uid -> DB user（驗證過的 token 會快取，命中時不查 DB）"""
+    with tracing.span("auth") as sp:
+        user = _resolve_user(token)
+        if sp is not None:
+            sp.attrs["user_id"] = user.id
+        return user
+
+
+def _resolve_user(token: str) -> User:
+    cached = principal_cache.get(token)
+    if cached:
+        return cached
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         uid = payload.get("sub")
@@ -137,12 +257,19 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         raise HTTPException(status_code=401, detail="User not found")
 
     # 你的 database.py 設定了 row_factory=sqlite3.Row，可用 dict key 取值
-    return User(
+    user = User(
         id=row["id"],
         email=row["email"],
         nickname=row["nickname"],
         created_at=row["created_at"],
     )
+    principal_cache.put(token, user, payload.get("exp"))
+    return user
+
+
+def invalidate_user_principal(user_id: int):
+    """使用者資料更新 / 刪除後呼叫，讓下一次 request 重新查 DB"""
+    principal_cache.invalidate_user(user_id)
 
 
 @app.get("/health")
@@ -150,6 +277,81 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/health/executor")
+def health_executor():
+    """阻塞呼叫 thread pool：排隊深度 / 等待時間"""
+    return blocking_executor.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus 文字格式（scrape 用）"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _metrics_cache_counts() -> dict:
+    """既有快取的 stats() → cache_requests_total / cache_hit_ratio"""
+    stats = {**quote_cache_stats(), "auth": principal_cache.stats(), "analytics": analytics_cache.stats()}
+    counts = metrics.counts_from_stats(stats)
+    for call_site, s in metrics.counts_from_stats(llm_cache.stats()).items():
+        counts[f"llm:{call_site}"] = s
+    return counts
+
+
+metrics.register_cache_source(_metrics_cache_counts)
+
+
+# 可以看 /debug/traces 的帳號（逗號分隔 email）；空 → 任何人都不行
+# trace 內含所有使用者的 request path / SQL / 持股代號 → 只有一般登入不夠
+TRACE_ADMIN_EMAILS = {
+    e.strip().lower() for e in os.getenv("TRACE_ADMIN_EMAILS", "").split(",") if e.strip()
+}
+
+
+def require_trace_admin(current: User = Depends(get_current_user)) -> User:
+    if current.email.lower() not in TRACE_ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="沒有權限查看 trace")
+    return current
+
+
+@app.get("/debug/traces", dependencies=[Depends(require_trace_admin)])
+def debug_traces(limit: int = 20):
+    """最近保留的慢 request trace（新的在前；TRACE_ENABLED=1 才會有資料；限 TRACE_ADMIN_EMAILS）"""
+    return {
+        "enabled": tracing.TRACE_ENABLED,
+        "slow_ms": tracing.TRACE_SLOW_MS,
+        "traces": tracing.recent(max(1, min(limit, tracing.TRACE_BUFFER_SIZE))),
+    }
+
+
+@app.get("/debug/traces/{trace_id}", dependencies=[Depends(require_trace_admin)])
+def debug_trace(trace_id: str):
+    trace = tracing.get(trace_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+
+@app.get("/health/breakers")
+def health_breakers():
+    """各外部服務的 circuit breaker 狀態"""
+    return breaker.stats()
+
+
+@app.get("/health/cache")
+def health_cache():
+    """各快取命中 / 未命中 / 淘汰次數"""
+    return {
+        **quote_cache_stats(),
+        "news_refresh": news_refresh_stats,
+        "db_pool": database.pool.stats(),
+        "auth": principal_cache.stats(),
+        "llm": llm_cache.stats(),
+        "price_store": price_store.stats(),
+        "analytics": analytics_cache.stats(),
+    }
+
+
 # -------------------------
 # Auth Routes
 # -------------------------
@@ -164,17 +366,25 @@ def register(payload: UserRegister):
         conn.close()
         raise HTTPException(status_code=400, detail="Email 已註冊")
 
+    # nickname 可用來登入 → 不可與其他帳號重複（空白視為沒填）
+    nickname = (payload.nickname or "").strip() or None
+    if nickname:
+        cur.execute("SELECT id FROM users WHERE nickname=?", (nickname,))
+        if cur.fetchone():
+            conn.close()
+            raise HTTPException(status_code=400, detail="暱稱已被使用")
+
     pw_hash = hash_password(payload.password)
 
     cur.execute(
         "INSERT INTO users (email, password_hash, nickname) VALUES (?, ?, ?)",
-        (payload.email, pw_hash, payload.nickname),
+        (payload.email, pw_hash, nickname),
     )
     conn.commit()
     uid = cur.lastrowid
     conn.close()
 
-    return User(id=uid, email=payload.email, nickname=payload.nickname)
+    return User(id=uid, email=payload.email, nickname=nickname)
 
 
 @app.post("/auth/login")
@@ -220,16 +430,43 @@ def login_user(payload: UserLogin):
 
 @app.get("/me", response_model=User)
 def get_me(current: User = Depends(get_current_user)):
-    conn = get_db()
+    # get_current_user 已是最新的 DB 資料（profile 變更時會清快取）
+    return current
+
+
+class ProfileUpdate(BaseModel):
+    nickname: str
+
+
+@app.put("/users/update-profile", response_model=User)
+def update_profile(
+    payload: ProfileUpdate,
+    current: User = Depends(get_current_user),
+    conn=Depends(get_db_conn),
+):
+    # nickname 也是登入帳號（login_user 以 nickname 查詢）→ 不可空白、不可含 @、不可重複
+    nickname = payload.nickname.strip()
+    if not nickname:
+        raise HTTPException(status_code=400, detail="暱稱不可空白")
+    if "@" in nickname:
+        raise HTTPException(status_code=400, detail="暱稱不可包含 @")
+
     cur = conn.cursor()
-    cur.execute("SELECT id, email, nickname, created_at FROM users WHERE id=?", (current.id,))
-    row = cur.fetchone()
-    conn.close()
+    cur.execute("SELECT id FROM users WHERE nickname=? AND id<>?", (nickname, current.id))
+    if cur.fetchone():
+        raise HTTPException(status_code=400, detail="暱稱已被使用")
 
-    if not row:
-        raise HTTPException(status_code=404, detail="User not found")
+    cur.execute("UPDATE users SET nickname=? WHERE id=?", (nickname, current.id))
+    conn.commit()
+
+    invalidate_user_principal(current.id)
 
-    return User(id=row[0], email=row[1], nickname=row[2], created_at=row[3])
+    return User(
+        id=current.id,
+        email=current.email,
+        nickname=nickname,
+        created_at=current.created_at,
+    )
 
 
 # ============================================================
@@ -241,9 +478,192 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 NEWS_API_KEY = os.getenv("NEWS_API_KEY")
 NEWS_SUMMARIZER_PROVIDER = os.getenv("NEWS_SUMMARIZER_PROVIDER", "openai").lower()
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+# 單次 LLM 呼叫逾時秒數（OpenAI SDK 預設 600 秒）/ 失敗重試次數
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+# 新聞摘要：同時最多幾個 LLM 呼叫 / 單篇逾時秒數
+NEWS_SUMMARY_CONCURRENCY = int(os.getenv("NEWS_SUMMARY_CONCURRENCY", "5"))
+NEWS_SUMMARY_TIMEOUT_SECONDS = float(os.getenv("NEWS_SUMMARY_TIMEOUT_SECONDS", "20"))
+
+# 批次摘要：一次 LLM 呼叫處理多篇（0 → 關閉，一律逐篇）
+NEWS_SUMMARY_BATCH = os.getenv("NEWS_SUMMARY_BATCH", "1") != "0"
+NEWS_SUMMARY_BATCH_TOKEN_BUDGET = int(os.getenv("NEWS_SUMMARY_BATCH_TOKEN_BUDGET", "6000"))
+NEWS_SUMMARY_BATCH_MAX_ITEMS = int(os.getenv("NEWS_SUMMARY_BATCH_MAX_ITEMS", "10"))
+# 批次逾時 = 單篇逾時 + 每多一篇加幾秒（輸出長度跟篇數成正比），上限 NEWS_SUMMARY_BATCH_TIMEOUT_MAX_SECONDS
+NEWS_SUMMARY_BATCH_TIMEOUT_PER_ITEM_SECONDS = float(os.getenv("NEWS_SUMMARY_BATCH_TIMEOUT_PER_ITEM_SECONDS", "6"))
+NEWS_SUMMARY_BATCH_TIMEOUT_MAX_SECONDS = float(os.getenv("NEWS_SUMMARY_BATCH_TIMEOUT_MAX_SECONDS", "90"))
+
+# 已產生的摘要保留幾天（供之後 refresh 重複使用）
+NEWS_SUMMARY_RETENTION_DAYS = int(os.getenv("NEWS_SUMMARY_RETENTION_DAYS", "7"))
+
+openai_client = (
+    OpenAI(api_key=OPENAI_API_KEY, timeout=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES)
+    if OPENAI_API_KEY
+    else None
+)
 gemini_client = genai.Client(api_key=GEMINI_API_KEY) if GEMINI_API_KEY else None
 
+# 共用 HTTP client（NewsAPI 等）：keep-alive 連線池，TLS handshake 跨 refresh 重用
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "60"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+NEWSAPI_TIMEOUT_SECONDS = float(os.getenv("NEWSAPI_TIMEOUT_SECONDS", "10"))
+
+# HTTP/2 需要 h2 套件（httpx[http2]）；沒裝 → 退回 HTTP/1.1
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """startup 時建立；在 startup 之前被呼叫（例如直接掛 ASGI transport）→ 這裡補建"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+            timeout=httpx.Timeout(NEWSAPI_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        )
+    return http_client
+
+# 各呼叫點的 LLM 回覆快取存活秒數（llm_cache.py）
+LLM_CACHE_TTLS = {
+    "news_summary": 7 * 24 * 60 * 60,
+    "news_summary_batch": 7 * 24 * 60 * 60,
+    "market_report": 6 * 60 * 60,
+    "personal_actions": 12 * 60 * 60,
+    "personal_advice": 12 * 60 * 60,
+    "ocr": 30 * 24 * 60 * 60,
+}
+
+
+def openai_chat(
+    call_site: str,
+    messages: list,
+    temperature: float,
+    model: str = "gpt-4o-mini",
+    bypass_cache: bool = False,
+    **kwargs,
+) -> str:
+    """
+    OpenAI chat.completions + 共用回覆快取（同步；async 內請用 run_blocking）
+    相同 provider / model / temperature / prompt → 直接回快取
+    bypass_cache=True → 一定呼叫 LLM，但新結果仍會寫回快取
+    """
+    key = llm_cache.make_key("openai", model, temperature, messages)
+    if bypass_cache:
+        llm_cache.record_bypass(call_site)
+    else:
+        cached = llm_cache.get(key, call_site)
+        if cached is not None:
+            return cached
+
+    # breaker open → 直接丟 CircuitOpenError（呼叫端既有的 except 會走 fallback）
+    with breakers["openai"].guard(), metrics.external_call("openai", "chat.completions"):
+        resp = openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            **kwargs,
+        )
+    text = resp.choices[0].message.content or ""
+
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        metrics.record_llm_usage(
+            "openai", model, call_site,
+            getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0),
+        )
+
+    if text.strip():
+        llm_cache.put(key, call_site, "openai", model, text, LLM_CACHE_TTLS.get(call_site, 60 * 60))
+    return text
+
+
+def openai_chat_stream(
+    call_site: str,
+    messages: list,
+    temperature: float,
+    model: str = "gpt-4o-mini",
+    **kwargs,
+):
+    """
+    openai_chat 的 stream=True 版本（同步 generator；async 內請用 iterate_blocking）
+    逐段 yield 文字，不讀快取；完整回覆結束後仍寫回共用快取
+    """
+    llm_cache.record_bypass(call_site)
+
+    # include_usage：最後一個 chunk（choices 為空）帶 token 用量
+    with breakers["openai"].guard(), metrics.external_call("openai", "chat.completions.stream"):
+        stream = openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs,
+        )
+
+    parts = []
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            metrics.record_llm_usage(
+                "openai", model, call_site,
+                getattr(usage, "prompt_tokens", 0), getattr(usage, "completion_tokens", 0),
+            )
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content or ""
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    text = "".join(parts)
+    if text.strip():
+        key = llm_cache.make_key("openai", model, temperature, messages)
+        llm_cache.put(key, call_site, "openai", model, text, LLM_CACHE_TTLS.get(call_site, 60 * 60))
+
+
+def gemini_generate(
+    call_site: str,
+    prompt: str,
+    model: str = "gemini-2.0-flash",
+    bypass_cache: bool = False,
+) -> str:
+    """Gemini generate_content + 共用回覆快取（同步）"""
+    key = llm_cache.make_key("gemini", model, None, prompt)
+    if bypass_cache:
+        llm_cache.record_bypass(call_site)
+    else:
+        cached = llm_cache.get(key, call_site)
+        if cached is not None:
+            return cached
+
+    with breakers["gemini"].guard(), metrics.external_call("gemini", "generate_content"):
+        resp = gemini_client.models.generate_content(
+            model=model,
+            contents=prompt,
+        )
+    text = getattr(resp, "text", None) or getattr(resp, "output_text", None) or ""
+
+    usage = getattr(resp, "usage_metadata", None)
+    if usage is not None:
+        metrics.record_llm_usage(
+            "gemini", model, call_site,
+            getattr(usage, "prompt_token_count", 0), getattr(usage, "candidates_token_count", 0),
+        )
+
+    if text.strip():
+        llm_cache.put(key, call_site, "gemini", model, text, LLM_CACHE_TTLS.get(call_site, 60 * 60))
+    return text
+
 # ============================================================
 # SQLite 工具：載入 / 儲存 / 檢查快取
 # ============================================================
@@ -279,42 +699,44 @@ def save_news_item(conn, category, art, title_zh, summary_en, summary_zh, sentim
         ),
     )
 
-def load_news_from_db(conn):
+NEWS_CATEGORIES = ("international", "us_finance")
+
+
+def load_category_news(conn, category: str) -> list:
     cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT translated_title, summary_en, summary_zh, sentiment,
+               source, url, image_url, published_at
+        FROM news_cache
+        WHERE category = ?
+        ORDER BY created_at DESC
+        LIMIT 5
+        """,
+        (category,),
+    )
+    rows = cur.fetchall()
+    return [
+        {
+            "title": r[0],
+            "summary_en": r[1],
+            "summary_zh": r[2],
+            "sentiment": r[3],
+            "source": r[4],
+            "url": r[5],
+            "image_url": r[6],
+            "published_at": r[7],
+        }
+        for r in rows
+    ]
 
-    def load(category: str):
-        cur.execute(
-            """
-            SELECT translated_title, summary_en, summary_zh, sentiment,
-                   source, url, image_url, published_at
-            FROM news_cache
-            WHERE category = ?
-            ORDER BY created_at DESC
-            LIMIT 5
-            """,
-            (category,),
-        )
-        rows = cur.fetchall()
-        return [
-            {
-                "title": r[0],
-                "summary_en": r[1],
-                "summary_zh": r[2],
-                "sentiment": r[3],
-                "source": r[4],
-                "url": r[5],
-                "image_url": r[6],
-                "published_at": r[7],
-            }
-            for r in rows
-        ]
 
-    return {
-        "international": load("international"),
-        "us_finance": load("us_finance"),
-    }
+def load_news_from_db(conn):
+    return {category: load_category_news(conn, category) for category in NEWS_CATEGORIES}
 
-def is_cache_expired(conn, category: str) -> bool:
+
+def news_cache_age_seconds(conn, category: str) -> Optional[float]:
+    """最新一筆快取距今幾秒；沒有快取 → None"""
     cur = conn.cursor()
     cur.execute(
         """
@@ -327,24 +749,78 @@ def is_cache_expired(conn, category: str) -> bool:
     )
     row = cur.fetchone()
     if not row:
-        return True
+        return None
 
     ts = row[0]
 
-    # SQLite 產出格式："2025-12-08 14:40:01" → 要用 strptime
+    # SQLite CURRENT_TIMESTAMP 為 UTC："2025-12-08 14:40:01" → 要用 strptime
     try:
         last_time = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
     except:
-        return True
+        return None
+
+    return max((datetime.utcnow() - last_time).total_seconds(), 0.0)
+
 
-    return datetime.now() - last_time > timedelta(minutes=CACHE_EXPIRE_MINUTES)
+def is_cache_expired(conn, category: str) -> bool:
+    age = news_cache_age_seconds(conn, category)
+    if age is None:
+        return True
+    return age > CACHE_EXPIRE_MINUTES * 60
 
 
 # ============================================================
 # NewsAPI 抓取新聞
 # ============================================================
 
-async def fetch_news_from_newsapi() -> dict:
+NEWSAPI_REQUESTS = {
+    # 🌍 國際科技財經
+    "international": (
+        "https://newsapi.org/v2/everything",
+        {
+            "q": "(technology OR tech OR semiconductor OR chip OR AI OR finance OR stock OR market)",
+            "language": "en",
+            "sortBy": "publishedAt",
+            "pageSize": 10,
+        },
+    ),
+    # 🇺🇸 美國科技財經
+    "us_finance": (
+        "https://newsapi.org/v2/top-headlines",
+        {
+            "country": "us",
+            "category": "technology",
+            "pageSize": 10,
+        },
+    ),
+}
+
+
+def _filter_newsapi_articles(data: dict) -> list:
+    articles = []
+    for art in data.get("articles", []):
+        if not art.get("urlToImage"):
+            continue
+
+        bad_keywords = ["sports", "entertainment", "gossip"]
+        if any(k in (art.get("title") or "").lower() for k in bad_keywords):
+            continue
+
+        articles.append(
+            {
+                "title": art.get("title"),
+                "url": art.get("url"),
+                "description": art.get("description") or "",
+                "content": art.get("content") or "",
+                "source": (art.get("source") or {}).get("name"),
+                "published_at": art.get("publishedAt"),
+                "image_url": art.get("urlToImage"),
+            }
+        )
+    return articles
+
+
+async def fetch_news_from_newsapi(categories=NEWS_CATEGORIES) -> dict:
     """
     精準抓取：
     - 國際科技財經新聞（Global Tech Finance）
@@ -352,92 +828,31 @@ async def fetch_news_from_newsapi() -> dict:
     過濾條件：
     - 必須有圖片
     - 排除 sports / entertainment / gossip 類型
+    只抓 categories 指定的類別，回傳 {category: [article, ...]}（各最多 5 則）
+    各類別同時抓（共用連線池），總耗時 ≈ 最慢的那一個；單一類別失敗 / 逾時 → 該類別為空
     """
     if not NEWS_API_KEY:
         raise RuntimeError("NEWS_API_KEY not set")
 
-    international_articles = []
-    us_finance_articles = []
-
-    async with httpx.AsyncClient(timeout=10.0) as client:
-
-        # 🌍 國際科技財經
-        try:
-            intl_resp = await client.get(
-                "https://newsapi.org/v2/everything",
-                params={
-                    "q": "(technology OR tech OR semiconductor OR chip OR AI OR finance OR stock OR market)",
-                    "language": "en",
-                    "sortBy": "publishedAt",
-                    "pageSize": 10,
-                    "apiKey": NEWS_API_KEY,
-                },
-            )
-            intl_data = intl_resp.json()
-
-            for art in intl_data.get("articles", []):
-                if not art.get("urlToImage"):
-                    continue
-
-                bad_keywords = ["sports", "entertainment", "gossip"]
-                if any(k in (art.get("title") or "").lower() for k in bad_keywords):
-                    continue
-
-                international_articles.append(
-                    {
-                        "title": art.get("title"),
-                        "url": art.get("url"),
-                        "description": art.get("description") or "",
-                        "content": art.get("content") or "",
-                        "source": (art.get("source") or {}).get("name"),
-                        "published_at": art.get("publishedAt"),
-                        "image_url": art.get("urlToImage"),
-                    }
-                )
-
-        except Exception as e:
-            print("Error fetching international tech finance news:", e)
+    client = get_http_client()
 
-        # 🇺🇸 美國科技財經
+    async def fetch(category: str):
+        url, params = NEWSAPI_REQUESTS[category]
         try:
-            us_resp = await client.get(
-                "https://newsapi.org/v2/top-headlines",
-                params={
-                    "country": "us",
-                    "category": "technology",
-                    "pageSize": 10,
-                    "apiKey": NEWS_API_KEY,
-                },
-            )
-            us_data = us_resp.json()
-
-            for art in us_data.get("articles", []):
-                if not art.get("urlToImage"):
-                    continue
-
-                bad_keywords = ["sports", "entertainment", "gossip"]
-                if any(k in (art.get("title") or "").lower() for k in bad_keywords):
-                    continue
-
-                us_finance_articles.append(
-                    {
-                        "title": art.get("title"),
-                        "url": art.get("url"),
-                        "description": art.get("description") or "",
-                        "content": art.get("content") or "",
-                        "source": (art.get("source") or {}).get("name"),
-                        "published_at": art.get("publishedAt"),
-                        "image_url": art.get("urlToImage"),
-                    }
+            with metrics.external_call("newsapi", "GET " + url.rsplit("/", 1)[-1]) as call:
+                resp = await client.get(
+                    url,
+                    params={**params, "apiKey": NEWS_API_KEY},
+                    timeout=NEWSAPI_TIMEOUT_SECONDS,
                 )
-
+                if resp.status_code >= 400:
+                    call.outcome = "error"
+            return category, _filter_newsapi_articles(resp.json())[:5]
         except Exception as e:
-            print("Error fetching US tech finance news:", e)
+            print(f"Error fetching {category} news:", e)
+            return category, []
 
-    return {
-        "international": international_articles[:5],
-        "us_finance": us_finance_articles[:5],
-    }
+    return dict(await asyncio.gather(*(fetch(c) for c in categories)))
 
 # ============================================================
 # LLM 摘要 + Sentiment
@@ -448,25 +863,32 @@ def _parse_summary(text: str):
     從 LLM 回覆中解析：
     TITLE_ZH / ZH / EN / SENTIMENT（可選）
     """
-    title_zh = ""
-    zh = ""
-    en = ""
-    sentiment = ""
+    fields = {"title_zh": "", "zh": "", "en": "", "sentiment": ""}
+    current = None
 
     for line in text.splitlines():
         s = line.strip()
         low = s.lower()
 
         if low.startswith("title_zh"):
-            title_zh = s.split(":", 1)[1].strip()
+            current = "title_zh"
         elif low.startswith("zh:"):
-            zh = s.split(":", 1)[1].strip()
+            current = "zh"
         elif low.startswith("en:"):
-            en = s.split(":", 1)[1].strip()
+            current = "en"
         elif low.startswith("sentiment"):
-            sentiment = s.split(":", 1)[1].strip()
+            current = "sentiment"
+        elif current and s:
+            # 摘要跨多行 → 接到目前欄位後面
+            sep = "" if current in ("title_zh", "zh") else " "
+            fields[current] = f"{fields[current]}{sep}{s}".strip()
+            continue
+        else:
+            continue
 
-    return title_zh, en, zh, sentiment
+        fields[current] = s.split(":", 1)[1].strip() if ":" in s else ""
+
+    return fields["title_zh"], fields["en"], fields["zh"], fields["sentiment"]
 
 def _summarize_with_openai(title: str, body: str):
     """
@@ -498,12 +920,12 @@ SENTIMENT: <利多/中性/利空>
 """
 
     try:
-        resp = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
+        full = openai_chat(
+            "news_summary",
+            [{"role": "user", "content": prompt}],
             temperature=0.3,
+            timeout=NEWS_SUMMARY_TIMEOUT_SECONDS,
         )
-        full = resp.choices[0].message.content or ""
     except Exception as e:
         print("OpenAI summarization error:", e)
         return "", "", "", ""
@@ -538,11 +960,7 @@ EN: <English summary>
 """
 
     try:
-        resp = gemini_client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt,
-        )
-        full = getattr(resp, "text", None) or getattr(resp, "output_text", None) or ""
+        full = gemini_generate("news_summary", prompt)
     except Exception as e:
         print("Gemini summarization error:", e)
         return "", "", "", ""
@@ -558,17 +976,20 @@ def summarize_article(title: str, description: str, content: str):
     if not body:
         return title, "", "", "中性"
 
-    title_zh = ""
-    en = ""
-    zh = ""
-    sentiment = ""
+    return _summary_fallback(title, body, *_summarize_with_provider(title, body))
 
+
+def _summarize_with_provider(title: str, body: str):
+    """依 NEWS_SUMMARIZER_PROVIDER 呼叫 LLM，不做 fallback"""
     if NEWS_SUMMARIZER_PROVIDER == "openai":
-        title_zh, en, zh, sentiment = _summarize_with_openai(title, body)
-    elif NEWS_SUMMARIZER_PROVIDER == "gemini":
-        title_zh, en, zh, sentiment = _summarize_with_gemini(title, body)
+        return _summarize_with_openai(title, body)
+    if NEWS_SUMMARIZER_PROVIDER == "gemini":
+        return _summarize_with_gemini(title, body)
+    return "", "", "", ""
 
-    # fallback
+
+def _summary_fallback(title: str, body: str, title_zh="", en="", zh="", sentiment=""):
+    """LLM 沒給的欄位用原文補上"""
     if not title_zh:
         title_zh = title
     if not en:
@@ -581,138 +1002,526 @@ def summarize_article(title: str, description: str, content: str):
     return title_zh, en, zh, sentiment
 
 
+def news_content_hash(art: dict) -> str:
+    """摘要快取 key：URL + 標題 + 內文（內文同 summarize_article，content 優先）"""
+    body = art.get("content") or art.get("description") or ""
+    raw = "\n".join([art.get("url") or "", art.get("title") or "", body])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
-# ============================================================
-# /news：使用 SQLite 快取 + Sentiment
-# ============================================================
 
-@app.get("/news")
-async def get_news():
+def load_news_summaries(conn, hashes: list) -> dict:
+    if not hashes:
+        return {}
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT content_hash, translated_title, summary_en, summary_zh, sentiment
+        FROM news_summaries
+        WHERE content_hash IN ({",".join("?" * len(hashes))})
+        """,
+        hashes,
+    )
+    return {r[0]: (r[1], r[2], r[3], r[4]) for r in cur.fetchall()}
+
+
+def save_news_summaries(conn, summaries: dict, reused: Iterable[str] = ()):
     """
-    1. 先檢查 SQLite 快取是否過期
-    2. 未過期 → 直接從 DB 載入
-    3. 過期 → NewsAPI 抓新資料 + LLM 摘要 + 寫入 DB
-    4. 回傳：
-       - 國際科技財經
-       - 美國科技財經
-       各 5 則，含：
-       title, summary_zh, summary_en, sentiment, image_url, ...
+    summaries: {content_hash: (title_zh, summary_en, summary_zh, sentiment)}
+    reused：這次沿用的 content_hash → 更新 last_used_at
+    清除依 last_used_at：還在用的摘要不會因為建立得早就被刪掉重做
     """
+    cur = conn.cursor()
+    cur.executemany(
+        """
+        INSERT OR REPLACE INTO news_summaries
+        (content_hash, translated_title, summary_en, summary_zh, sentiment, last_used_at)
+        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """,
+        [(h, *summary) for h, summary in summaries.items()],
+    )
+    cur.executemany(
+        "UPDATE news_summaries SET last_used_at=CURRENT_TIMESTAMP WHERE content_hash=?",
+        [(h,) for h in reused],
+    )
+    cur.execute(
+        "DELETE FROM news_summaries WHERE last_used_at < datetime('now', ?)",
+        (f"-{NEWS_SUMMARY_RETENTION_DAYS} days",),
+    )
+
 
+def _load_stored_summaries(hashes: list) -> dict:
     conn = get_db()
+    try:
+        return load_news_summaries(conn, hashes)
+    finally:
+        conn.close()
 
-    from_cache_international = not is_cache_expired(conn, "international")
-    from_cache_us_finance = not is_cache_expired(conn, "us_finance")
 
-    # ✅ 若兩個 category 的快取都還有效 → 直接回 DB
-    if from_cache_international and from_cache_us_finance:
-        data = load_news_from_db(conn)
+def _store_summaries(summaries: dict, reused: Iterable[str] = ()):
+    conn = get_db()
+    try:
+        save_news_summaries(conn, summaries, reused)
+        conn.commit()
+    finally:
         conn.close()
-        return data
 
-    # ❌ 至少有一個過期 → 重新抓
-    raw = await fetch_news_from_newsapi()
 
-    international_items = []
-    us_finance_items = []
+SENTIMENTS = ("利多", "中性", "利空")
 
-    cur = conn.cursor()
-    # 先刪除舊資料（兩個 category）
-    if not from_cache_international:
-        cur.execute("DELETE FROM news_cache WHERE category='international'")
+# 批次 prompt 的固定說明約佔多少 token；每篇回覆約需多少 token
+_BATCH_PROMPT_OVERHEAD_TOKENS = 400
+_BATCH_ANSWER_TOKENS_PER_ITEM = 250
 
-    if not from_cache_us_finance:
-        cur.execute("DELETE FROM news_cache WHERE category='us_finance'")
 
-    # 🌍 國際
-    for art in raw["international"]:
-        title = art["title"] or ""
-        desc = art.get("description", "") or ""
-        content = art.get("content", "") or ""
+def _estimate_tokens(text: str) -> int:
+    """粗估 token 數（英文約 4 字元 / token）"""
+    return len(text) // 4 + 1
 
-        title_zh, summary_en, summary_zh, sentiment = summarize_article(title, desc, content)
 
-        save_news_item(
-            conn,
-            "international",
-            art,
-            title_zh,
-            summary_en,
-            summary_zh,
-            sentiment=sentiment,
-        )
+def plan_summary_batches(items: list) -> list:
+    """
+    items: [(id, title, body)] → 依 token 預算切成多批
+    每批至少一篇；單篇超過預算就自己一批
+    """
+    batches = []
+    current = []
+    used = _BATCH_PROMPT_OVERHEAD_TOKENS
+
+    for item in items:
+        cost = _estimate_tokens(item[1]) + _estimate_tokens(item[2]) + _BATCH_ANSWER_TOKENS_PER_ITEM
+        if current and (
+            used + cost > NEWS_SUMMARY_BATCH_TOKEN_BUDGET
+            or len(current) >= NEWS_SUMMARY_BATCH_MAX_ITEMS
+        ):
+            batches.append(current)
+            current = []
+            used = _BATCH_PROMPT_OVERHEAD_TOKENS
+        current.append(item)
+        used += cost
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_batch_summary(text: str, ids: set) -> dict:
+    """
+    解析批次回覆 {"items": [{id, title_zh, summary_en, summary_zh, sentiment}]}
+    只回傳通過驗證的項目：{id: (title_zh, summary_en, summary_zh, sentiment)}
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end == -1:
+        return {}
 
-        international_items.append(
-            NewsItem(
-                title=title_zh,
-                url=art["url"],
-                summary_en=summary_en,
-                summary_zh=summary_zh,
-                sentiment=sentiment,
-                source=art["source"],
-                published_at=art["published_at"],
-                image_url=art["image_url"],
-            )
-        )
+    try:
+        data = json.loads(text[start : end + 1])
+    except Exception as e:
+        print("[news batch json parse error]", e)
+        return {}
 
-    # 🇺🇸 美國
-    for art in raw["us_finance"]:
-        title = art["title"] or ""
-        desc = art.get("description", "") or ""
-        content = art.get("content", "") or ""
+    items = data.get("items") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return {}
 
-        title_zh, summary_en, summary_zh, sentiment = summarize_article(title, desc, content)
+    parsed = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        item_id = str(item.get("id", ""))
+        fields = [item.get(k) for k in ("title_zh", "summary_en", "summary_zh")]
+        if item_id not in ids or not all(isinstance(f, str) and f.strip() for f in fields):
+            continue
+        sentiment = item.get("sentiment")
+        if sentiment not in SENTIMENTS:
+            sentiment = "中性"
+        parsed[item_id] = (fields[0].strip(), fields[1].strip(), fields[2].strip(), sentiment)
+    return parsed
 
-        save_news_item(
-            conn,
-            "us_finance",
-            art,
-            title_zh,
-            summary_en,
-            summary_zh,
-            sentiment=sentiment,
-        )
 
-        us_finance_items.append(
-            NewsItem(
-                title=title_zh,
-                url=art["url"],
-                summary_en=summary_en,
-                summary_zh=summary_zh,
-                sentiment=sentiment,
-                source=art["source"],
-                published_at=art["published_at"],
-                image_url=art["image_url"],
-            )
-        )
+def news_summary_batch_timeout(n_items: int) -> float:
+    """n 篇一次摘要的逾時秒數"""
+    timeout = NEWS_SUMMARY_TIMEOUT_SECONDS + NEWS_SUMMARY_BATCH_TIMEOUT_PER_ITEM_SECONDS * max(n_items - 1, 0)
+    return min(timeout, max(NEWS_SUMMARY_BATCH_TIMEOUT_MAX_SECONDS, NEWS_SUMMARY_TIMEOUT_SECONDS))
 
-    conn.commit()
-    conn.close()
 
-    return {
-        "international": international_items,
-        "us_finance": us_finance_items,
-    }
+def _summarize_batch_with_provider(items: list) -> dict:
+    """
+    一次 LLM 呼叫摘要多篇：items [(id, title, body)]
+    回傳 {id: (title_zh, summary_en, summary_zh, sentiment)}，只含通過驗證的項目
+    """
+    articles_json = json.dumps(
+        [{"id": item_id, "title": title, "body": body} for item_id, title, body in items],
+        ensure_ascii=False,
+    )
 
+    prompt = f"""
+你是一位專業的國際科技財經新聞摘要助手。
 
-# ============================================================
-# Holdings
-# ============================================================
+以下是 JSON 格式的多則新聞（每則有 id / title / body）。請針對「每一則」完成：
+1. title_zh：繁體中文標題翻譯
+2. summary_zh：繁體中文摘要（自然、口語、易讀）
+3. summary_en：英文摘要（簡潔、正式）
+4. sentiment：對股市為「利多 / 中性 / 利空」三選一
 
-class HoldingCreate(BaseModel):
-    symbol: str
-    shares: float
-    cost_basis: float
-    purchase_date: Optional[date] = None
+只回傳 JSON 物件，不要加任何多餘文字，id 必須與輸入相同。格式如下：
 
+{{"items": [{{"id": "0", "title_zh": "...", "summary_en": "...", "summary_zh": "...", "sentiment": "中性"}}]}}
 
-class HoldingUpdate(BaseModel):
-    shares: float
-    cost_basis: float
-    purchase_date: Optional[date] = None
+新聞：
+{articles_json}
+"""
+
+    if NEWS_SUMMARIZER_PROVIDER == "openai":
+        if not openai_client:
+            return {}
+        text = openai_chat(
+            "news_summary_batch",
+            [{"role": "user", "content": prompt}],
+            temperature=0.3,
+            response_format={"type": "json_object"},
+            timeout=news_summary_batch_timeout(len(items)),
+        )
+    elif NEWS_SUMMARIZER_PROVIDER == "gemini":
+        if not gemini_client:
+            return {}
+        text = gemini_generate("news_summary_batch", prompt)
+    else:
+        return {}
 
+    return _parse_batch_summary(text, {item_id for item_id, _, _ in items})
 
-def normalize_symbol(symbol: str) -> str:
+
+_summary_semaphore = asyncio.Semaphore(NEWS_SUMMARY_CONCURRENCY)
+
+
+async def summarize_articles(articles: list, stats: Optional[dict] = None) -> list:
+    """
+    並行摘要多篇新聞（不阻塞 event loop）：
+    - 內容 hash 已摘要過 → 直接沿用 news_summaries，不再呼叫 LLM
+    - 其餘依 token 預算分批，每批一次 LLM 呼叫、回傳結構化 JSON
+    - 批次中驗證失敗 / 缺漏的文章 → 退回逐篇摘要
+    - 同時最多 NEWS_SUMMARY_CONCURRENCY 個 LLM 呼叫
+    - 單篇超過 NEWS_SUMMARY_TIMEOUT_SECONDS → 用原文 fallback（fallback 不寫入快取）；
+      批次逾時依篇數放寬（news_summary_batch_timeout），逾時的批次退回逐篇
+    回傳順序與 articles 相同，每筆為 (title_zh, summary_en, summary_zh, sentiment)
+    stats（可選）會被填入 reused / summarized / fallback 篇數與 batch_calls / single_calls
+    """
+    hashes = [news_content_hash(art) for art in articles]
+    stored = await run_blocking(_load_stored_summaries, hashes)
+
+    results: list = [None] * len(articles)
+    fresh = {}
+    reused = set()
+    counts = {"reused": 0, "summarized": 0, "fallback": 0, "batch_calls": 0, "single_calls": 0}
+
+    # (index, title, body)：需要 LLM 的文章
+    pending = []
+    for i, (art, content_hash) in enumerate(zip(articles, hashes)):
+        title = art.get("title") or ""
+        desc = art.get("description", "") or ""
+        content = art.get("content", "") or ""
+        body = content or desc or ""
+
+        if content_hash in stored:
+            counts["reused"] += 1
+            reused.add(content_hash)
+            results[i] = stored[content_hash]
+        elif not body:
+            results[i] = summarize_article(title, desc, content)
+        else:
+            pending.append((i, title, body))
+
+    def accept(i: int, title: str, body: str, summary: tuple):
+        results[i] = _summary_fallback(title, body, *summary)
+        fresh[hashes[i]] = results[i]
+        counts["summarized"] += 1
+
+    async def summarize_batch(batch: list):
+        items = [(str(i), title, body) for i, title, body in batch]
+        async with _summary_semaphore:
+            counts["batch_calls"] += 1
+            try:
+                parsed = await asyncio.wait_for(
+                    run_blocking(_summarize_batch_with_provider, items),
+                    timeout=news_summary_batch_timeout(len(items)),
+                )
+            except asyncio.TimeoutError:
+                print("Batch summarization timeout:", len(items), "articles")
+                parsed = {}
+            except Exception as e:
+                print("Batch summarization error:", e)
+                parsed = {}
+
+        for i, title, body in batch:
+            if str(i) in parsed:
+                accept(i, title, body, parsed[str(i)])
+
+    async def summarize_one(i: int, title: str, body: str):
+        async with _summary_semaphore:
+            counts["single_calls"] += 1
+            try:
+                title_zh, en, zh, sentiment = await asyncio.wait_for(
+                    run_blocking(_summarize_with_provider, title, body),
+                    timeout=NEWS_SUMMARY_TIMEOUT_SECONDS,
+                )
+                if title_zh and en and zh:
+                    accept(i, title, body, (title_zh, en, zh, sentiment))
+                    return
+            except asyncio.TimeoutError:
+                print("Summarization timeout:", title)
+            except Exception as e:
+                print("Summarization error:", e)
+
+        counts["fallback"] += 1
+        results[i] = _summary_fallback(title, body)
+
+    if NEWS_SUMMARY_BATCH and len(pending) > 1:
+        await asyncio.gather(*(summarize_batch(b) for b in plan_summary_batches(pending)))
+
+    # 沒走批次、或批次中失敗的文章 → 逐篇
+    await asyncio.gather(
+        *(summarize_one(i, title, body) for i, title, body in pending if results[i] is None)
+    )
+
+    if fresh or reused:
+        await run_blocking(_store_summaries, fresh, reused)
+
+    if stats is not None:
+        stats.update(counts)
+
+    return results
+
+
+# ============================================================
+# /news：使用 SQLite 快取 + Sentiment
+# ============================================================
+
+def replace_news_category(category: str, articles: list, summaries: list):
+    """同一個 transaction：刪掉舊快取 + 寫入新快取"""
+    conn = get_db()
+    try:
+        conn.execute("DELETE FROM news_cache WHERE category=?", (category,))
+        for art, (title_zh, summary_en, summary_zh, sentiment) in zip(articles, summaries):
+            save_news_item(
+                conn,
+                category,
+                art,
+                title_zh,
+                summary_en,
+                summary_zh,
+                sentiment=sentiment,
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# 每個 category 同時最多一個背景 refresh
+_news_refresh_tasks: Dict[str, asyncio.Task] = {}
+
+# 每個 category 最近一次 refresh 的摘要重用統計
+news_refresh_stats: Dict[str, dict] = {}
+
+# refresh 失敗（NewsAPI 錯誤 / 沒有新聞 / 例外）後，這段時間內不再重試
+# → NewsAPI 故障時不會每個 /news request 都打一次、燒光額度
+NEWS_REFRESH_BACKOFF_SECONDS = float(os.getenv("NEWS_REFRESH_BACKOFF_SECONDS", "300"))
+_news_refresh_failed_at: Dict[str, float] = {}
+
+
+async def refresh_news_category(category: str) -> bool:
+    """
+    NewsAPI 抓新資料 + LLM 摘要 → 同一個 transaction 內替換該 category 的快取。
+    抓不到任何新聞時保留舊快取，回傳 False。
+    """
+    raw = await fetch_news_from_newsapi([category])
+    articles = raw.get(category) or []
+    if not articles:
+        print(f"[news] refresh {category}: no articles, keep old cache")
+        return False
+
+    stats = {}
+    summaries = await summarize_articles(articles, stats=stats)
+    news_refresh_stats[category] = {**stats, "refreshed_at": datetime.utcnow().isoformat()}
+
+    await run_blocking(replace_news_category, category, articles, summaries)
+
+    print(
+        f"[news] refreshed {category}: {len(articles)} articles "
+        f"(reused {stats['reused']}, summarized {stats['summarized']}, fallback {stats['fallback']}; "
+        f"{stats['batch_calls']} batch + {stats['single_calls']} single LLM calls)"
+    )
+    return True
+
+
+def ensure_news_refresh(category: str) -> Optional[asyncio.Task]:
+    """
+    已有進行中的 refresh → 沿用；否則開一個新的背景 task（single-flight）
+    上次 refresh 失敗還在 NEWS_REFRESH_BACKOFF_SECONDS 內 → 不 refresh，回傳 None
+    """
+    task = _news_refresh_tasks.get(category)
+    if task and not task.done():
+        return task
+
+    failed_at = _news_refresh_failed_at.get(category)
+    if failed_at is not None and time.monotonic() - failed_at < NEWS_REFRESH_BACKOFF_SECONDS:
+        return None
+
+    async def run():
+        ok = False
+        try:
+            ok = await refresh_news_category(category)
+        except Exception as e:
+            print(f"[news] refresh {category} error:", e)
+        finally:
+            if ok:
+                _news_refresh_failed_at.pop(category, None)
+            else:
+                _news_refresh_failed_at[category] = time.monotonic()
+                news_refresh_stats.setdefault(category, {})["failed_at"] = datetime.utcnow().isoformat()
+            _news_refresh_tasks.pop(category, None)
+
+    task = asyncio.create_task(run())
+    _news_refresh_tasks[category] = task
+    return task
+
+
+# ============================================================
+# HTTP 快取：強 ETag（由快取內容的版本算出，不必先組回應）+ 304
+# ============================================================
+
+# /reports/today 當天可能被重新產生（regenerate）→ 每次都要 revalidate，靠 304 省流量
+REPORT_CACHE_CONTROL = "private, no-cache"
+
+# /news：max-age 固定是快取 TTL，快取已經多舊由 Age header 表示
+# （HTTP 快取以 max-age − Age 算剩餘新鮮度，max-age 不能再扣一次 age）
+NEWS_CACHE_CONTROL = f"public, max-age={CACHE_EXPIRE_MINUTES * 60}"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256(json.dumps(parts, default=str, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 是否包含這個 ETag（壓縮後加的 -gzip / -br 後綴視為同一版本）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(compression.strip_etag_encoding(tag) == etag for tag in header.split(","))
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def load_news_version() -> tuple:
+    """
+    (內容版本, 各 category 快取秒數)
+    replace_news_category 會換掉整批資料（新的 id）→ 版本跟著變
+    """
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT category, MAX(id), COUNT(*) FROM news_cache GROUP BY category")
+        version = sorted(tuple(r) for r in cur.fetchall() if r[0] in NEWS_CATEGORIES)
+        ages = {category: news_cache_age_seconds(conn, category) for category in NEWS_CATEGORIES}
+    finally:
+        conn.close()
+    return version, ages
+
+
+@app.get("/news")
+async def get_news(request: Request, response: Response):
+    """
+    Stale-while-revalidate：
+    1. 永遠先回 SQLite 裡最後一次成功的快取
+    2. 過期 → 背景 refresh（每個 category 最多一個），本次 request 不等
+    3. 從來沒有快取 → 只有這種情況才等 refresh 完成
+       （上次 refresh 失敗還在 NEWS_REFRESH_BACKOFF_SECONDS 內 → 不重試、不等）
+    4. 回傳：
+       - 國際科技財經
+       - 美國科技財經
+       各 5 則，含：
+       title, summary_zh, summary_en, sentiment, image_url, ...
+    5. ETag = 快取內容版本；If-None-Match 相同 → 304，不讀新聞內容
+       body 只含快取內容（同版本逐 byte 相同，強 ETag 才成立）；
+       快取已經多舊放在 Age header（最舊的 category，秒），max-age = TTL
+       → 剩餘新鮮度 max-age − Age = 最快過期的 category 還剩幾秒
+    """
+
+    ages = await run_blocking(load_news_cache_ages)
+
+    waiting = []
+    for category, age in ages.items():
+        if age is None or age > CACHE_EXPIRE_MINUTES * 60:
+            task = ensure_news_refresh(category)  # 失敗 backoff 中 → None，直接回現有資料
+            if age is None and task is not None:
+                waiting.append(task)
+            metrics.record_cache("news", "miss" if age is None else "stale")
+        else:
+            metrics.record_cache("news", "hit")
+
+    # ❌ 完全沒有快取 → 只能等第一次 refresh（shield：client 斷線也不中斷 refresh）
+    if waiting:
+        await asyncio.gather(*(asyncio.shield(t) for t in waiting))
+
+    version, ages = await run_blocking(load_news_version)
+    etag = make_etag("news", version)
+    age = news_age_header(ages)
+    if etag_matches(request, etag):
+        not_modified_response = not_modified(etag, NEWS_CACHE_CONTROL)
+        not_modified_response.headers["Age"] = age
+        return not_modified_response
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = NEWS_CACHE_CONTROL
+    response.headers["Age"] = age
+    return await run_blocking(load_news_response)
+
+
+def load_news_cache_ages() -> dict:
+    conn = get_db()
+    try:
+        return {category: news_cache_age_seconds(conn, category) for category in NEWS_CATEGORIES}
+    finally:
+        conn.close()
+
+
+def news_age_header(ages: dict) -> str:
+    """Age header：最舊的 category 快取秒數（沒有快取 → 0）；搭配 NEWS_CACHE_CONTROL 的 max-age = TTL"""
+    known = [age for age in ages.values() if age is not None]
+    return str(int(max(max(known), 0))) if known else "0"
+
+
+def load_news_response() -> dict:
+    conn = get_db()
+    try:
+        return load_news_from_db(conn)
+    finally:
+        conn.close()
+
+
+# ============================================================
+# Holdings
+# ============================================================
+
+class HoldingCreate(BaseModel):
+    symbol: str
+    shares: float
+    cost_basis: float
+    purchase_date: Optional[date] = None
+
+
+class HoldingUpdate(BaseModel):
+    shares: float
+    cost_basis: float
+    purchase_date: Optional[date] = None
+
+
+def normalize_symbol(symbol: str) -> str:
     """
     - 美股：AAPL / NVDA / TSLA -> AAPL
     - 台股純數字：2330 -> 2330.TW
@@ -733,11 +1542,10 @@ def get_stock_info(symbol: str, current: User = Depends(get_current_user)):
     yf_symbol = normalize_symbol(raw)
 
     try:
-        ticker = yf.Ticker(yf_symbol)
-        fast = ticker.fast_info or {}
-        price = fast.get("lastPrice")
+        quote = get_quote(yf_symbol) or {}
+        price = quote.get("price")
 
-        info = ticker.info or {}
+        info = get_info(yf_symbol)
         name = info.get("shortName") or info.get("longName")
 
         if not name:
@@ -757,8 +1565,7 @@ def get_stock_info(symbol: str, current: User = Depends(get_current_user)):
 
 
 @app.get("/holdings")
-def list_holdings(current: User = Depends(get_current_user)):
-    conn = get_db()
+def list_holdings(current: User = Depends(get_current_user), conn=Depends(get_db_conn)):
     cur = conn.cursor()
     cur.execute(
         """
@@ -770,7 +1577,6 @@ def list_holdings(current: User = Depends(get_current_user)):
         (current.id,),
     )
     rows = cur.fetchall()
-    conn.close()
 
     return [
         {
@@ -785,8 +1591,12 @@ def list_holdings(current: User = Depends(get_current_user)):
 
 
 @app.post("/holdings")
-def create_holding(payload: HoldingCreate, current: User = Depends(get_current_user)):
-    conn = get_db()
+def create_holding(
+    payload: HoldingCreate,
+    background_tasks: BackgroundTasks,
+    current: User = Depends(get_current_user),
+    conn=Depends(get_db_conn),
+):
     cur = conn.cursor()
 
     symbol = normalize_symbol(payload.symbol)
@@ -794,28 +1604,46 @@ def create_holding(payload: HoldingCreate, current: User = Depends(get_current_u
     # 不允許同 user 重複同一支股票
     cur.execute("SELECT id FROM holdings WHERE user_id=? AND symbol=?", (current.id, symbol))
     if cur.fetchone():
-        conn.close()
         raise HTTPException(status_code=400, detail=f"你已經有 {symbol} 的持股，請改用編輯功能")
 
-    cur.execute(
-        """
-        INSERT INTO holdings (user_id, symbol, shares, cost_basis, purchase_date)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        (current.id, symbol, payload.shares, payload.cost_basis, payload.purchase_date),
-    )
+    try:
+        cur.execute(
+            """
+            INSERT INTO holdings (user_id, symbol, shares, cost_basis, purchase_date)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (current.id, symbol, payload.shares, payload.cost_basis, payload.purchase_date),
+        )
+    except sqlite3.IntegrityError:
+        # 同時送出兩次新增 → 由 UNIQUE(user_id, symbol) 擋下
+        raise HTTPException(status_code=400, detail=f"你已經有 {symbol} 的持股，請改用編輯功能")
     conn.commit()
     hid = cur.lastrowid
-    conn.close()
+
+    # 市值歷史：從買入日（沒填 → 今天）起重算
+    background_tasks.add_task(
+        run_blocking, recompute_portfolio_history, current.id, payload.purchase_date or dt.date.today()
+    )
 
     return {"id": hid, "symbol": symbol, **payload.model_dump()}
 
 
 @app.put("/holdings/{hid}")
-def update_holding(hid: int, payload: HoldingUpdate, current: User = Depends(get_current_user)):
-    conn = get_db()
+def update_holding(
+    hid: int,
+    payload: HoldingUpdate,
+    background_tasks: BackgroundTasks,
+    current: User = Depends(get_current_user),
+    conn=Depends(get_db_conn),
+):
     cur = conn.cursor()
 
+    cur.execute(
+        "SELECT purchase_date, created_at FROM holdings WHERE id=? AND user_id=?",
+        (hid, current.id),
+    )
+    before = cur.fetchone()
+
     cur.execute(
         """
         UPDATE holdings
@@ -826,21 +1654,44 @@ def update_holding(hid: int, payload: HoldingUpdate, current: User = Depends(get
     )
 
     if cur.rowcount == 0:
-        conn.close()
         raise HTTPException(status_code=404, detail="找不到持股")
 
     conn.commit()
-    conn.close()
+
+    # 市值歷史：從新舊買入日中較早的一天起重算
+    changed_from = min(
+        holding_start_date(before["purchase_date"], before["created_at"]),
+        payload.purchase_date or holding_start_date(None, before["created_at"]),
+    )
+    background_tasks.add_task(run_blocking, recompute_portfolio_history, current.id, changed_from)
+
     return {"ok": True}
 
 
 @app.delete("/holdings/{hid}")
-def delete_holding(hid: int, current: User = Depends(get_current_user)):
-    conn = get_db()
+def delete_holding(
+    hid: int,
+    background_tasks: BackgroundTasks,
+    current: User = Depends(get_current_user),
+    conn=Depends(get_db_conn),
+):
     cur = conn.cursor()
+    cur.execute(
+        "SELECT purchase_date, created_at FROM holdings WHERE id=? AND user_id=?",
+        (hid, current.id),
+    )
+    before = cur.fetchone()
+
     cur.execute("DELETE FROM holdings WHERE id=? AND user_id=?", (hid, current.id))
     conn.commit()
-    conn.close()
+
+    if before:
+        background_tasks.add_task(
+            run_blocking,
+            recompute_portfolio_history,
+            current.id,
+            holding_start_date(before["purchase_date"], before["created_at"]),
+        )
     return {"ok": True}
 
 
@@ -849,8 +1700,7 @@ def delete_holding(hid: int, current: User = Depends(get_current_user)):
 # ============================================================
 
 @app.get("/portfolio/summary")
-def portfolio_summary(current: User = Depends(get_current_user)):
-    conn = get_db()
+def portfolio_summary(current: User = Depends(get_current_user), conn=Depends(get_db_conn)):
     cur = conn.cursor()
     cur.execute(
         """
@@ -861,29 +1711,43 @@ def portfolio_summary(current: User = Depends(get_current_user)):
         (current.id,),
     )
     rows = cur.fetchall()
-    conn.close()
 
     total_cost = 0.0
     total_value = 0.0
     items = []
+    unpriced = []
+
+    # yfinance symbol：你 DB 已存 normalize 後 symbol（含 .TW）
+    # 一次批次抓齊所有持股報價；最多等 QUOTE_DEADLINE_SECONDS，來不及的用最後已知價格
+    quotes = get_holding_quotes(r["symbol"] for r in rows)
 
     for r in rows:
         symbol = r["symbol"]
         shares = float(r["shares"])
         cost_basis = float(r["cost_basis"])
+        cost = cost_basis * shares
 
-        # yfinance symbol：你 DB 已存 normalize 後 symbol（含 .TW）
-        yf_symbol = symbol.upper()
-
-        try:
-            ticker = yf.Ticker(yf_symbol)
-            fast = ticker.fast_info or {}
-            price = fast.get("lastPrice") or 0.0
-        except Exception as e:
-            print("Price fetch error:", yf_symbol, e)
-            price = 0.0
+        quote = quotes.get(symbol.upper())
+        if not quote:
+            # 完全沒有價格 → 不計入總額（算成 0 會讓總市值 / 損益失真）
+            print("Price fetch error:", symbol.upper())
+            unpriced.append(symbol)
+            items.append(
+                {
+                    "symbol": symbol,
+                    "shares": shares,
+                    "avg_price": cost_basis,
+                    "current_price": None,
+                    "value": None,
+                    "profit": None,
+                    "profit_rate": None,
+                    "price_stale": None,
+                    "price_age_seconds": None,
+                }
+            )
+            continue
 
-        cost = cost_basis * shares
+        price = quote["price"]
         value = price * shares
 
         total_cost += cost
@@ -901,6 +1765,8 @@ def portfolio_summary(current: User = Depends(get_current_user)):
                 "value": round(value, 2),
                 "profit": round(profit, 2),
                 "profit_rate": round(profit_rate, 2),
+                "price_stale": quote["stale"],
+                "price_age_seconds": quote["age_seconds"],
             }
         )
 
@@ -908,20 +1774,312 @@ def portfolio_summary(current: User = Depends(get_current_user)):
     profit_rate = (profit / total_cost * 100) if total_cost > 0 else 0
 
     return {
+        # 總額只含有價格的持股（unpriced 列出被排除的）
         "total_cost": round(total_cost, 2),
         "total_value": round(total_value, 2),
         "profit": round(profit, 2),
         "profit_rate": round(profit_rate, 2),
+        "stale": any(item["price_stale"] for item in items),
+        "unpriced": unpriced,
         "items": items,
     }
 
 
+# ============================================================
+# Price History（本地日線資料，price_store.py）
+# ============================================================
+
+@app.get("/prices/history")
+async def price_history(
+    symbol: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    current: User = Depends(get_current_user),
+):
+    """
+    日線歷史（OHLCV）：先增量補上新資料，再從本地 memory-mapped 檔讀取區間
+    start / end：YYYY-MM-DD（含），省略 → 全部
+    """
+    try:
+        start_date = dt.date.fromisoformat(start) if start else None
+        end_date = dt.date.fromisoformat(end) if end else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式錯誤（YYYY-MM-DD）")
+
+    yf_symbol = normalize_symbol(symbol)
+    history = await run_blocking(price_store.get_history, yf_symbol, start_date, end_date)
+
+    return {
+        "symbol": yf_symbol,
+        "dates": history.dates.astype(str).tolist(),
+        # NaN（缺值）→ null，JSON 才合法
+        **{
+            field: [None if v != v else v for v in getattr(history, field).tolist()]
+            for field in ("open", "high", "low", "close", "volume")
+        },
+    }
+
+
+# ============================================================
+# Portfolio Analytics（波動度 / beta / 回撤 / Sharpe / 相關係數）
+# ============================================================
+
+ANALYTICS_BENCHMARK = "^GSPC"
+ANALYTICS_MAX_YEARS = 10
+
+# key = user + 持股內容 hash + 最後一根日線日期 + 區間；持股或資料變了 key 就不同
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+ANALYTICS_CACHE_MAX_SIZE = int(os.getenv("ANALYTICS_CACHE_MAX_SIZE", "512"))
+analytics_cache = TTLCache("analytics", ANALYTICS_CACHE_MAX_SIZE, ANALYTICS_CACHE_TTL_SECONDS)
+
+
+def holdings_version(holdings: list) -> str:
+    """持股內容的 hash（順序無關）"""
+    raw = json.dumps(sorted((h["symbol"].upper(), h["shares"]) for h in holdings))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def compute_portfolio_analytics(user_id: int, holdings: list, years: float) -> dict:
+    """同步：增量更新日線 → 讀 memmap 區間 → NumPy 計算（有快取）"""
+    symbols = sorted({h["symbol"].upper() for h in holdings})
+    price_store.refresh(symbols + [ANALYTICS_BENCHMARK])
+
+    last_bar = price_store.last_date(ANALYTICS_BENCHMARK)
+    if last_bar is None:
+        raise HTTPException(status_code=503, detail="無法取得大盤歷史資料")
+
+    key = f"{user_id}:{holdings_version(holdings)}:{last_bar.isoformat()}:{years}"
+
+    def load(keys: list) -> dict:
+        start = analytics.window_start(last_bar, years)
+        shares = {}
+        for h in holdings:
+            shares[h["symbol"].upper()] = shares.get(h["symbol"].upper(), 0.0) + h["shares"]
+
+        histories = [price_store.read(s, start, last_bar) for s in symbols]
+        result = analytics.portfolio_analytics(
+            symbols,
+            [shares[s] for s in symbols],
+            histories,
+            price_store.read(ANALYTICS_BENCHMARK, start, last_bar),
+        )
+        result["benchmark"] = ANALYTICS_BENCHMARK
+        result["years"] = years
+        result["missing"] = [s for s, h in zip(symbols, histories) if len(h) == 0]
+        return {k: result for k in keys}
+
+    return analytics_cache.get_many([key], load)[key]
+
+
+@app.get("/portfolio/analytics")
+async def portfolio_analytics(
+    years: float = 1.0,
+    current: User = Depends(get_current_user),
+):
+    """
+    持股風險指標（以 ^GSPC 交易日對齊）：
+    年化報酬 / 波動度、beta、最大回撤、Sharpe、個股相關係數矩陣
+    """
+    if not 0 < years <= ANALYTICS_MAX_YEARS:
+        raise HTTPException(status_code=400, detail=f"years 需介於 0 ~ {ANALYTICS_MAX_YEARS}")
+
+    holdings = await run_blocking(get_user_holdings, current.id)
+    if not holdings:
+        return {"observations": 0, "portfolio": None, "symbols": [], "correlation": None}
+
+    return await run_blocking(compute_portfolio_analytics, current.id, holdings, years)
+
+
+# ============================================================
+# Portfolio History（每日市值，portfolio_value_history）
+# ============================================================
+
+# 同一使用者的重算依序執行，後來的一定讀到最新持股
+_history_locks: Dict[int, threading.Lock] = {}
+_history_locks_guard = threading.Lock()
+
+
+def holding_start_date(purchase_date, created_at) -> dt.date:
+    """持股從哪天開始計入市值：買入日，沒填 → 建立日（UTC）"""
+    if purchase_date:
+        return dt.date.fromisoformat(str(purchase_date)[:10])
+    if created_at:
+        return dt.date.fromisoformat(str(created_at)[:10])
+    return dt.date.today()
+
+
+def _history_lock(user_id: int) -> threading.Lock:
+    with _history_locks_guard:
+        return _history_locks.setdefault(user_id, threading.Lock())
+
+
+def recompute_portfolio_history(user_id: int, from_date: Optional[dt.date] = None) -> int:
+    """
+    重算 from_date（含）之後每個交易日（週一～五）的市值並覆蓋；
+    from_date=None → 接在最後一筆之後（每日排程用）。
+    收盤價來自 price_store，休市日沿用前一個收盤價。回傳寫入幾筆。
+    """
+    with _history_lock(user_id):
+        conn = get_db()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT symbol, shares, cost_basis, purchase_date, created_at
+                FROM holdings WHERE user_id=?
+                """,
+                (user_id,),
+            )
+            holdings = [
+                (
+                    r["symbol"].upper(),
+                    float(r["shares"]),
+                    float(r["cost_basis"]),
+                    holding_start_date(r["purchase_date"], r["created_at"]),
+                )
+                for r in cur.fetchall()
+            ]
+
+            if from_date is None:
+                cur.execute(
+                    "SELECT MAX(date) FROM portfolio_value_history WHERE user_id=?",
+                    (user_id,),
+                )
+                last = cur.fetchone()[0]
+                if last:
+                    from_date = dt.date.fromisoformat(last) + dt.timedelta(days=1)
+                elif holdings:
+                    from_date = min(h[3] for h in holdings)
+                else:
+                    return 0
+
+            rows = _portfolio_value_rows(holdings, from_date)
+
+            cur.execute(
+                "DELETE FROM portfolio_value_history WHERE user_id=? AND date>=?",
+                (user_id, from_date.isoformat()),
+            )
+            cur.executemany(
+                """
+                INSERT INTO portfolio_value_history (user_id, date, value, cost)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(user_id, day, value, cost) for day, value, cost in rows],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    return len(rows)
+
+
+def _portfolio_value_rows(holdings: list, from_date: dt.date) -> list:
+    """holdings: [(symbol, shares, cost_basis, start_date)] → [(date, value, cost)]"""
+    if not holdings:
+        return []
+
+    symbols = sorted({h[0] for h in holdings})
+    price_store.refresh(symbols)
+
+    last_bars = [d for d in (price_store.last_date(s) for s in symbols) if d]
+    if not last_bars:
+        return []
+
+    start = max(from_date, min(h[3] for h in holdings))
+    end = max(last_bars)
+    if start > end:
+        return []
+
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1, dtype="datetime64[D]")
+    days = days[np.is_busday(days)]
+    if len(days) == 0:
+        return []
+
+    value = np.zeros(len(days))
+    cost = np.zeros(len(days))
+    active_any = np.zeros(len(days), dtype=bool)
+
+    # 往前多讀幾天：start 當天休市也能沿用前一個收盤價
+    lookback = start - dt.timedelta(days=10)
+    for symbol, shares, cost_basis, held_from in holdings:
+        active = days >= np.datetime64(held_from)
+        active_any |= active
+        cost += np.where(active, shares * cost_basis, 0.0)
+
+        h = price_store.read(symbol, lookback, end)
+        if len(h) == 0:
+            continue
+        idx = np.searchsorted(h.dates, days, side="right") - 1
+        close = np.where(idx >= 0, np.asarray(h.close)[np.maximum(idx, 0)], np.nan)
+        priced = active & ~np.isnan(close)
+        value += np.where(priced, shares * np.nan_to_num(close), 0.0)
+
+    return [
+        (str(day), round(float(v), 2), round(float(c), 2))
+        for day, v, c, a in zip(days, value, cost, active_any)
+        if a
+    ]
+
+
+def append_all_portfolio_history() -> int:
+    """每日排程：每位有持股的使用者補上最新的市值"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT user_id FROM holdings")
+    user_ids = [r["user_id"] for r in cur.fetchall()]
+    conn.close()
+
+    appended = 0
+    for user_id in user_ids:
+        try:
+            appended += recompute_portfolio_history(user_id)
+        except Exception as e:
+            print("[portfolio_history] error:", user_id, e)
+    return appended
+
+
+@app.get("/portfolio/history")
+def portfolio_history(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current: User = Depends(get_current_user),
+    conn=Depends(get_db_conn),
+):
+    """每日總市值 / 總成本（直接讀取已計算好的資料）"""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT date, value, cost
+        FROM portfolio_value_history
+        WHERE user_id=? AND date>=? AND date<=?
+        ORDER BY date
+        """,
+        (
+            current.id,
+            start.isoformat() if start else "0000-00-00",
+            end.isoformat() if end else "9999-99-99",
+        ),
+    )
+    rows = cur.fetchall()
+
+    return {
+        "items": [
+            {"date": r["date"], "value": r["value"], "cost": r["cost"]}
+            for r in rows
+        ],
+    }
+
+
 # ============================================================
 # Daily Report + Personal Actions
 # ============================================================
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+openai_client = (
+    OpenAI(api_key=OPENAI_API_KEY, timeout=LLM_TIMEOUT_SECONDS, max_retries=LLM_MAX_RETRIES)
+    if OPENAI_API_KEY
+    else None
+)
 
 
 class DailyReport(BaseModel):
@@ -947,22 +2105,27 @@ def _parse_daily_report(text: str):
     return market_zh, suggest_zh, market_en, suggest_en
 
 
-async def fetch_market_snapshot():
-    symbols = {
-        "^GSPC": "S&P 500",
-        "^IXIC": "NASDAQ",
-        "^DJI": "Dow Jones",
-    }
+# 市場報告追蹤的大盤指數
+MARKET_SYMBOLS = {
+    "^GSPC": "S&P 500",
+    "^IXIC": "NASDAQ",
+    "^DJI": "Dow Jones",
+}
 
+
+async def fetch_market_snapshot():
     results = []
+    snapshot_quotes = await run_blocking(get_quotes_within, list(MARKET_SYMBOLS.keys()))
 
-    for symbol, name in symbols.items():
+    for symbol, name in MARKET_SYMBOLS.items():
         try:
-            ticker = yf.Ticker(symbol)
-            info = ticker.fast_info or {}
+            quote = snapshot_quotes.get(symbol)
+            if not quote:
+                print("Market fetch error:", symbol)
+                continue
 
-            price = info.get("lastPrice")
-            prev = info.get("previousClose")
+            price = quote.get("price")
+            prev = quote.get("previous_close")
 
             change = None
             change_pct = None
@@ -1014,13 +2177,12 @@ MARKET_EN: <English market comment>
 SUGGEST_EN: <English trading suggestions>
 """
 
-    resp = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+    full = await run_blocking(
+        openai_chat,
+        "market_report",
+        [{"role": "user", "content": prompt}],
         temperature=0.4,
     )
-
-    full = resp.choices[0].message.content or ""
     market_zh, suggest_zh, market_en, suggest_en = _parse_daily_report(full)
 
     if not market_zh:
@@ -1035,6 +2197,20 @@ SUGGEST_EN: <English trading suggestions>
     today = dt.date.today()
 
     # 寫入 daily_reports（欄位與你 DB 一致）
+    await run_blocking(
+        save_daily_report, today.isoformat(), market_en, market_zh, suggest_en, suggest_zh
+    )
+
+    return DailyReport(
+        date=today,
+        market_comment_en=market_en,
+        market_comment_zh=market_zh,
+        action_suggestion_en=suggest_en,
+        action_suggestion_zh=suggest_zh,
+    )
+
+
+def save_daily_report(date_str: str, market_en: str, market_zh: str, suggest_en: str, suggest_zh: str):
     conn = get_db()
     cur = conn.cursor()
     cur.execute(
@@ -1043,18 +2219,37 @@ SUGGEST_EN: <English trading suggestions>
         (date, market_comment_en, market_comment_zh, action_suggestion_en, action_suggestion_zh, created_at)
         VALUES (?, ?, ?, ?, ?, datetime('now'))
         """,
-        (today.isoformat(), market_en, market_zh, suggest_en, suggest_zh),
+        (date_str, market_en, market_zh, suggest_en, suggest_zh),
     )
     conn.commit()
     conn.close()
 
-    return DailyReport(
-        date=today,
-        market_comment_en=market_en,
-        market_comment_zh=market_zh,
-        action_suggestion_en=suggest_en,
-        action_suggestion_zh=suggest_zh,
+
+def load_daily_report(date_str: str) -> Optional[Dict[str, Any]]:
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT date, market_comment_en, market_comment_zh,
+               action_suggestion_en, action_suggestion_zh
+        FROM daily_reports
+        WHERE date=?
+        """,
+        (date_str,),
     )
+    row = cur.fetchone()
+    conn.close()
+
+    if not row:
+        return None
+
+    return {
+        "date": row["date"],
+        "market_comment_en": row["market_comment_en"],
+        "market_comment_zh": row["market_comment_zh"],
+        "action_suggestion_en": row["action_suggestion_en"],
+        "action_suggestion_zh": row["action_suggestion_zh"],
+    }
 
 
 def get_user_holdings(user_id: int) -> List[Dict[str, Any]]:
@@ -1077,26 +2272,54 @@ def get_user_holdings(user_id: int) -> List[Dict[str, Any]]:
             "shares": float(r["shares"]),
             "cost_basis": float(r["cost_basis"]),
         }
-        for r in rows
-    ]
+        for r in rows
+    ]
+
+
+def get_holding_quotes(symbols) -> dict:
+    """
+    持股報價（有期限）：get_quotes_within → 仍沒有的 symbol 用本地日線最後收盤價
+    每筆都帶 stale / age_seconds
+    """
+    symbols = {s.strip().upper() for s in symbols if s and s.strip()}
+    quotes = get_quotes_within(symbols)
+
+    today = dt.date.today()
+    for symbol in symbols - quotes.keys():
+        try:
+            history = price_store.read(symbol)
+        except Exception:
+            continue
+        valid = ~np.isnan(history.close)
+        if not valid.any():
+            continue
+        closes = history.close[valid]
+        last_day = history.dates[valid][-1].astype(object)
+        quotes[symbol] = {
+            "symbol": symbol,
+            "price": float(closes[-1]),
+            "previous_close": float(closes[-2]) if len(closes) > 1 else None,
+            "stale": True,
+            "age_seconds": float((today - last_day).days * 24 * 60 * 60),
+        }
+    return quotes
 
 
 def enrich_holdings_with_price(holdings: list) -> list:
+    quotes = get_holding_quotes(h["symbol"] for h in holdings)
+    return price_holdings(holdings, quotes)
+
+
+def price_holdings(holdings: list, quotes: dict) -> list:
+    """用已抓好的 {symbol: quote} 算出 current_price / profit_rate"""
     enriched = []
     for h in holdings:
         symbol = h["symbol"].upper()
-        try:
-            ticker = yf.Ticker(symbol)
-            fast = ticker.fast_info or {}
-            price = fast.get("lastPrice")
-            if price is None:
-                info = ticker.info or {}
-                price = info.get("regularMarketPrice")
-        except Exception as e:
-            print("[price error]", symbol, e)
-            price = 0.0
+        quote = quotes.get(symbol)
+        if not quote:
+            print("[price error]", symbol)
 
-        price = float(price or 0.0)
+        price = float((quote or {}).get("price") or 0.0)
         cost_basis = float(h["cost_basis"] or 0.0)
 
         profit_rate = 0.0
@@ -1113,29 +2336,108 @@ def enrich_holdings_with_price(holdings: list) -> list:
     return enriched
 
 
-async def generate_personal_actions(user_holdings: list) -> list:
+# 損益區間：(上限 %, key, 說明)；同一天、同一檔、同一區間的使用者共用分析
+PROFIT_BANDS = [
+    (-20, "loss_20_plus", "虧損 20% 以上"),
+    (-5, "loss_5_20", "虧損 5%~20%"),
+    (5, "flat", "損益 ±5% 以內"),
+    (20, "gain_5_20", "獲利 5%~20%"),
+    (None, "gain_20_plus", "獲利 20% 以上"),
+]
+PROFIT_BAND_LABELS = {key: label for _, key, label in PROFIT_BANDS}
+
+
+def profit_band(profit_rate: float) -> str:
+    for upper, key, _ in PROFIT_BANDS:
+        if upper is None or profit_rate < upper:
+            return key
+    return PROFIT_BANDS[-1][1]
+
+
+def symbol_advice_key(h: dict) -> Optional[tuple]:
     """
-    回傳 JSON array:
-    [
-      {"symbol":"AAPL","action":"HOLD","reason_zh":"...","risk_level":"LOW"}
-    ]
+    共用快取的 key：(SYMBOL, 損益區間)
+    沒有報價（current_price 0）或沒有成本的持股，損益會被算成 0% → None：
+    不查也不寫共用快取，否則會以「flat」區間蓋掉其他使用者的建議
     """
-    if not openai_client:
-        return []
+    if not h.get("current_price") or not float(h.get("cost_basis") or 0) > 0:
+        return None
+    return h["symbol"].upper(), profit_band(h["profit_rate"])
 
-    if not user_holdings:
-        return []
 
+def advice_item(h: dict) -> tuple:
+    """持股 → prompt 用的 (SYMBOL, 現價, 損益區間)；沒有報價 / 沒有成本 → 對應欄位為 None（未知）"""
+    key = symbol_advice_key(h)
+    return h["symbol"].upper(), h.get("current_price") or None, key[1] if key else None
+
+
+def load_symbol_advice(date: str, keys: list) -> dict:
+    """keys: [(symbol, band)] → {(symbol, band): advice}"""
+    if not keys:
+        return {}
+
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT symbol, band, action, reason_zh, risk_level
+        FROM symbol_advice_cache
+        WHERE date=? AND symbol IN ({",".join("?" * len(keys))})
+        """,
+        (date, *{symbol for symbol, _ in keys}),
+    )
+    rows = cur.fetchall()
+    conn.close()
+
+    wanted = set(keys)
+    return {
+        (r["symbol"], r["band"]): {
+            "action": r["action"],
+            "reason_zh": r["reason_zh"],
+            "risk_level": r["risk_level"],
+        }
+        for r in rows
+        if (r["symbol"], r["band"]) in wanted
+    }
+
+
+def save_symbol_advice(date: str, advice: dict):
+    """advice: {(symbol, band): {"action", "reason_zh", "risk_level"}}"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.executemany(
+        """
+        INSERT OR REPLACE INTO symbol_advice_cache
+        (symbol, date, band, action, reason_zh, risk_level)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (symbol, date, band, a["action"], a["reason_zh"], a["risk_level"])
+            for (symbol, band), a in advice.items()
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def personal_actions_prompt(items: list) -> str:
+    """
+    items: [(symbol, current_price, band)]（advice_item；price / band 為 None → 未知）
+    prompt 只給損益區間（不給個人成本），分析結果可給同區間的其他使用者共用。
+    """
     holding_lines = []
-    for h in user_holdings:
-        holding_lines.append(
-            f"{h['symbol']} | 現價 {h['current_price']} | 成本 {h['cost_basis']} | 損益 {h['profit_rate']}%"
-        )
+    for symbol, price, band in items:
+        price_text = price if price else "未知（目前取不到報價）"
+        band_text = PROFIT_BAND_LABELS[band] if band else "未知"
+        holding_lines.append(f"{symbol} | 現價 {price_text} | 損益區間 {band_text}")
     holdings_text = "\n".join(holding_lines)
+    if any(not price or not band for _, price, band in items):
+        # 只有出現未知欄位時才加（其他 prompt 不變，既有 LLM 快取照常命中）
+        holdings_text += "\n\n標示「未知」的欄位請勿自行假設數值；理由中請說明資料不足，並以保守建議為主。"
 
-    prompt = f"""
+    return f"""
 你是一位專業投資顧問（偏穩健、給一般投資人看的建議）。
-以下是使用者目前持股與即時狀態：
+以下是投資人持有的股票、即時價格與目前損益區間：
 
 {holdings_text}
 
@@ -1156,25 +2458,170 @@ async def generate_personal_actions(user_holdings: list) -> list:
 ]
 """
 
-    resp = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3,
-    )
-    raw = (resp.choices[0].message.content or "").strip()
+
+def _normalize_action(a) -> Optional[tuple]:
+    """GPT 回傳的單筆建議 → (SYMBOL, {"action", "reason_zh", "risk_level"})"""
+    if not isinstance(a, dict) or not a.get("symbol"):
+        return None
+    return str(a["symbol"]).strip().upper(), {
+        "action": a.get("action"),
+        "reason_zh": a.get("reason_zh"),
+        "risk_level": a.get("risk_level"),
+    }
+
+
+async def analyze_symbols_with_llm(items: list, bypass_cache: bool = False) -> dict:
+    """
+    items: [(symbol, current_price, band)]
+    只把「快取沒有的個股」送 GPT，回傳 {symbol: {"action", "reason_zh", "risk_level"}}
+    """
+    if not openai_client or not items:
+        return {}
+
+    prompt = personal_actions_prompt(items)
+
+    raw = (
+        await run_blocking(
+            openai_chat,
+            "personal_actions",
+            [{"role": "user", "content": prompt}],
+            temperature=0.3,
+            bypass_cache=bypass_cache,
+        )
+    ).strip()
 
     # 只擷取 JSON 區塊，避免模型偶爾加註解
     start = raw.find("[")
     end = raw.rfind("]")
     if start == -1 or end == -1:
-        return []
+        return {}
 
     try:
-        return json.loads(raw[start : end + 1])
+        parsed = json.loads(raw[start : end + 1])
     except Exception as e:
         print("[personal_actions json parse error]", e, raw)
+        return {}
+
+    result = {}
+    for a in parsed:
+        normalized = _normalize_action(a)
+        if normalized:
+            symbol, advice = normalized
+            result[symbol] = advice
+    return result
+
+
+class JsonArrayObjectParser:
+    """
+    逐段餵入 JSON array 文字，每當最外層 array 裡的一個 {...} 收到結尾 } 就回傳該物件。
+    會略過 [ 之前的多餘文字（例如 ```json），字串中的括號 / 跳脫字元不影響判斷。
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._in_array = False
+        self._depth = 0          # 目前物件的巢狀深度（0 → 不在物件內）
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> list:
+        completed = []
+        for ch in text:
+            if not self._in_array:
+                self._in_array = ch == "["
+                continue
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._buffer = [ch]
+                continue
+
+            self._buffer.append(ch)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = "".join(self._buffer)
+                    try:
+                        completed.append(json.loads(raw))
+                    except ValueError as e:
+                        print("[personal_actions stream parse error]", e, raw)
+        return completed
+
+
+async def stream_symbols_with_llm(items: list):
+    """
+    analyze_symbols_with_llm 的串流版本（一律重新呼叫 GPT）：
+    每檔個股的 JSON 物件一完成就 yield (SYMBOL, advice)
+    """
+    if not openai_client or not items:
+        return
+
+    parser = JsonArrayObjectParser()
+    async for delta in iterate_blocking(
+        openai_chat_stream,
+        "personal_actions",
+        [{"role": "user", "content": personal_actions_prompt(items)}],
+        temperature=0.3,
+    ):
+        for obj in parser.feed(delta):
+            normalized = _normalize_action(obj)
+            if normalized:
+                yield normalized
+
+
+async def generate_personal_actions(user_holdings: list, refresh: bool = False) -> list:
+    """
+    回傳 JSON array:
+    [
+      {"symbol":"AAPL","action":"HOLD","reason_zh":"...","risk_level":"LOW"}
+    ]
+    每檔先查「個股 × 損益區間」當日快取，只有沒被涵蓋的個股才送 GPT。
+    refresh=True → 忽略快取、全部重新分析並覆蓋快取。
+    """
+    if not openai_client:
+        return []
+
+    if not user_holdings:
         return []
 
+    today = dt.date.today().isoformat()
+    keyed = [(h, symbol_advice_key(h)) for h in user_holdings]
+
+    cached = {} if refresh else await run_blocking(load_symbol_advice, today, [k for _, k in keyed if k])
+
+    missing = [(h, key) for h, key in keyed if key is None or key not in cached]
+    analyzed = {}
+    if missing:
+        analyzed = await analyze_symbols_with_llm(
+            [advice_item(h) for h, _ in missing],
+            bypass_cache=refresh,
+        )
+        # 沒有報價的持股不寫共用快取
+        fresh = {key: analyzed[key[0]] for _, key in missing if key and key[0] in analyzed}
+        if fresh:
+            await run_blocking(save_symbol_advice, today, fresh)
+
+    print(f"[personal_actions] {len(keyed) - len(missing)} cached, {len(missing)} sent to GPT")
+
+    actions = []
+    for h, key in keyed:
+        advice = cached.get(key) or analyzed.get(h["symbol"].upper())
+        if advice:
+            actions.append({"symbol": h["symbol"], **advice})
+    return actions
+
 
 def get_user_holdings_for_advice(user_id: int):
     conn = get_db()
@@ -1234,14 +2681,13 @@ ADVICE_ZH:
 ADVICE_EN:
 """
 
-    resp = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
+    text = await run_blocking(
+        openai_chat,
+        "personal_advice",
+        [{"role": "user", "content": prompt}],
         temperature=0.3,
     )
 
-    text = resp.choices[0].message.content
-
     zh = en = ""
     for line in text.splitlines():
         if line.startswith("ADVICE_ZH"):
@@ -1276,6 +2722,38 @@ def save_personal_advice(
     conn.commit()
     conn.close()
 
+def save_regenerated_advice(user_id: int, date: str, symbol_advice: dict, actions: list):
+    """
+    重新產生後一次寫入（同一個 transaction）：
+    個股 × 損益區間快取 + personal_stock_advice 今日資料
+    """
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.executemany(
+            """
+            INSERT OR REPLACE INTO symbol_advice_cache
+            (symbol, date, band, action, reason_zh, risk_level)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (symbol, date, band, a["action"], a["reason_zh"], a["risk_level"])
+                for (symbol, band), a in symbol_advice.items()
+            ],
+        )
+        cur.execute(
+            """
+            INSERT OR REPLACE INTO personal_stock_advice
+            (user_id, date, content_zh, content_en)
+            VALUES (?, ?, ?, NULL)
+            """,
+            (user_id, date, json.dumps(actions, ensure_ascii=False)),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
 def get_cached_personal_advice(user_id: int, date: str):
     conn = get_db()
     cur = conn.cursor()
@@ -1302,17 +2780,20 @@ async def get_or_create_personal_stock_advice(
     today = dt.date.today().isoformat()
 
     # 1️⃣ 先查 DB 快取
-    cached = get_cached_personal_advice(user_id, today)
+    cached = await run_blocking(get_cached_personal_advice, user_id, today)
     if cached:
         print("✅ use cached personal_stock_advice")
+        metrics.record_cache("personal_advice", "hit")
         return cached
 
     # 2️⃣ 沒快取 → 產生（GPT）
     print("⚠️ generate personal_stock_advice via GPT")
+    metrics.record_cache("personal_advice", "miss")
     actions = await generate_personal_actions(enriched_holdings)
 
     # 3️⃣ 存 DB
-    save_personal_advice(
+    await run_blocking(
+        save_personal_advice,
         user_id=user_id,
         date=today,
         actions=actions,
@@ -1321,84 +2802,273 @@ async def get_or_create_personal_stock_advice(
     return actions
 
 
+async def get_or_create_market_report(today: str) -> dict:
+    """今日市場報告：DB 有就用，沒有就抓行情 + GPT 產生"""
+    base_report = await run_blocking(load_daily_report, today)
+    if base_report:
+        return base_report
+
+    snapshot = await fetch_market_snapshot()
+    dr = await generate_market_report(snapshot)
+
+    return {
+        "date": dr.date.isoformat(),
+        "market_comment_en": dr.market_comment_en,
+        "market_comment_zh": dr.market_comment_zh,
+        "action_suggestion_en": dr.action_suggestion_en,
+        "action_suggestion_zh": dr.action_suggestion_zh,
+    }
+
+
+def load_report_version(user_id: int, date_str: str) -> Optional[list]:
+    """
+    /reports/today 的內容版本：市場報告與個人化建議都已在 DB → 回傳版本；
+    還需要產生（內容取決於這次 GPT 的結果）→ None
+    """
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT created_at, market_comment_en, market_comment_zh,
+                   action_suggestion_en, action_suggestion_zh
+            FROM daily_reports
+            WHERE date=?
+            """,
+            (date_str,),
+        )
+        report = cur.fetchone()
+        if not report:
+            return None
+
+        cur.execute("SELECT EXISTS(SELECT 1 FROM holdings WHERE user_id=?)", (user_id,))
+        if not cur.fetchone()[0]:
+            return [tuple(report), None]
+
+        # personal_stock_advice 為 AUTOINCREMENT + INSERT OR REPLACE → 每次重新產生 id 都會變
+        cur.execute(
+            """
+            SELECT id FROM personal_stock_advice
+            WHERE user_id=? AND date=? AND content_zh NOT IN ('', '[]')
+            """,
+            (user_id, date_str),
+        )
+        advice = cur.fetchone()
+        if not advice:
+            return None
+        return [tuple(report), advice[0]]
+    finally:
+        conn.close()
+
+
 @app.get("/reports/today")
-async def report_today(current: User = Depends(get_current_user)):
+async def report_today(request: Request, response: Response, current: User = Depends(get_current_user)):
     """
     回傳：
     - 市場報告（daily_reports）
     - personal_actions（依使用者持股產生）
+    當天內容都已產生過 → 帶 ETag；If-None-Match 相同 → 304（不抓報價、不讀建議）
     """
     today = dt.date.today().isoformat()
 
+    version = await run_blocking(load_report_version, current.id, today)
+    if version is not None:
+        etag = make_etag("report", current.id, today, version)
+        if etag_matches(request, etag):
+            return not_modified(etag, REPORT_CACHE_CONTROL)
+
     # =============================
     # 1️⃣ 市場報告（先查 DB）
     # =============================
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT date, market_comment_en, market_comment_zh,
-               action_suggestion_en, action_suggestion_zh
-        FROM daily_reports
-        WHERE date=?
-        """,
-        (today,),
-    )
-    row = cur.fetchone()
-    conn.close()
-
-    if row:
-        base_report = {
-            "date": row["date"],
-            "market_comment_en": row["market_comment_en"],
-            "market_comment_zh": row["market_comment_zh"],
-            "action_suggestion_en": row["action_suggestion_en"],
-            "action_suggestion_zh": row["action_suggestion_zh"],
-        }
-    else:
-        # ⚠️ 注意：fetch_market_snapshot 是「同步」function
-        snapshot = await fetch_market_snapshot()
-        dr = await generate_market_report(snapshot)
-
-        base_report = {
-            "date": dr.date.isoformat(),
-            "market_comment_en": dr.market_comment_en,
-            "market_comment_zh": dr.market_comment_zh,
-            "action_suggestion_en": dr.action_suggestion_en,
-            "action_suggestion_zh": dr.action_suggestion_zh,
-        }
+    with tracing.span("market_report"):
+        base_report = await get_or_create_market_report(today)
 
     # =============================
     # 2️⃣ 個人化建議（依持股）
     # =============================
+    # 有任何一步失敗 → 這次回應不是「DB 裡的版本」，不帶 ETag
+    complete = True
     try:
-        holdings = get_user_holdings(current.id)
+        with tracing.span("holdings"):
+            holdings = await run_blocking(get_user_holdings, current.id)
     except Exception as e:
         print("❌ get_user_holdings error:", e)
         holdings = []
+        complete = False
 
     personal_actions = []
 
     if holdings:
         try:
-            enriched = enrich_holdings_with_price(holdings)
+            with tracing.span("enrich_holdings", holdings=len(holdings)):
+                enriched = await run_blocking(enrich_holdings_with_price, holdings)
             if enriched:
-                personal_actions = await get_or_create_personal_stock_advice(current.id, enriched)
+                with tracing.span("personal_advice"):
+                    personal_actions = await get_or_create_personal_stock_advice(current.id, enriched)
             enriched
         except Exception as e:
             # ⚠️ 個人化建議失敗不影響整個報告
             print("❌ personal_actions error:", e)
             personal_actions = []
+            complete = False
 
     # =============================
     # 3️⃣ 統一回傳
     # =============================
+    if complete:
+        if version is None:
+            version = await run_blocking(load_report_version, current.id, today)
+        if version is not None:
+            response.headers["ETag"] = make_etag("report", current.id, today, version)
+            response.headers["Cache-Control"] = REPORT_CACHE_CONTROL
+
     return {
         **base_report,
         "personal_actions": personal_actions,
     }
 
 
+async def stream_personal_actions(user_holdings: list):
+    """
+    逐檔產出個人化建議（async generator）：
+    - 個股 × 損益區間快取命中 → 立刻 yield
+    - 其餘所有個股合併成「一次」串流 GPT 呼叫，每檔 JSON 物件一完成就 yield
+    - 串流結束後新結果一次寫入共用快取（沒有報價的持股不寫）
+    """
+    if not openai_client or not user_holdings:
+        return
+
+    today = dt.date.today().isoformat()
+    keyed = [(h, symbol_advice_key(h)) for h in user_holdings]
+    cached = await run_blocking(load_symbol_advice, today, [k for _, k in keyed if k])
+
+    for h, key in keyed:
+        if key in cached:
+            yield {"symbol": h["symbol"], **cached[key]}
+
+    # SYMBOL → (holding, shared key)；同一檔只問一次
+    missing = {}
+    for h, key in keyed:
+        if key is None or key not in cached:
+            missing.setdefault(h["symbol"].upper(), (h, key))
+    if not missing:
+        return
+
+    items = [advice_item(h) for h, _ in missing.values()]
+    fresh = {}
+    async for symbol, advice in stream_symbols_with_llm(items):
+        if symbol not in missing or symbol in fresh:
+            continue
+        fresh[symbol] = advice
+        yield {"symbol": missing[symbol][0]["symbol"], **advice}
+
+    print(f"[personal_actions] {len(keyed) - len(missing)} cached, {len(missing)} sent to GPT (1 streamed call)")
+
+    shared = {missing[symbol][1]: advice for symbol, advice in fresh.items() if missing[symbol][1]}
+    if shared:
+        await run_blocking(save_symbol_advice, today, shared)
+
+
+async def stream_user_personal_actions(user_id: int):
+    """今日已有 personal_stock_advice → 直接逐筆送出；否則邊分析邊送，最後整批寫入 DB"""
+    today = dt.date.today().isoformat()
+
+    cached = await run_blocking(get_cached_personal_advice, user_id, today)
+    if cached:
+        metrics.record_cache("personal_advice", "hit")
+        for action in cached:
+            yield action
+        return
+
+    holdings = await run_blocking(get_user_holdings, user_id)
+    if not holdings:
+        return
+
+    enriched = await run_blocking(enrich_holdings_with_price, holdings)
+    metrics.record_cache("personal_advice", "miss")
+
+    actions = {}
+    async for action in stream_personal_actions(enriched):
+        actions[action["symbol"]] = action
+        yield action
+
+    if actions:
+        # 依持股順序存，與非串流版本一致
+        ordered = [actions[h["symbol"]] for h in enriched if h["symbol"] in actions]
+        await run_blocking(
+            save_personal_advice,
+            user_id=user_id,
+            date=today,
+            actions=ordered,
+        )
+
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/reports/today/stream")
+async def report_today_stream(current: User = Depends(get_current_user)):
+    """
+    /reports/today 的 Server-Sent Events 版本：
+    - event: report  市場報告（一完成就送）
+    - event: action  每檔持股的建議（各自完成就送）
+    - event: error   某一部分失敗（另一部分照常）
+    - event: done    全部結束
+    """
+    today = dt.date.today().isoformat()
+    user_id = current.id
+
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce_report():
+            try:
+                await queue.put(("report", await get_or_create_market_report(today)))
+            except Exception as e:
+                print("❌ report stream error:", e)
+                await queue.put(("error", {"part": "report", "detail": str(e)}))
+            finally:
+                await queue.put(None)
+
+        async def produce_actions():
+            try:
+                async for action in stream_user_personal_actions(user_id):
+                    await queue.put(("action", action))
+            except Exception as e:
+                # ⚠️ 個人化建議失敗不影響整個報告
+                print("❌ personal_actions stream error:", e)
+                await queue.put(("error", {"part": "personal_actions", "detail": str(e)}))
+            finally:
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(produce_report()), asyncio.create_task(produce_actions())]
+        actions_sent = 0
+        try:
+            running = len(tasks)
+            while running:
+                item = await queue.get()
+                if item is None:
+                    running -= 1
+                    continue
+                event, data = item
+                if event == "action":
+                    actions_sent += 1
+                yield sse_event(event, data)
+
+            yield sse_event("done", {"personal_actions": actions_sent})
+        finally:
+            # client 中途離開 → 停掉還在跑的工作
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/reports/personal/regenerate")
 async def regenerate_personal_advice(
     current: User = Depends(get_current_user)
@@ -1411,7 +3081,7 @@ async def regenerate_personal_advice(
     today = dt.date.today().isoformat()
 
     # 1️⃣ 取得使用者持股
-    holdings = get_user_holdings(current.id)
+    holdings = await run_blocking(get_user_holdings, current.id)
     if not holdings:
         return {
             "ok": False,
@@ -1419,7 +3089,7 @@ async def regenerate_personal_advice(
             "personal_actions": [],
         }
 
-    enriched = enrich_holdings_with_price(holdings)
+    enriched = await run_blocking(enrich_holdings_with_price, holdings)
     if not enriched:
         return {
             "ok": False,
@@ -1427,11 +3097,12 @@ async def regenerate_personal_advice(
             "personal_actions": [],
         }
 
-    # 2️⃣ 強制呼叫 GPT
-    actions = await generate_personal_actions(enriched)
+    # 2️⃣ 強制呼叫 GPT（略過個股分析快取）
+    actions = await generate_personal_actions(enriched, refresh=True)
 
     # 3️⃣ 覆蓋寫入 DB（今天）
-    save_personal_advice(
+    await run_blocking(
+        save_personal_advice,
         user_id=current.id,
         date=today,
         actions=actions,
@@ -1444,6 +3115,68 @@ async def regenerate_personal_advice(
     }
 
 
+@app.post("/reports/personal/regenerate/stream")
+async def regenerate_personal_advice_stream(
+    current: User = Depends(get_current_user)
+):
+    """
+    /reports/personal/regenerate 的串流版本（Server-Sent Events）：
+    - event: action  GPT 每寫完一檔的 JSON 物件就送出
+    - event: error   失敗（已送出的建議不會寫入 DB）
+    - event: done    全部完成並寫入 DB 後送出
+    """
+    today = dt.date.today().isoformat()
+    user_id = current.id
+
+    async def events():
+        holdings = await run_blocking(get_user_holdings, user_id)
+        if not holdings:
+            yield sse_event("error", {"detail": "尚未有持股，無法產生個人化建議"})
+            return
+
+        enriched = await run_blocking(enrich_holdings_with_price, holdings)
+        if not enriched:
+            yield sse_event("error", {"detail": "持股價格取得失敗"})
+            return
+
+        items = [advice_item(h) for h in enriched]
+        wanted = {symbol for symbol, _, _ in items}
+        shared_keys = {key[0]: key for key in map(symbol_advice_key, enriched) if key}
+
+        fresh = {}
+        try:
+            async for symbol, advice in stream_symbols_with_llm(items):
+                if symbol not in wanted or symbol in fresh:
+                    continue
+                fresh[symbol] = advice
+                yield sse_event("action", {"symbol": symbol, **advice})
+        except Exception as e:
+            print("❌ personal_actions stream error:", e)
+            yield sse_event("error", {"detail": str(e)})
+            return
+
+        # 串流完整結束才寫入 → DB 不會留下只寫一半的建議
+        actions = [
+            {"symbol": h["symbol"], **fresh[h["symbol"].upper()]}
+            for h in enriched
+            if h["symbol"].upper() in fresh
+        ]
+        await run_blocking(
+            save_regenerated_advice,
+            user_id,
+            today,
+            {shared_keys[symbol]: advice for symbol, advice in fresh.items() if symbol in shared_keys},
+            actions,
+        )
+        yield sse_event("done", {"personal_actions": len(actions)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # ============================================================
 # OCR (optional)
 # ============================================================
@@ -1466,9 +3199,10 @@ async def ocr_holdings(file: UploadFile = File(...), current: User = Depends(get
 ]
 """
 
-    resp = openai_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    raw = await run_blocking(
+        openai_chat,
+        "ocr",
+        [
             {"role": "user", "content": prompt},
             {
                 "role": "user",
@@ -1481,7 +3215,7 @@ async def ocr_holdings(file: UploadFile = File(...), current: User = Depends(get
         temperature=0.2,
     )
 
-    raw = (resp.choices[0].message.content or "").strip()
+    raw = raw.strip()
     start = raw.find("[")
     end = raw.rfind("]")
     if start == -1 or end == -1:
@@ -1501,15 +3235,144 @@ TAIPEI_TZ = dt.timezone(dt.timedelta(hours=8))
 scheduler = AsyncIOScheduler(timezone=TAIPEI_TZ)
 
 
+# 夜間批次：同時最多幾位使用者在跑 GPT
+PERSONAL_ADVICE_BATCH_CONCURRENCY = int(os.getenv("PERSONAL_ADVICE_BATCH_CONCURRENCY", "4"))
+
+# 個人化建議預先產生的時間（伺服器本地時區）
+# 建議以 dt.date.today()（伺服器本地日期）為 key → 換日後才產生，當天的 request 才查得到
+PERSONAL_ADVICE_PRECOMPUTE_HOUR = int(os.getenv("PERSONAL_ADVICE_PRECOMPUTE_HOUR", "0"))
+PERSONAL_ADVICE_PRECOMPUTE_MINUTE = int(os.getenv("PERSONAL_ADVICE_PRECOMPUTE_MINUTE", "5"))
+
+
+def load_holdings_by_user() -> Dict[int, list]:
+    """一次查出所有使用者的持股：{user_id: [holding, ...]}"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT user_id, symbol, shares, cost_basis
+        FROM holdings
+        ORDER BY user_id
+        """
+    )
+    rows = cur.fetchall()
+    conn.close()
+
+    by_user: Dict[int, list] = {}
+    for r in rows:
+        by_user.setdefault(r["user_id"], []).append(
+            {
+                "symbol": r["symbol"],
+                "shares": float(r["shares"]),
+                "cost_basis": float(r["cost_basis"]),
+            }
+        )
+    return by_user
+
+
+def load_advised_user_ids(date: str) -> set:
+    """當天已有個人化建議的使用者（批次的 checkpoint）"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT user_id FROM personal_stock_advice
+        WHERE date=? AND content_zh IS NOT NULL AND content_zh != '[]'
+        """,
+        (date,),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return {r["user_id"] for r in rows}
+
+
+async def precompute_personal_advice() -> dict:
+    """
+    為所有有持股的使用者預先產生今日 personal_stock_advice
+    （排程在伺服器本地換日後執行，key 與當天互動 request 用的 dt.date.today() 相同）：
+    - 所有使用者的 symbol 去重後只抓一次價
+    - GPT 呼叫最多 PERSONAL_ADVICE_BATCH_CONCURRENCY 個同時進行
+    - 每位使用者完成即寫入 DB；中途當掉重跑時，已完成的使用者會跳過
+    """
+    today = dt.date.today().isoformat()
+
+    holdings_by_user = await run_blocking(load_holdings_by_user)
+    done = await run_blocking(load_advised_user_ids, today)
+    pending = {uid: hs for uid, hs in holdings_by_user.items() if uid not in done}
+
+    stats = {"users": len(holdings_by_user), "skipped": len(done), "generated": 0, "failed": 0}
+    if not pending:
+        return stats
+
+    symbols = {h["symbol"] for hs in pending.values() for h in hs}
+    quotes_map = await run_blocking(get_quotes, symbols)
+    print(f"[Scheduler] personal advice: {len(pending)} users, {len(symbols)} unique symbols")
+
+    semaphore = asyncio.Semaphore(PERSONAL_ADVICE_BATCH_CONCURRENCY)
+
+    async def generate_for_user(user_id: int, holdings: list):
+        async with semaphore:
+            try:
+                enriched = price_holdings(holdings, quotes_map)
+                actions = await generate_personal_actions(enriched)
+                if not actions:
+                    stats["failed"] += 1
+                    return
+                await run_blocking(
+                    save_personal_advice,
+                    user_id=user_id,
+                    date=today,
+                    actions=actions,
+                )
+                stats["generated"] += 1
+            except Exception as e:
+                print("[Scheduler] personal advice error:", user_id, e)
+                stats["failed"] += 1
+
+    await asyncio.gather(*(generate_for_user(uid, hs) for uid, hs in pending.items()))
+    return stats
+
+
 async def scheduled_generate_report():
     try:
         print("[Scheduler] Start generating daily report...")
-        snapshot =  fetch_market_snapshot()
+        snapshot = await fetch_market_snapshot()
         await generate_market_report(snapshot)
         print("[Scheduler] Daily report generated.")
     except Exception as e:
         print("[Scheduler] Error:", e)
 
+    # 所有持股 + 大盤的日線歷史（只抓上次之後的新資料）
+    try:
+        holdings_by_user = await run_blocking(load_holdings_by_user)
+        symbols = {h["symbol"] for hs in holdings_by_user.values() for h in hs}
+        symbols.update(MARKET_SYMBOLS)
+        appended = await run_blocking(price_store.refresh, symbols, True)
+        print(f"[Scheduler] Price history updated: {appended} bars for {len(symbols)} symbols")
+    except Exception as e:
+        print("[Scheduler] Price history error:", e)
+
+    # 日線更新後，每位使用者的市值歷史往後補
+    try:
+        appended = await run_blocking(append_all_portfolio_history)
+        print(f"[Scheduler] Portfolio history appended: {appended} rows")
+    except Exception as e:
+        print("[Scheduler] Portfolio history error:", e)
+
+
+def personal_advice_precompute_due(now: Optional[datetime] = None) -> bool:
+    """伺服器本地時間已過今天的預先產生時間"""
+    now = now or datetime.now()
+    return (now.hour, now.minute) >= (PERSONAL_ADVICE_PRECOMPUTE_HOUR, PERSONAL_ADVICE_PRECOMPUTE_MINUTE)
+
+
+async def scheduled_precompute_personal_advice():
+    try:
+        stats = await precompute_personal_advice()
+        print("[Scheduler] Personal advice precomputed:", stats)
+    except Exception as e:
+        print("[Scheduler] Personal advice error:", e)
+
 
 @app.on_event("startup")
 async def on_startup():
@@ -1523,11 +3386,35 @@ async def on_startup():
         id="daily_report_22",
         replace_existing=True,
     )
+    scheduler.add_job(
+        scheduled_precompute_personal_advice,
+        "cron",
+        hour=PERSONAL_ADVICE_PRECOMPUTE_HOUR,
+        minute=PERSONAL_ADVICE_PRECOMPUTE_MINUTE,
+        second=0,
+        timezone=tzlocal.get_localzone(),
+        id="personal_advice_precompute",
+        replace_existing=True,
+    )
+    # jobstore 在記憶體：批次跑到一半重啟不會補跑 → 今天的排程時間已過就馬上接著跑
+    # （已完成的使用者由 load_advised_user_ids 跳過，全部完成時只是一次查詢）
+    if personal_advice_precompute_due():
+        scheduler.add_job(
+            scheduled_precompute_personal_advice,
+            id="personal_advice_precompute_resume",
+            replace_existing=True,
+        )
     scheduler.start()
     print("[Scheduler] started")
 
+    get_http_client()
+    print(f"[HTTP] shared client ready (http2={HTTP2_AVAILABLE})")
+
 
 @app.on_event("shutdown")
 async def on_shutdown():
     scheduler.shutdown()
     print("[Scheduler] shutdown")
+
+    if http_client is not None:
+        await http_client.aclose()
@@ -0,0 +1,311 @@
+# metrics.py — Prometheus 文字格式的指標（不依賴 prometheus_client）
+#
+# - HTTP：每個 route 的延遲 histogram、進行中 request 數
+# - 外部呼叫：yfinance / OpenAI / Gemini / NewsAPI 依 provider + operation 計時
+# - LLM token 數（來自回應的 usage 欄位）
+# - 各快取命中率（快取本身的 stats() 或 record_cache 計數）
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from starlette.routing import Match
+
+import tracing
+
+# 延遲 bucket（秒）：涵蓋 SQLite 毫秒級到 LLM 數十秒
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, upper in enumerate(self.buckets):
+                if value <= upper:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+
+        lines = []
+        for key, row in items:
+            cumulative = 0
+            for i, upper in enumerate(self.buckets):
+                cumulative += row[i]
+                le = _labels(self.labelnames, key, f'le="{_fmt(upper)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            inf = _labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {row[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(row[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {row[-1]}")
+        return lines
+
+
+# ============================================================
+# 指標定義
+# ============================================================
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    ("method", "route"),
+)
+external_call_duration = Histogram(
+    "external_call_duration_seconds",
+    "Latency of calls to external providers",
+    ("provider", "operation", "outcome"),
+)
+llm_tokens = Counter(
+    "llm_tokens_total",
+    "LLM tokens reported by provider usage fields",
+    ("provider", "model", "call_site", "kind"),
+)
+
+# 直接計數的快取（news / personal_advice ...）
+_cache_counts: Dict[str, Dict[str, int]] = {}
+_cache_lock = threading.Lock()
+
+# 其他快取：回傳 {cache: {"hit": n, "miss": n}} 的 callback（讀各快取既有的 stats()）
+_cache_sources: List[Callable[[], Dict[str, Dict[str, int]]]] = []
+
+
+def record_cache(cache: str, result: str):
+    """result：hit / miss / stale（stale 以命中計，但另外列出）"""
+    with _cache_lock:
+        counts = _cache_counts.setdefault(cache, {})
+        counts[result] = counts.get(result, 0) + 1
+
+
+def register_cache_source(fn: Callable[[], Dict[str, Dict[str, int]]]):
+    _cache_sources.append(fn)
+
+
+def _all_cache_counts() -> Dict[str, Dict[str, int]]:
+    with _cache_lock:
+        merged = {cache: dict(counts) for cache, counts in _cache_counts.items()}
+    for source in _cache_sources:
+        try:
+            for cache, counts in source().items():
+                merged.setdefault(cache, {}).update(counts)
+        except Exception as e:
+            print("[metrics] cache source error:", e)
+    return merged
+
+
+def _render_caches() -> List[str]:
+    counts = _all_cache_counts()
+    lines = [
+        "# HELP cache_requests_total Cache lookups by result",
+        "# TYPE cache_requests_total counter",
+    ]
+    for cache in sorted(counts):
+        for result, n in sorted(counts[cache].items()):
+            lines.append(f'cache_requests_total{{cache="{_escape(cache)}",result="{_escape(result)}"}} {n}')
+
+    lines += [
+        "# HELP cache_hit_ratio Share of cache lookups served from cache",
+        "# TYPE cache_hit_ratio gauge",
+    ]
+    for cache in sorted(counts):
+        c = counts[cache]
+        hits = c.get("hit", 0) + c.get("stale", 0)
+        total = hits + c.get("miss", 0)
+        if total:
+            lines.append(f'cache_hit_ratio{{cache="{_escape(cache)}"}} {_fmt(hits / total)}')
+    return lines
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(_render_caches())
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# 外部呼叫計時 / LLM token（同時是 tracing 的 span）
+# ============================================================
+
+class _Call:
+    outcome = "ok"
+
+
+@contextmanager
+def external_call(provider: str, operation: str):
+    """
+    with external_call("yfinance", "download"):
+        ...
+    例外 → outcome=error；呼叫端也可以自行設定 call.outcome（例如 HTTP 4xx/5xx）
+    """
+    call = _Call()
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"{provider}.{operation}") as sp:
+            yield call
+            if sp is not None and call.outcome != "ok":
+                sp.attrs["outcome"] = call.outcome
+    except BaseException:
+        call.outcome = "error"
+        raise
+    finally:
+        external_call_duration.observe(
+            time.perf_counter() - start,
+            provider=provider,
+            operation=operation,
+            outcome=call.outcome,
+        )
+
+
+def record_llm_usage(provider: str, model: str, call_site: str, prompt_tokens, completion_tokens):
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, provider=provider, model=model, call_site=call_site, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, provider=provider, model=model, call_site=call_site, kind="completion")
+
+
+# ============================================================
+# HTTP middleware（pure ASGI：不緩衝 body，SSE 串流照常運作）
+# ============================================================
+
+def route_template(app, scope) -> str:
+    """scope 對應的 route path template（/holdings/{hid}）；沒對應到任何 route → unmatched"""
+    router = getattr(app, "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    route label 用 path template（/holdings/{hid}），不會因 id 不同而爆量；
+    沒對應到任何 route → "unmatched"。延遲算到 response 最後一個 chunk 送出為止。
+    """
+
+    def __init__(self, app, routes_app=None):
+        self.app = app
+        self.routes_app = routes_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.routes_app, scope)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc(method=method, route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec(method=method, route=route)
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=route,
+                status=status["code"],
+            )
+
+
+def counts_from_stats(stats: Dict[str, Optional[dict]]) -> Dict[str, Dict[str, int]]:
+    """{cache: stats()} → {cache: {"hit", "miss"}}（stats 需有 hits / misses）"""
+    return {
+        name: {"hit": s.get("hits", 0), "miss": s.get("misses", 0)}
+        for name, s in stats.items()
+        if s
+    }
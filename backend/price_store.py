@@ -0,0 +1,327 @@
+# price_store.py — 本地日線歷史資料（每檔一個資料夾、每個欄位一個 memory-mapped 檔）
+#
+# 目錄結構：
+#   PRICE_STORE_DIR/AAPL/date.i8    # 日期（距 1970-01-01 天數，遞增）
+#   PRICE_STORE_DIR/AAPL/open.f8
+#   PRICE_STORE_DIR/AAPL/high.f8
+#   PRICE_STORE_DIR/AAPL/low.f8
+#   PRICE_STORE_DIR/AAPL/close.f8
+#   PRICE_STORE_DIR/AAPL/volume.f8
+#
+# - 只往後 append：最後一天（high-water mark）之後的日線才會寫入
+# - refresh 只向 yfinance 要 high-water mark 之後的資料
+# - read 回傳 np.memmap 的切片（不複製資料）
+import datetime as dt
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import yfinance as yf
+
+import metrics
+from breaker import breakers
+
+PRICE_STORE_DIR = os.getenv("PRICE_STORE_DIR", "price_store")
+
+# 第一次抓某檔時往回抓幾年
+PRICE_HISTORY_YEARS = int(os.getenv("PRICE_HISTORY_YEARS", "10"))
+
+# 同一檔多久內不重複檢查上游（秒）
+PRICE_STORE_REFRESH_SECONDS = float(os.getenv("PRICE_STORE_REFRESH_SECONDS", str(6 * 60 * 60)))
+
+# 每批最多幾檔（yf.download 一次處理的 ticker 數）
+PRICE_STORE_BATCH_SIZE = int(os.getenv("PRICE_STORE_BATCH_SIZE", "50"))
+
+COLUMNS = (
+    ("date", np.dtype("<i8")),
+    ("open", np.dtype("<f8")),
+    ("high", np.dtype("<f8")),
+    ("low", np.dtype("<f8")),
+    ("close", np.dtype("<f8")),
+    ("volume", np.dtype("<f8")),
+)
+COLUMNS_BY_NAME = dict(COLUMNS)
+PRICE_FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+
+class PriceHistory(NamedTuple):
+    """各欄位等長的 1-D array；dates 為 datetime64[D]"""
+    dates: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+
+    def __len__(self):
+        return len(self.dates)
+
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+# symbol -> (檔案列數, {column: memmap})；append 後列數改變就重新 map
+_maps: Dict[str, tuple] = {}
+_maps_lock = threading.Lock()
+
+_last_checked: Dict[str, float] = {}
+
+_stats = {"refreshes": 0, "downloads": 0, "bars_appended": 0, "skipped_fresh": 0, "skipped_breaker": 0, "download_errors": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(field: str, n: int = 1):
+    with _stats_lock:
+        _stats[field] += n
+
+
+def _lock_for(symbol: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(symbol, threading.Lock())
+
+
+def _symbol_dir(symbol: str) -> str:
+    # symbol 可能含 ^ / = 等字元，但不會有路徑分隔符號
+    return os.path.join(PRICE_STORE_DIR, symbol.replace("/", "_"))
+
+
+def _column_path(symbol: str, column: str) -> str:
+    return os.path.join(_symbol_dir(symbol), f"{column}.{COLUMNS_BY_NAME[column].str[1:]}")
+
+
+def _rows_on_disk(symbol: str) -> int:
+    """各欄位中最短的列數（append 中途失敗時，多出來的部分視為不存在）"""
+    rows = None
+    for name, dtype in COLUMNS:
+        try:
+            n = os.path.getsize(_column_path(symbol, name)) // dtype.itemsize
+        except OSError:
+            return 0
+        rows = n if rows is None else min(rows, n)
+    return rows or 0
+
+
+def _empty() -> PriceHistory:
+    return PriceHistory(
+        np.empty(0, dtype="datetime64[D]"),
+        *(np.empty(0, dtype=dtype) for name, dtype in COLUMNS[1:]),
+    )
+
+
+def _columns(symbol: str) -> Optional[Dict[str, np.ndarray]]:
+    rows = _rows_on_disk(symbol)
+    if rows == 0:
+        return None
+
+    with _maps_lock:
+        cached = _maps.get(symbol)
+        if cached and cached[0] == rows:
+            return cached[1]
+
+    maps = {
+        name: np.memmap(_column_path(symbol, name), dtype=dtype, mode="r", shape=(rows,))
+        for name, dtype in COLUMNS
+    }
+    with _maps_lock:
+        _maps[symbol] = (rows, maps)
+    return maps
+
+
+def _normalize(symbol: str) -> str:
+    return symbol.strip().upper()
+
+
+def last_date(symbol: str) -> Optional[dt.date]:
+    """high-water mark：已儲存的最後一根日線日期"""
+    cols = _columns(_normalize(symbol))
+    if cols is None:
+        return None
+    return dt.date(1970, 1, 1) + dt.timedelta(days=int(cols["date"][-1]))
+
+
+def read(symbol: str, start: Optional[dt.date] = None, end: Optional[dt.date] = None) -> PriceHistory:
+    """
+    讀取 [start, end]（含）的日線；回傳 memmap 切片，不複製資料（唯讀）。
+    """
+    cols = _columns(_normalize(symbol))
+    if cols is None:
+        return _empty()
+
+    days = cols["date"]
+    lo = 0 if start is None else int(np.searchsorted(days, _to_days(start), side="left"))
+    hi = len(days) if end is None else int(np.searchsorted(days, _to_days(end), side="right"))
+
+    return PriceHistory(
+        days[lo:hi].view("datetime64[D]"),
+        *(cols[name][lo:hi] for name, _ in COLUMNS[1:]),
+    )
+
+
+def _to_days(d: dt.date) -> int:
+    return (d - dt.date(1970, 1, 1)).days
+
+
+def append(symbol: str, days: np.ndarray, values: Dict[str, np.ndarray]) -> int:
+    """
+    寫入 high-water mark 之後的日線（days：距 1970-01-01 天數，需遞增）
+    回傳實際寫入幾列。
+    """
+    symbol = _normalize(symbol)
+    days = np.asarray(days, dtype="<i8")
+
+    with _lock_for(symbol):
+        os.makedirs(_symbol_dir(symbol), exist_ok=True)
+        rows = _rows_on_disk(symbol)
+
+        hwm = None
+        if rows:
+            with open(_column_path(symbol, "date"), "rb") as f:
+                f.seek((rows - 1) * 8)
+                hwm = int(np.frombuffer(f.read(8), dtype="<i8")[0])
+
+        keep = days > hwm if hwm is not None else np.ones(len(days), dtype=bool)
+        if not keep.any():
+            return 0
+
+        batch = {"date": days[keep]}
+        for name, dtype in COLUMNS[1:]:
+            batch[name] = np.asarray(values[name], dtype=dtype)[keep]
+
+        for name, dtype in COLUMNS:
+            path = _column_path(symbol, name)
+            with open(path, "ab") as f:
+                # 先截掉上次失敗留下的多餘資料，確保各欄位對齊
+                f.truncate(rows * dtype.itemsize)
+                f.write(batch[name].tobytes())
+
+    n = int(keep.sum())
+    _count("bars_appended", n)
+    return n
+
+
+def _frame_columns(df, symbol: str, multi: bool):
+    """yf.download 結果 → (days, {column: values})；只保留 Close 有值、且已收盤的日線"""
+    try:
+        frame = df[symbol] if multi else df
+        frame = frame[list(PRICE_FIELDS)]
+    except KeyError:
+        return None
+
+    frame = frame[frame["Close"].notna()]
+    if frame.empty:
+        return None
+
+    days = frame.index.values.astype("datetime64[D]").astype("<i8")
+
+    # 今天（含）之後的日線可能還在盤中 → 不寫入，避免 high-water mark 擋掉之後的修正
+    complete = days < _to_days(dt.date.today())
+    if not complete.any():
+        return None
+
+    values = {
+        name.lower(): frame[name].to_numpy(dtype="f8", na_value=math.nan)[complete]
+        for name in PRICE_FIELDS
+    }
+    return days[complete], values
+
+
+def _forget_checked(symbols: List[str]):
+    """這次沒真的拿到資料 → 不算檢查過，下次 refresh 不受 PRICE_STORE_REFRESH_SECONDS 節流"""
+    for symbol in symbols:
+        _last_checked.pop(symbol, None)
+
+
+def _download(symbols: List[str], start: dt.date) -> int:
+    yf_breaker = breakers["yfinance"]
+    if not yf_breaker.allow():
+        # yfinance 暫停中：下次 refresh 再試
+        _count("skipped_breaker")
+        _forget_checked(symbols)
+        return 0
+
+    try:
+        with metrics.external_call("yfinance", "download") as call:
+            df = yf.download(
+                tickers=symbols,
+                start=start.isoformat(),
+                interval="1d",
+                group_by="ticker",
+                auto_adjust=False,
+                progress=False,
+                threads=True,
+            )
+            if df is None or df.empty:
+                call.outcome = "empty"
+    except Exception as e:
+        print("[price_store] download error:", symbols, e)
+        yf_breaker.record_failure()
+        _count("download_errors")
+        _forget_checked(symbols)
+        return 0
+    # 長區間回補本來就慢 → 不以耗時判定失敗；沒有新日線（假日）也是正常
+    yf_breaker.record_success()
+    _count("downloads")
+
+    if df is None or df.empty:
+        return 0
+
+    multi = getattr(df.columns, "nlevels", 1) > 1
+    appended = 0
+    for symbol in symbols:
+        parsed = _frame_columns(df, symbol, multi)
+        if parsed:
+            appended += append(symbol, *parsed)
+    return appended
+
+
+def refresh(symbols: Iterable[str], force: bool = False) -> int:
+    """
+    增量更新：每檔只向上游要 high-water mark 隔天之後的資料。
+    同一個起始日的 symbol 合併成一次 yf.download。回傳新寫入的總列數。
+    force=False → PRICE_STORE_REFRESH_SECONDS 內檢查過的 symbol 直接略過。
+    """
+    now = time.monotonic()
+    today = dt.date.today()
+    by_start: Dict[dt.date, List[str]] = {}
+
+    for symbol in sorted({_normalize(s) for s in symbols if s and s.strip()}):
+        checked = _last_checked.get(symbol)
+        if not force and checked is not None and now - checked < PRICE_STORE_REFRESH_SECONDS:
+            _count("skipped_fresh")
+            continue
+        _last_checked[symbol] = now
+
+        hwm = last_date(symbol)
+        start = hwm + dt.timedelta(days=1) if hwm else today - dt.timedelta(days=365 * PRICE_HISTORY_YEARS)
+        if start >= today:
+            continue
+        by_start.setdefault(start, []).append(symbol)
+
+    appended = 0
+    for start, group in by_start.items():
+        for i in range(0, len(group), max(PRICE_STORE_BATCH_SIZE, 1)):
+            appended += _download(group[i : i + PRICE_STORE_BATCH_SIZE], start)
+
+    _count("refreshes")
+    return appended
+
+
+def get_history(
+    symbol: str,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+) -> PriceHistory:
+    """先增量更新（有節流），再讀取區間"""
+    refresh([symbol])
+    return read(symbol, start, end)
+
+
+def stats() -> Dict[str, int]:
+    with _stats_lock:
+        out = dict(_stats)
+    with _maps_lock:
+        out["mapped_symbols"] = len(_maps)
+    return out
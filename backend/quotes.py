@@ -0,0 +1,388 @@
+# quotes.py — 批次報價服務（多檔股票一次抓取 + 全域 TTL / LRU 快取）
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import yfinance as yf
+
+import metrics
+from breaker import breakers
+
+
+# 每批最多幾檔（yf.download 一次處理的 ticker 數）
+QUOTE_BATCH_SIZE = int(os.getenv("QUOTE_BATCH_SIZE", "50"))
+
+# 報價快取：存活秒數 / 最多幾檔
+QUOTE_CACHE_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "60"))
+QUOTE_CACHE_MAX_SIZE = int(os.getenv("QUOTE_CACHE_MAX_SIZE", "2048"))
+
+# 每個 request 最多等報價幾秒；逾時 → 用最後一次成功的報價（stale），抓取在背景繼續
+QUOTE_DEADLINE_SECONDS = float(os.getenv("QUOTE_DEADLINE_SECONDS", "3"))
+QUOTE_FETCH_WORKERS = int(os.getenv("QUOTE_FETCH_WORKERS", "4"))
+
+# single-flight：等別人的同一筆抓取最多幾秒（沒有給 deadline 的 caller 用這個）
+QUOTE_WAIT_SECONDS = float(os.getenv("QUOTE_WAIT_SECONDS", "30"))
+
+# 最後一次成功的報價（last-known-good）最多保留幾檔
+QUOTE_LAST_GOOD_MAX_SIZE = int(os.getenv("QUOTE_LAST_GOOD_MAX_SIZE", "10000"))
+
+# 股票基本資料（名稱等）變動很少，快取久一點
+INFO_CACHE_TTL_SECONDS = float(os.getenv("INFO_CACHE_TTL_SECONDS", str(6 * 60 * 60)))
+INFO_CACHE_MAX_SIZE = int(os.getenv("INFO_CACHE_MAX_SIZE", "1024"))
+
+
+class TTLCache:
+    """
+    Process-wide TTL + LRU 快取，附 single-flight：
+    - 超過 max_size → 淘汰最久沒用的 key
+    - 同一個 key 同時 miss → 只有第一個 caller 打上游，其他人等同一個結果
+      （最多等到 deadline；等不到 → 把卡住的 in-flight 移除，下一個 caller 重新抓）
+    - hits / misses / evictions 計數，方便調整 TTL 與大小
+    """
+
+    def __init__(self, name: str, max_size: int, ttl_seconds: float, wait_seconds: Optional[float] = None):
+        self.name = name
+        self.max_size = max(max_size, 1)
+        self.ttl_seconds = ttl_seconds
+        self.wait_seconds = wait_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.wait_timeouts = 0
+
+    def _store(self, key: str, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(
+        self,
+        keys: Iterable[str],
+        loader: Callable[[List[str]], Dict[str, Any]],
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        loader(missing_keys) -> {key: value}；loader 沒回傳的 key 視為查無資料（不快取）。
+        回傳只包含有值的 key。
+        timeout：等其他 caller 的 in-flight 結果最多幾秒（None → wait_seconds）；
+        逾時的 key 不在結果中。
+        """
+        result: Dict[str, Any] = {}
+        claimed: Dict[str, Future] = {}
+        waiting: Dict[str, Future] = {}
+        now = time.monotonic()
+        if timeout is None:
+            timeout = self.wait_seconds
+        deadline = None if timeout is None else now + max(timeout, 0)
+
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry and entry[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    result[key] = entry[1]
+                elif key in self._inflight:
+                    self.coalesced += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    self.misses += 1
+                    claimed[key] = self._inflight[key] = Future()
+
+        if claimed:
+            loaded: Dict[str, Any] = {}
+            try:
+                loaded = loader(list(claimed)) or {}
+            finally:
+                with self._lock:
+                    for key, fut in claimed.items():
+                        value = loaded.get(key)
+                        if value is not None:
+                            self._store(key, value)
+                        # 等太久的 caller 可能已經把它移除、換成別人的新抓取
+                        if self._inflight.get(key) is fut:
+                            del self._inflight[key]
+                        fut.set_result(value)
+            for key in claimed:
+                if loaded.get(key) is not None:
+                    result[key] = loaded[key]
+
+        for key, fut in waiting.items():
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                value = fut.result(timeout=remaining)
+            except FutureTimeout:
+                # 卡住的抓取不再讓後來的 caller 排隊等
+                with self._lock:
+                    self.wait_timeouts += 1
+                    if self._inflight.get(key) is fut:
+                        del self._inflight[key]
+                continue
+            if value is not None:
+                result[key] = value
+
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "wait_timeouts": self.wait_timeouts,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+quote_cache = TTLCache("quotes", QUOTE_CACHE_MAX_SIZE, QUOTE_CACHE_TTL_SECONDS, QUOTE_WAIT_SECONDS)
+info_cache = TTLCache("info", INFO_CACHE_MAX_SIZE, INFO_CACHE_TTL_SECONDS, QUOTE_WAIT_SECONDS)
+
+
+def _chunks(items: List[str], size: int):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _clean(value) -> Optional[float]:
+    """NaN / None / 非數字 → None"""
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    if math.isnan(v):
+        return None
+    return v
+
+
+def _closes_from_frame(df, symbol: str) -> List[float]:
+    """從 yf.download 結果取出某檔的 Close 序列（已去除 NaN）"""
+    try:
+        if getattr(df.columns, "nlevels", 1) > 1:
+            closes = df[symbol]["Close"]
+        else:
+            closes = df["Close"]
+    except KeyError:
+        return []
+    return [c for c in (_clean(v) for v in closes.tolist()) if c is not None]
+
+
+def _download_batch(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    一次抓取多檔最近幾日日線：
+    - price：最新一根 Close（盤中即為即時價）
+    - previous_close：前一根 Close
+    """
+    quotes: Dict[str, Dict[str, Any]] = {}
+
+    yf_breaker = breakers["yfinance"]
+    if not yf_breaker.allow():
+        return quotes
+
+    start = time.perf_counter()
+    try:
+        with metrics.external_call("yfinance", "download") as call:
+            df = yf.download(
+                tickers=symbols,
+                period="5d",
+                interval="1d",
+                group_by="ticker",
+                auto_adjust=False,
+                progress=False,
+                threads=True,
+            )
+            if df is None or df.empty:
+                call.outcome = "empty"
+    except Exception as e:
+        print("[quotes] batch download error:", symbols, e)
+        yf_breaker.record_failure()
+        return quotes
+
+    # yf.download 會自己吞掉錯誤 → 整批都沒資料才算上游失敗
+    if df is None or df.empty:
+        yf_breaker.record_failure()
+        return quotes
+    yf_breaker.record_success(time.perf_counter() - start)
+
+    for symbol in symbols:
+        closes = _closes_from_frame(df, symbol)
+        if not closes:
+            continue
+        quotes[symbol] = {
+            "symbol": symbol,
+            "price": closes[-1],
+            "previous_close": closes[-2] if len(closes) > 1 else None,
+        }
+
+    return quotes
+
+
+def _fetch_single(symbol: str) -> Optional[Dict[str, Any]]:
+    """批次抓不到的 symbol → 退回單檔 fast_info / info（breaker open → 直接放棄）"""
+    yf_breaker = breakers["yfinance"]
+    if not yf_breaker.allow():
+        return None
+
+    start = time.perf_counter()
+    try:
+        ticker = yf.Ticker(symbol)
+        # fast_info 是 lazy 的：實際的網路呼叫發生在 .get() 時
+        with metrics.external_call("yfinance", "fast_info"):
+            fast = ticker.fast_info or {}
+            price = _clean(fast.get("lastPrice"))
+            prev = _clean(fast.get("previousClose"))
+        if price is None:
+            with metrics.external_call("yfinance", "info"):
+                info = ticker.info or {}
+            price = _clean(info.get("regularMarketPrice"))
+    except Exception as e:
+        print("[quotes] single fetch error:", symbol, e)
+        yf_breaker.record_failure()
+        return None
+
+    # 查無此檔（下市 / 打錯）不是上游故障
+    yf_breaker.record_success(time.perf_counter() - start)
+    if price is None:
+        return None
+
+    return {"symbol": symbol, "price": price, "previous_close": prev}
+
+
+def _load_quotes(wanted: List[str]) -> Dict[str, Dict[str, Any]]:
+    quotes: Dict[str, Dict[str, Any]] = {}
+
+    for chunk in _chunks(wanted, max(QUOTE_BATCH_SIZE, 1)):
+        quotes.update(_download_batch(chunk))
+
+    for symbol in wanted:
+        if symbol not in quotes:
+            q = _fetch_single(symbol)
+            if q:
+                quotes[symbol] = q
+
+    _remember(quotes)
+    return quotes
+
+
+def get_quotes(symbols: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    收集本次 request 需要的所有 symbol：快取命中直接回，其餘分批一次抓取。
+    回傳：{symbol: {"symbol", "price", "previous_close"}}
+    抓不到報價的 symbol 不會出現在結果中。
+    timeout：等別人進行中的同一檔抓取最多幾秒（None → QUOTE_WAIT_SECONDS）
+    """
+    wanted = sorted({s.strip().upper() for s in symbols if s and s.strip()})
+    return quote_cache.get_many(wanted, _load_quotes, timeout)
+
+
+def get_quote(symbol: str) -> Optional[Dict[str, Any]]:
+    return get_quotes([symbol]).get(symbol.strip().upper())
+
+
+# ============================================================
+# Deadline + last-known-good
+# ============================================================
+
+_last_good: "OrderedDict[str, tuple]" = OrderedDict()  # symbol -> (fetched_at, quote)
+_last_good_lock = threading.Lock()
+
+# 專用 thread：卡住的 yfinance 呼叫不會佔用 blocking_executor
+_fetch_pool = ThreadPoolExecutor(max_workers=max(QUOTE_FETCH_WORKERS, 1), thread_name_prefix="quote-fetch")
+
+
+def _remember(quotes: Dict[str, Dict[str, Any]]):
+    now = time.time()
+    with _last_good_lock:
+        for symbol, quote in quotes.items():
+            _last_good[symbol] = (now, quote)
+            _last_good.move_to_end(symbol)
+        while len(_last_good) > max(QUOTE_LAST_GOOD_MAX_SIZE, 1):
+            _last_good.popitem(last=False)
+
+
+def get_quotes_within(
+    symbols: Iterable[str],
+    timeout: float = QUOTE_DEADLINE_SECONDS,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    get_quotes + 期限：最多等 timeout 秒。
+    來不及 / 抓不到的 symbol → 最後一次成功的報價，標記 stale=True。
+    每筆 quote 額外帶：
+    - stale：不是這次（或快取 TTL 內）拿到的價格
+    - age_seconds：價格是幾秒前抓的
+    兩者都沒有的 symbol 不會出現在結果中。
+    """
+    wanted = sorted({s.strip().upper() for s in symbols if s and s.strip()})
+    if not wanted:
+        return {}
+
+    # 等 single-flight 的 caller 也只等到 deadline → 不會有 worker 跟著卡住的抓取一起卡著
+    future = _fetch_pool.submit(get_quotes, wanted, timeout)
+    try:
+        fresh = future.result(timeout=max(timeout, 0))
+    except FutureTimeout:
+        print(f"[quotes] deadline {timeout}s exceeded, using last known prices:", wanted)
+        fresh = {}
+    except Exception as e:
+        print("[quotes] fetch error:", e)
+        fresh = {}
+
+    now = time.time()
+    with _last_good_lock:
+        last_good = {s: _last_good[s] for s in wanted if s in _last_good}
+
+    result: Dict[str, Dict[str, Any]] = {}
+    for symbol in wanted:
+        if symbol in fresh:
+            fetched_at = last_good.get(symbol, (now, None))[0]
+            result[symbol] = {**fresh[symbol], "stale": False, "age_seconds": round(now - fetched_at, 1)}
+        elif symbol in last_good:
+            fetched_at, quote = last_good[symbol]
+            result[symbol] = {**quote, "stale": True, "age_seconds": round(now - fetched_at, 1)}
+    return result
+
+
+def _load_info(wanted: List[str]) -> Dict[str, Dict[str, Any]]:
+    infos: Dict[str, Dict[str, Any]] = {}
+    for symbol in wanted:
+        try:
+            with breakers["yfinance"].guard(), metrics.external_call("yfinance", "info"):
+                info = yf.Ticker(symbol).info or {}
+        except Exception as e:
+            print("[quotes] info fetch error:", symbol, e)
+            continue
+        if info:
+            infos[symbol] = info
+    return infos
+
+
+def get_info(symbol: str) -> Dict[str, Any]:
+    """yfinance Ticker.info（名稱等基本資料），有快取"""
+    key = symbol.strip().upper()
+    return info_cache.get_many([key], _load_info).get(key) or {}
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {
+        "quotes": quote_cache.stats(),
+        "info": info_cache.stats(),
+    }
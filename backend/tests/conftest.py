@@ -0,0 +1,61 @@
+# conftest.py — 測試共用設定
+#
+# - 暫存 DB / price store（必須在 import main / price_store 之前設定環境變數）
+# - yfinance / NewsAPI / OpenAI / Gemini 一律換成 benchmarks/fakes.py 的假上游，完全離線
+#
+# 執行（在 backend/ 底下）：python -m pytest tests
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+_WORKDIR = tempfile.mkdtemp(prefix="ai_stock_tests_")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ["DB_PATH"] = os.path.join(_WORKDIR, "news.db")
+os.environ["PRICE_STORE_DIR"] = os.path.join(_WORKDIR, "price_store")
+os.environ["TRACE_FILE"] = ""
+os.environ.setdefault("NEWS_SUMMARIZER_PROVIDER", "openai")
+os.environ.setdefault("OPENAI_API_KEY", "test-openai-key")
+os.environ.setdefault("NEWS_API_KEY", "test-newsapi-key")
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    import fakes
+    import main
+
+    fakes.install(
+        main,
+        fakes.FakeConfig(yf_latency_ms=1, news_latency_ms=1, llm_latency_ms=1, jitter=0),
+    )
+    main.init_db()
+    return main
+
+
+@pytest.fixture(scope="session")
+def client(main_module):
+    from fastapi.testclient import TestClient
+
+    with TestClient(main_module.app) as c:
+        yield c
+
+
+_user_seq = 0
+
+
+@pytest.fixture
+def auth_headers(client):
+    """每個測試一位新使用者（避免當日快取互相影響）"""
+    global _user_seq
+    _user_seq += 1
+    email = f"user{_user_seq}@example.com"
+    client.post("/auth/register", json={"email": email, "password": "test-password"})
+    token = client.post(
+        "/auth/login", json={"email": email, "password": "test-password"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,18 @@
+def test_debug_traces_require_login(client):
+    assert client.get("/debug/traces").status_code == 401
+    assert client.get("/debug/traces/abc").status_code == 401
+
+
+def test_debug_traces_reject_non_admin(client, auth_headers):
+    assert client.get("/debug/traces", headers=auth_headers).status_code == 403
+    assert client.get("/debug/traces/abc", headers=auth_headers).status_code == 403
+
+
+def test_debug_traces_allow_admin(main_module, client, auth_headers, monkeypatch):
+    email = client.get("/me", headers=auth_headers).json()["email"]
+    monkeypatch.setattr(main_module, "TRACE_ADMIN_EMAILS", {email})
+
+    r = client.get("/debug/traces", headers=auth_headers)
+    assert r.status_code == 200
+    assert "traces" in r.json()
+    assert client.get("/debug/traces/missing", headers=auth_headers).status_code == 404
@@ -0,0 +1,50 @@
+import threading
+import time
+import types
+
+import fakes
+
+# 假 LLM 要卡多久；/health 必須遠低於這個時間就回應
+SLOW_LLM_SECONDS = 2.0
+HEALTH_LATENCY_BOUND_SECONDS = 0.5
+
+
+class SlowCompletions:
+    def __init__(self):
+        self.started = threading.Event()
+
+    def create(self, **kwargs):
+        self.started.set()
+        time.sleep(SLOW_LLM_SECONDS)  # 同步阻塞，與真實 OpenAI SDK 相同
+        return fakes._FakeCompletions().create(**kwargs)
+
+
+def test_health_stays_fast_during_slow_llm_call(main_module, client, auth_headers, monkeypatch):
+    completions = SlowCompletions()
+    monkeypatch.setattr(
+        main_module, "openai_client", types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    )
+    # 沒有任何快取可用的 symbol → 一定會呼叫 LLM
+    client.post("/holdings", json={"symbol": "SLOWLLM", "shares": 1, "cost_basis": 10}, headers=auth_headers)
+
+    report = {}
+
+    def fetch_report():
+        report["response"] = client.get("/reports/today", headers=auth_headers)
+
+    worker = threading.Thread(target=fetch_report)
+    worker.start()
+    assert completions.started.wait(10), "report never reached the LLM call"
+
+    latencies = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        assert client.get("/health").status_code == 200
+        latencies.append(time.perf_counter() - t0)
+
+    # 量測期間 LLM 呼叫仍在進行
+    assert worker.is_alive()
+    assert max(latencies) < HEALTH_LATENCY_BOUND_SECONDS, latencies
+
+    worker.join(30)
+    assert report["response"].status_code == 200
@@ -0,0 +1,57 @@
+import time
+
+
+def test_news_body_is_stable_for_strong_etag(client):
+    first = client.get("/news")
+    assert first.status_code == 200
+    assert first.headers["etag"].startswith('"')
+    assert "cache_age_seconds" not in first.json()
+    assert int(first.headers["age"]) >= 0
+
+    time.sleep(1.1)
+
+    # 同一版本 → 同一個強 ETag，body 必須逐 byte 相同（快取多舊只在 Age header）
+    second = client.get("/news")
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.content == first.content
+
+    revalidated = client.get("/news", headers={"If-None-Match": first.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert "age" in revalidated.headers
+
+
+def test_not_modified_keeps_encoding_suffix(client):
+    gz = {"Accept-Encoding": "gzip"}
+    first = client.get("/news", headers=gz)
+    assert first.headers.get("content-encoding") == "gzip"
+    etag = first.headers["etag"]
+    assert etag.endswith('-gzip"')
+
+    # 304 的 ETag 要和 client 快取的壓縮版 200 相同
+    revalidated = client.get("/news", headers={**gz, "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+
+    plain = client.get("/news", headers={"Accept-Encoding": "identity"})
+    assert "-gzip" not in plain.headers["etag"]
+    revalidated = client.get(
+        "/news", headers={"Accept-Encoding": "identity", "If-None-Match": plain.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == plain.headers["etag"]
+
+
+def test_news_max_age_and_age_do_not_double_count(main_module, client, monkeypatch):
+    client.get("/news")  # 確保已有快取
+    ttl = main_module.CACHE_EXPIRE_MINUTES * 60
+    ages = {"international": ttl / 2, "us_finance": ttl / 4}
+    monkeypatch.setattr(
+        main_module, "news_cache_age_seconds", lambda conn, category: ages.get(category, ttl / 4)
+    )
+
+    for r in (client.get("/news"), client.get("/news", headers={"If-None-Match": "*"})):
+        # 剩餘新鮮度 = max-age − Age = 最快過期的 category 還剩幾秒
+        assert r.headers["cache-control"] == f"public, max-age={ttl}"
+        assert int(r.headers["age"]) == ttl // 2
+        max_age = int(r.headers["cache-control"].split("max-age=")[1])
+        assert max_age - int(r.headers["age"]) == ttl // 2
@@ -0,0 +1,25 @@
+def test_failed_news_refresh_backs_off(main_module, client, monkeypatch):
+    calls = []
+
+    async def newsapi_down(categories=main_module.NEWS_CATEGORIES):
+        calls.extend(categories)
+        return {c: [] for c in categories}
+
+    monkeypatch.setattr(main_module, "fetch_news_from_newsapi", newsapi_down)
+    # 假裝沒有快取 → 原本每個 request 都要等一次 refresh
+    monkeypatch.setattr(main_module, "news_cache_age_seconds", lambda conn, category: None)
+    monkeypatch.setattr(main_module, "_news_refresh_failed_at", {})
+
+    assert client.get("/news").status_code == 200
+    assert sorted(calls) == sorted(main_module.NEWS_CATEGORIES)
+    assert set(main_module._news_refresh_failed_at) == set(main_module.NEWS_CATEGORIES)
+
+    # backoff 期間：不再打 NewsAPI，也不等 refresh
+    for _ in range(3):
+        assert client.get("/news").status_code == 200
+    assert len(calls) == len(main_module.NEWS_CATEGORIES)
+
+    # backoff 過了 → 再試一次
+    monkeypatch.setattr(main_module, "NEWS_REFRESH_BACKOFF_SECONDS", 0)
+    client.get("/news")
+    assert len(calls) == 2 * len(main_module.NEWS_CATEGORIES)
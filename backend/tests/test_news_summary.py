@@ -0,0 +1,81 @@
+import asyncio
+import time
+import types
+
+import fakes
+
+
+class SlowBatchCompletions:
+    """批次摘要要比單篇逾時還久才回；記下每次呼叫的 timeout"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.timeouts = []
+
+    def create(self, **kwargs):
+        self.timeouts.append(kwargs.get("timeout"))
+        time.sleep(self.delay)
+        return fakes._FakeCompletions().create(**kwargs)
+
+
+def test_batch_summary_timeout_scales_with_batch_size(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "NEWS_SUMMARY_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(main_module, "NEWS_SUMMARY_BATCH_TIMEOUT_PER_ITEM_SECONDS", 0.5)
+    monkeypatch.setattr(main_module, "NEWS_SUMMARY_BATCH_TIMEOUT_MAX_SECONDS", 5)
+    completions = SlowBatchCompletions(delay=0.5)
+    monkeypatch.setattr(
+        main_module, "openai_client", types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    )
+
+    articles = [
+        {"title": f"Batch timeout article {i} {time.time()}", "content": f"Body {i} " * 20}
+        for i in range(3)
+    ]
+    stats = {}
+    results = asyncio.run(main_module.summarize_articles(articles, stats))
+
+    # 3 篇 → 0.2 + 0.5 * 2 = 1.2 秒；0.5 秒的批次呼叫不會被當成逾時
+    assert main_module.news_summary_batch_timeout(3) == 1.2
+    assert completions.timeouts == [1.2]
+    assert stats["batch_calls"] == 1 and stats["single_calls"] == 0
+    assert stats["summarized"] == 3 and stats["fallback"] == 0
+    assert all(r[0].startswith("標題 ") for r in results)
+
+
+def test_batch_summary_timeout_is_capped(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "NEWS_SUMMARY_TIMEOUT_SECONDS", 20)
+    monkeypatch.setattr(main_module, "NEWS_SUMMARY_BATCH_TIMEOUT_PER_ITEM_SECONDS", 6)
+    monkeypatch.setattr(main_module, "NEWS_SUMMARY_BATCH_TIMEOUT_MAX_SECONDS", 45)
+    assert main_module.news_summary_batch_timeout(1) == 20
+    assert main_module.news_summary_batch_timeout(3) == 32
+    assert main_module.news_summary_batch_timeout(10) == 45
+
+
+def test_reused_summary_survives_retention(main_module):
+    article = {"title": f"Retention article {time.time()}", "content": "Body " * 20, "url": "https://example.com/r"}
+    content_hash = main_module.news_content_hash(article)
+    asyncio.run(main_module.summarize_articles([article]))
+
+    # 建立很久了，但今天還被沿用 → 不應被清掉
+    days = main_module.NEWS_SUMMARY_RETENTION_DAYS + 5
+    conn = main_module.get_db()
+    conn.execute(
+        "UPDATE news_summaries SET created_at=datetime('now', ?), last_used_at=datetime('now', ?) WHERE content_hash=?",
+        (f"-{days} days", f"-{days} days", content_hash),
+    )
+    conn.commit()
+    conn.close()
+
+    stats = {}
+    asyncio.run(main_module.summarize_articles([article], stats))
+    assert stats["reused"] == 1
+
+    # 下一次寫入會跑清除：沿用過的摘要要留下
+    other = {"title": f"Other article {time.time()}", "content": "Other " * 20}
+    asyncio.run(main_module.summarize_articles([other]))
+
+    conn = main_module.get_db()
+    try:
+        assert main_module.load_news_summaries(conn, [content_hash])
+    finally:
+        conn.close()
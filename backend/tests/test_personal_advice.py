@@ -0,0 +1,84 @@
+import asyncio
+import datetime as dt
+
+
+def test_unpriced_holding_skips_shared_symbol_cache(main_module):
+    today = dt.date.today().isoformat()
+    poisoned = {"action": "SELL", "reason_zh": "其他使用者的 flat 建議", "risk_level": "HIGH"}
+    main_module.save_symbol_advice(today, {("NOPRICE", "flat"): poisoned})
+
+    # 沒有報價 → current_price 0、profit_rate 0（看起來像 flat 區間）
+    holdings = main_module.price_holdings(
+        [{"symbol": "NOPRICE", "shares": 1, "cost_basis": 50}, {"symbol": "PRICED", "shares": 1, "cost_basis": 50}],
+        {"PRICED": {"symbol": "PRICED", "price": 51.0}},
+    )
+    assert holdings[0]["current_price"] == 0
+    assert main_module.symbol_advice_key(holdings[0]) is None
+    assert main_module.symbol_advice_key(holdings[1]) == ("PRICED", "flat")
+
+    actions = asyncio.run(main_module.generate_personal_actions(holdings))
+    by_symbol = {a["symbol"]: a for a in actions}
+
+    # 不讀共用快取，也不覆蓋它
+    assert by_symbol["NOPRICE"]["reason_zh"] != poisoned["reason_zh"]
+    assert main_module.load_symbol_advice(today, [("NOPRICE", "flat")]) == {("NOPRICE", "flat"): poisoned}
+    assert ("PRICED", "flat") in main_module.load_symbol_advice(today, [("PRICED", "flat")])
+
+
+def test_personal_advice_precompute_runs_after_local_midnight(main_module, client):
+    job = main_module.scheduler.get_job("personal_advice_precompute")
+    assert job is not None
+
+    # 伺服器本地時區換日後才跑 → 寫入的 key 就是當天 request 用的 dt.date.today()
+    run_at = job.next_run_time
+    assert run_at.utcoffset() == run_at.astimezone().utcoffset()
+    assert (run_at.hour, run_at.minute) == (
+        main_module.PERSONAL_ADVICE_PRECOMPUTE_HOUR,
+        main_module.PERSONAL_ADVICE_PRECOMPUTE_MINUTE,
+    )
+
+
+def test_personal_advice_precompute_due_after_todays_run_time(main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "PERSONAL_ADVICE_PRECOMPUTE_HOUR", 0)
+    monkeypatch.setattr(main_module, "PERSONAL_ADVICE_PRECOMPUTE_MINUTE", 5)
+    day = dt.datetime(2026, 1, 2)
+    assert not main_module.personal_advice_precompute_due(day.replace(hour=0, minute=4))
+    assert main_module.personal_advice_precompute_due(day.replace(hour=0, minute=5))
+    assert main_module.personal_advice_precompute_due(day.replace(hour=13))
+
+
+def test_precompute_resumes_after_partial_run(main_module, client):
+    users = []
+    for n in range(2):
+        email = f"resume{n}-{dt.datetime.now().timestamp()}@example.com"
+        client.post("/auth/register", json={"email": email, "password": "test-password"})
+        token = client.post("/auth/login", json={"email": email, "password": "test-password"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        client.post("/holdings", json={"symbol": "RESUME", "shares": 1, "cost_basis": 10}, headers=headers)
+        users.append(client.get("/me", headers=headers).json()["id"])
+
+    # 第一位在「當掉之前」已經完成
+    today = dt.date.today().isoformat()
+    done = [{"symbol": "RESUME", "action": "HOLD", "reason_zh": "重啟前完成", "risk_level": "LOW"}]
+    main_module.save_personal_advice(user_id=users[0], date=today, actions=done)
+
+    asyncio.run(main_module.precompute_personal_advice())
+
+    assert main_module.get_cached_personal_advice(users[0], today) == done
+    assert [a["symbol"] for a in main_module.get_cached_personal_advice(users[1], today)] == ["RESUME"]
+
+
+def test_prompt_marks_unpriced_holding_as_unknown(main_module):
+    holdings = main_module.price_holdings(
+        [{"symbol": "NOPRICE", "shares": 1, "cost_basis": 50}, {"symbol": "PRICED", "shares": 1, "cost_basis": 50}],
+        {"PRICED": {"symbol": "PRICED", "price": 51.0}},
+    )
+    prompt = main_module.personal_actions_prompt([main_module.advice_item(h) for h in holdings])
+
+    lines = {line.split(" | ")[0]: line for line in prompt.splitlines() if " | 現價 " in line}
+    assert "未知" in lines["NOPRICE"] and "±5%" not in lines["NOPRICE"]
+    assert lines["PRICED"] == "PRICED | 現價 51.0 | 損益區間 損益 ±5% 以內"
+    assert "請勿自行假設" in prompt
+
+    priced_only = main_module.personal_actions_prompt([main_module.advice_item(holdings[1])])
+    assert "未知" not in priced_only
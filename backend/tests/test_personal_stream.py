@@ -0,0 +1,162 @@
+import datetime as dt
+import json
+import types
+
+import pytest
+
+# reason 裡刻意放括號 / 引號 / 跳脫字元，確認不會被當成物件邊界
+LLM_ADVICE = [
+    {"symbol": "STRMB", "action": "BUY", "reason_zh": "突破 {前高} 與 \"壓力區\" [短線]", "risk_level": "HIGH"},
+    {"symbol": "STRMA", "action": "HOLD", "reason_zh": "路徑 C:\\data\\}{ 不影響", "risk_level": "LOW"},
+    {"symbol": "STRMC", "action": "SELL", "reason_zh": "跌破 }} 支撐", "risk_level": "MEDIUM"},
+]
+
+
+def chunked(text: str, size: int) -> list:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+# ============================================================
+# JsonArrayObjectParser
+# ============================================================
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1000])
+def test_parser_handles_chunk_splits(main_module, size):
+    text = "```json\nHere you go: " + json.dumps(LLM_ADVICE, ensure_ascii=False) + "\n```"
+    parser = main_module.JsonArrayObjectParser()
+
+    objects = []
+    for chunk in chunked(text, size):
+        objects.extend(parser.feed(chunk))
+
+    assert objects == LLM_ADVICE
+
+
+def test_parser_emits_each_object_as_soon_as_it_closes(main_module):
+    parser = main_module.JsonArrayObjectParser()
+    first = json.dumps(LLM_ADVICE[0], ensure_ascii=False)
+
+    assert parser.feed("[" + first[:-1]) == []
+    assert parser.feed("}") == [LLM_ADVICE[0]]
+    assert parser.feed(", ") == []
+
+
+def test_parser_ignores_brackets_before_array_and_nested_objects(main_module):
+    parser = main_module.JsonArrayObjectParser()
+    text = 'note {not json} [{"symbol": "X", "meta": {"a": "}"}}, {"symbol": "Y"}]'
+    assert parser.feed(text) == [{"symbol": "X", "meta": {"a": "}"}}, {"symbol": "Y"}]
+
+
+# ============================================================
+# POST /reports/personal/regenerate/stream
+# ============================================================
+
+class FakeStreamingCompletions:
+    """stream=True → 依 LLM_ADVICE 的順序分段吐出 JSON array；每段之前檢查 DB 還沒被寫入"""
+
+    def __init__(self, on_chunk):
+        self.on_chunk = on_chunk
+
+    def create(self, stream=False, **kwargs):
+        assert stream, "regenerate/stream must use the streaming API"
+        text = json.dumps(LLM_ADVICE, ensure_ascii=False)
+
+        def chunks():
+            for piece in chunked(text, 5):
+                self.on_chunk()
+                delta = types.SimpleNamespace(content=piece)
+                yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)], usage=None)
+            yield types.SimpleNamespace(
+                choices=[],
+                usage=types.SimpleNamespace(prompt_tokens=10, completion_tokens=20),
+            )
+
+        return chunks()
+
+
+def parse_sse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_regenerate_stream_orders_actions_and_saves_at_end(main_module, client, auth_headers, monkeypatch):
+    for symbol in ("STRMA", "STRMB", "STRMC"):
+        r = client.post("/holdings", json={"symbol": symbol, "shares": 1, "cost_basis": 10}, headers=auth_headers)
+        assert r.status_code == 200
+    user_id = client.get("/me", headers=auth_headers).json()["id"]
+    today = dt.date.today().isoformat()
+
+    old_actions = [{"symbol": "STRMA", "action": "OLD", "reason_zh": "舊的", "risk_level": "LOW"}]
+    main_module.save_personal_advice(user_id=user_id, date=today, actions=old_actions)
+
+    checks = []
+
+    def db_untouched():
+        checks.append(main_module.get_cached_personal_advice(user_id, today))
+
+    monkeypatch.setattr(
+        main_module,
+        "openai_client",
+        types.SimpleNamespace(chat=types.SimpleNamespace(completions=FakeStreamingCompletions(db_untouched))),
+    )
+
+    r = client.post("/reports/personal/regenerate/stream", headers=auth_headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(r.text)
+    actions = [data for event, data in events if event == "action"]
+    assert [event for event, _ in events] == ["action", "action", "action", "done"]
+
+    # action 依 LLM 寫完的順序送出
+    assert [a["symbol"] for a in actions] == ["STRMB", "STRMA", "STRMC"]
+    assert actions[0]["reason_zh"] == LLM_ADVICE[0]["reason_zh"]
+    assert events[-1][1] == {"personal_actions": 3}
+
+    # 串流期間 DB 維持舊資料；結束後才依持股順序寫入
+    assert checks and all(c == old_actions for c in checks)
+    saved = main_module.get_cached_personal_advice(user_id, today)
+    assert [a["symbol"] for a in saved] == ["STRMA", "STRMB", "STRMC"]
+    assert saved[1]["reason_zh"] == LLM_ADVICE[0]["reason_zh"]
+
+
+# ============================================================
+# GET /reports/today/stream：未快取的持股合併成一次串流呼叫
+# ============================================================
+
+class CountingCompletions:
+    def __init__(self):
+        import fakes
+
+        self.inner = fakes._FakeCompletions()
+        self.action_calls = []
+
+    def create(self, stream=False, **kwargs):
+        prompt = kwargs["messages"][0]["content"]
+        if "JSON array" in prompt:
+            self.action_calls.append(stream)
+        return self.inner.create(stream=stream, **kwargs)
+
+
+def test_today_stream_batches_uncached_holdings_into_one_call(main_module, client, auth_headers, monkeypatch):
+    symbols = [f"BATCH{c}" for c in "ABCDE"]
+    for symbol in symbols:
+        client.post("/holdings", json={"symbol": symbol, "shares": 1, "cost_basis": 10}, headers=auth_headers)
+
+    completions = CountingCompletions()
+    monkeypatch.setattr(
+        main_module, "openai_client", types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    )
+
+    r = client.get("/reports/today/stream", headers=auth_headers)
+    assert r.status_code == 200
+    events = parse_sse(r.text)
+
+    actions = [data["symbol"] for event, data in events if event == "action"]
+    assert sorted(actions) == symbols
+    assert events[-1] == ("done", {"personal_actions": len(symbols)})
+    # 5 檔都沒快取 → 只有一次（串流）GPT 呼叫
+    assert completions.action_calls == [True]
@@ -0,0 +1,56 @@
+import datetime as dt
+
+import pytest
+
+import price_store
+from breaker import breakers
+
+
+@pytest.fixture
+def open_yfinance_breaker():
+    yf_breaker = breakers["yfinance"]
+    for _ in range(yf_breaker.failure_threshold):
+        yf_breaker.record_failure()
+    assert yf_breaker.state == "open"
+    yield yf_breaker
+    yf_breaker.record_success()
+
+
+def test_refresh_with_open_breaker_skips_download(open_yfinance_breaker, monkeypatch):
+    def fail_download(*args, **kwargs):
+        raise AssertionError("yf.download must not be called while the breaker is open")
+
+    monkeypatch.setattr(price_store.yf, "download", fail_download)
+    before = price_store.stats()["skipped_breaker"]
+
+    assert price_store.refresh(["BRKOPEN"], force=True) == 0
+
+    assert price_store.stats()["skipped_breaker"] == before + 1
+    # 沒有真的檢查過 → 下一次 refresh 會再試
+    assert "BRKOPEN" not in price_store._last_checked
+
+
+def test_get_history_with_open_breaker_returns_empty(open_yfinance_breaker):
+    history = price_store.get_history("BRKEMPTY", dt.date(2020, 1, 1), None)
+    assert len(history) == 0
+
+
+def test_failed_download_is_retried_on_next_refresh(monkeypatch):
+    calls = []
+
+    def flaky_download(*args, **kwargs):
+        calls.append(kwargs["tickers"])
+        raise ConnectionError("upstream reset")
+
+    monkeypatch.setattr(price_store.yf, "download", flaky_download)
+    before = price_store.stats()["download_errors"]
+    try:
+        assert price_store.refresh(["DLFAIL"]) == 0
+        assert "DLFAIL" not in price_store._last_checked
+        assert price_store.stats()["download_errors"] == before + 1
+
+        # 失敗不算檢查過 → 不受 PRICE_STORE_REFRESH_SECONDS 節流，馬上重試
+        price_store.refresh(["DLFAIL"])
+        assert calls == [["DLFAIL"], ["DLFAIL"]]
+    finally:
+        breakers["yfinance"].record_success()
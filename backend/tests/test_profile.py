@@ -0,0 +1,50 @@
+import uuid
+
+
+def test_update_profile_rejects_missing_or_blank_nickname(client, auth_headers):
+    assert client.put("/users/update-profile", json={}, headers=auth_headers).status_code == 422
+    assert client.put("/users/update-profile", json={"nickname": "  "}, headers=auth_headers).status_code == 400
+    assert client.put("/users/update-profile", json={"nickname": "a@b"}, headers=auth_headers).status_code == 400
+
+
+def test_update_profile_rejects_nickname_of_another_user(client, auth_headers):
+    other = auth_headers
+    nickname = f"nick{uuid.uuid4().hex[:8]}"
+    assert client.put("/users/update-profile", json={"nickname": nickname}, headers=other).status_code == 200
+
+    email = f"dup{uuid.uuid4().hex[:8]}@example.com"
+    client.post("/auth/register", json={"email": email, "password": "test-password"})
+    token = client.post("/auth/login", json={"email": email, "password": "test-password"}).json()["access_token"]
+    second = {"Authorization": f"Bearer {token}"}
+
+    r = client.put("/users/update-profile", json={"nickname": nickname}, headers=second)
+    assert r.status_code == 400
+    assert client.get("/me", headers=second).json()["nickname"] != nickname
+
+    # 自己再存一次同樣的暱稱不算重複；nickname 登入仍對到唯一帳號
+    assert client.put("/users/update-profile", json={"nickname": nickname}, headers=other).status_code == 200
+    login = client.post("/auth/login", json={"email": nickname, "password": "test-password"})
+    assert login.json()["user"]["email"] == client.get("/me", headers=other).json()["email"]
+
+
+def test_update_profile_invalidates_principal_cache(client, auth_headers):
+    assert client.get("/me", headers=auth_headers).json()["nickname"] is None  # 讓 principal 進快取
+
+    nickname = f"new{uuid.uuid4().hex[:8]}"
+    r = client.put("/users/update-profile", json={"nickname": f"  {nickname} "}, headers=auth_headers)
+    assert r.status_code == 200
+    assert r.json()["nickname"] == nickname
+
+    # 同一個 token 再查 /me → 拿到新暱稱，不是快取裡的舊資料
+    assert client.get("/me", headers=auth_headers).json()["nickname"] == nickname
+
+
+def test_register_rejects_taken_nickname(client, auth_headers):
+    nickname = f"reg{uuid.uuid4().hex[:8]}"
+    assert client.put("/users/update-profile", json={"nickname": nickname}, headers=auth_headers).status_code == 200
+
+    r = client.post(
+        "/auth/register",
+        json={"email": f"{nickname}@example.com", "password": "test-password", "nickname": nickname},
+    )
+    assert r.status_code == 400
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import quotes
+
+
+def test_single_flight_waiter_gives_up_at_deadline():
+    cache = quotes.TTLCache("test", 10, 60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def hung_loader(keys):
+        calls.append(keys)
+        started.set()
+        release.wait(5)
+        return {k: "stale-owner" for k in keys}
+
+    owner = threading.Thread(target=cache.get_many, args=(["AAPL"], hung_loader))
+    owner.start()
+    assert started.wait(2)
+
+    t0 = time.perf_counter()
+    assert cache.get_many(["AAPL"], hung_loader, timeout=0.2) == {}
+    assert time.perf_counter() - t0 < 1
+    assert cache.stats()["wait_timeouts"] == 1
+
+    # 卡住的 in-flight 已移除 → 下一個 caller 自己重新抓，不再排隊
+    assert cache.get_many(["AAPL"], lambda keys: {k: "fresh" for k in keys}) == {"AAPL": "fresh"}
+
+    release.set()
+    owner.join(2)
+    assert not owner.is_alive()
+    assert calls == [["AAPL"]]
+    assert cache._inflight == {}
+
+
+def test_get_quotes_within_does_not_hold_fetch_workers(monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+
+    def hung_load(wanted):
+        started.set()
+        release.wait(5)
+        return {}
+
+    monkeypatch.setattr(quotes, "_load_quotes", hung_load)
+    symbol = f"HUNG{time.time_ns()}"
+    try:
+        owner = threading.Thread(target=quotes.get_quotes, args=([symbol],))
+        owner.start()
+        assert started.wait(2)
+
+        # 多於 worker 數的 waiter：每個都在 deadline 內放棄並釋出 worker
+        t0 = time.perf_counter()
+        for _ in range(quotes.QUOTE_FETCH_WORKERS + 2):
+            assert quotes.get_quotes_within([symbol], timeout=0.1) == {}
+        assert time.perf_counter() - t0 < 3
+
+        # waiter 在 deadline 放棄 → worker 已釋出，pool 還能接新工作
+        time.sleep(0.2)
+        assert quotes._fetch_pool.submit(lambda: "ok").result(timeout=1) == "ok"
+    finally:
+        release.set()
+        owner.join(2)
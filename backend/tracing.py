@@ -0,0 +1,271 @@
+# tracing.py — 每個 request 的 span tree + 慢 request 紀錄 + 取樣 profiler（預設關閉）
+#
+# 開啟：TRACE_ENABLED=1
+# - 每個 request 一棵 span tree：auth、每條 SQL、每次 yfinance / LLM / NewsAPI 呼叫
+# - 超過 TRACE_SLOW_MS 的 request → 存進記憶體 ring buffer（GET /debug/traces，限 TRACE_ADMIN_EMAILS 登入）
+#   並寫入 TRACE_FILE（JSONL；空字串 → 不寫檔）
+# - request header「X-Trace: 1」→ 不論快慢都保留
+# - TRACE_PROFILE_RATE 比例的 request 另外跑取樣 profiler（folded stacks，可直接餵 flamegraph）
+#
+# span 靠 contextvars 傳遞：run_blocking / iterate_blocking 內的工作會接在呼叫端的 span 底下。
+import collections
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "0").lower() in ("1", "true", "yes")
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "1000"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+# 取樣 profiler：多少比例的 request 要 profile、每隔幾毫秒取樣一次
+TRACE_PROFILE_RATE = float(os.getenv("TRACE_PROFILE_RATE", "0.0"))
+TRACE_PROFILE_INTERVAL_MS = float(os.getenv("TRACE_PROFILE_INTERVAL_MS", "5"))
+TRACE_PROFILE_MAX_STACKS = 50
+
+# SQL 太長只留前面
+SQL_TEXT_LIMIT = 200
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("trace_span", default=None)
+
+_buffer: "collections.deque[dict]" = collections.deque(maxlen=max(TRACE_BUFFER_SIZE, 1))
+_buffer_lock = threading.Lock()
+_file_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("trace", "name", "attrs", "start", "end", "children", "thread")
+
+    def __init__(self, trace: "Trace", name: str, attrs: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.thread = threading.current_thread().name
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        d = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "thread": self.thread,
+        }
+        if self.attrs:
+            d["attrs"] = self.attrs
+        if self.children:
+            d["children"] = [c.to_dict(origin) for c in sorted(self.children, key=lambda c: c.start)]
+        return d
+
+
+class Trace:
+    """一個 request 的所有 span（子 span 可能來自不同 thread → 加鎖）"""
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:16]
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.threads = {threading.get_ident()}
+        self.root = Span(self, name, attrs)
+        self.profile: Optional[Dict[str, Any]] = None
+
+    def add(self, parent: Span, child: Span):
+        with self.lock:
+            parent.children.append(child)
+            self.threads.add(threading.get_ident())
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return (end - self.root.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            d = {
+                "trace_id": self.id,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+                "duration_ms": round(self.duration_ms, 3),
+                "root": self.root.to_dict(self.root.start),
+            }
+        if self.profile:
+            d["profile"] = self.profile
+        return d
+
+
+def active() -> bool:
+    """目前是否在某個被追蹤的 request 裡（SQL wrapper 用來決定要不要包）"""
+    return _current.get() is not None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    with tracing.span("quotes", symbols=3):
+        ...
+    不在追蹤中的 request → 幾乎零成本的 no-op
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace, name, attrs)
+    parent.trace.add(parent, child)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _current.reset(token)
+
+
+def sql_text(sql: str) -> str:
+    text = " ".join(sql.split())
+    return text if len(text) <= SQL_TEXT_LIMIT else text[:SQL_TEXT_LIMIT] + "…"
+
+
+# ============================================================
+# 取樣 profiler：背景 thread 定期抓 sys._current_frames()
+# ============================================================
+
+class SamplingProfiler:
+    """
+    只取樣這個 trace 碰過的 thread（event loop thread + 跑過它 span 的 worker）。
+    event loop thread 由所有 request 共用，會混到同時間其他 request 的 stack。
+    """
+
+    def __init__(self, trace: Trace, interval: float):
+        self.trace = trace
+        self.interval = interval
+        self.stacks: Dict[str, int] = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Any]:
+        self._stop.set()
+        self._thread.join()
+        top = self.stacks.most_common(TRACE_PROFILE_MAX_STACKS)
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": [{"stack": stack, "count": count} for stack, count in top],
+        }
+
+    def _run(self):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            with self.trace.lock:
+                threads = set(self.trace.threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+
+# ============================================================
+# 慢 request 紀錄
+# ============================================================
+
+def _record(trace: Trace):
+    data = trace.to_dict()
+    with _buffer_lock:
+        _buffer.append(data)
+    if TRACE_FILE:
+        line = json.dumps(data, ensure_ascii=False, default=str)
+        try:
+            with _file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print("[tracing] write error:", e)
+
+
+def recent(limit: int = 20) -> List[Dict[str, Any]]:
+    """最近保留的 trace（新的在前）"""
+    with _buffer_lock:
+        items = list(_buffer)
+    return items[::-1][:limit]
+
+
+def get(trace_id: str) -> Optional[Dict[str, Any]]:
+    with _buffer_lock:
+        for item in _buffer:
+            if item["trace_id"] == trace_id:
+                return item
+    return None
+
+
+# ============================================================
+# ASGI middleware
+# ============================================================
+
+class TracingMiddleware:
+    """
+    TRACE_ENABLED 時每個 request 開一個 root span，回應加上 X-Trace-Id header；
+    結束時超過 TRACE_SLOW_MS（或 X-Trace: 1、或被 profile）→ 保留。
+    """
+
+    def __init__(self, app, routes_app=None):
+        self.app = app
+        self.routes_app = routes_app
+
+    async def __call__(self, scope, receive, send):
+        if not TRACE_ENABLED or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        import metrics  # 避免循環 import（metrics 也會開 span）
+
+        headers = dict(scope.get("headers") or [])
+        forced = headers.get(b"x-trace", b"").strip() in (b"1", b"true")
+        route = metrics.route_template(self.routes_app, scope)
+        trace = Trace(f"{scope['method']} {route}", {"path": scope.get("path", "")})
+
+        profiler = None
+        if TRACE_PROFILE_RATE > 0 and random.random() < TRACE_PROFILE_RATE:
+            profiler = SamplingProfiler(trace, TRACE_PROFILE_INTERVAL_MS / 1000)
+            profiler.start()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.root.attrs["status"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-trace-id", trace.id.encode())]
+            await send(message)
+
+        token = _current.set(trace.root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            trace.root.end = time.perf_counter()
+            if profiler:
+                trace.profile = profiler.stop()
+            if forced or profiler or trace.duration_ms >= TRACE_SLOW_MS:
+                _record(trace)
@@ -7,9 +7,11 @@ interface HoldingSummary {
   symbol: string;
   shares: number;
   avg_price: number;
-  current_price: number;
-  profit: number;
-  profit_rate: number;
+  current_price: number | null;   // null：完全沒有報價（不計入總額）
+  profit: number | null;
+  profit_rate: number | null;
+  price_stale?: boolean | null;    // true：報價逾時，用的是最後已知價格
+  price_age_seconds?: number | null;
 }
 
 interface PortfolioSummary {
@@ -17,9 +19,19 @@ interface PortfolioSummary {
   total_value: number;
   profit: number;
   profit_rate: number;
+  stale?: boolean;
+  unpriced?: string[];
   items: HoldingSummary[];
 }
 
+/** 報價年齡 → 「3 分鐘前」 */
+function formatAge(seconds: number) {
+  if (seconds < 60) return `${Math.round(seconds)} 秒前`;
+  if (seconds < 3600) return `${Math.round(seconds / 60)} 分鐘前`;
+  if (seconds < 86400) return `${Math.round(seconds / 3600)} 小時前`;
+  return `${Math.round(seconds / 86400)} 天前`;
+}
+
 export function PortfolioPage() {
   const [summary, setSummary] = useState<PortfolioSummary | null>(null);
   const [loading, setLoading] = useState(true);
@@ -119,6 +131,17 @@ export function PortfolioPage() {
               {summary.profit_rate.toFixed(2)}%）
             </span>
           </div>
+
+          {summary.stale && (
+            <div style={{ ...label, marginTop: 8 }}>
+              ⚠️ 部分報價延遲，以最後已知價格計算
+            </div>
+          )}
+          {!!summary.unpriced?.length && (
+            <div style={{ ...label, marginTop: 4 }}>
+              ⚠️ {summary.unpriced.join("、")} 暫無報價，未計入總額
+            </div>
+          )}
         </div>
       )}
 
@@ -131,7 +154,8 @@ export function PortfolioPage() {
 
       <div style={{ display: "flex", flexDirection: "column", gap: 14 }}>
         {summary?.items.map((h) => {
-          const isProfit = h.profit >= 0;
+          const isProfit = (h.profit ?? 0) >= 0;
+          const hasPrice = h.current_price !== null;
 
           return (
             <div key={h.symbol} className="ios-card" style={{ padding: 16 }}>
@@ -193,18 +217,27 @@ export function PortfolioPage() {
               >
                 <div>
                   <div style={label}>現價</div>
-                  <div>
-                    {h.current_price}{" "}
-                    <span
-                      style={{
-                        color: isProfit ? "#16a34a" : "#dc2626",
-                        fontWeight: 600,
-                      }}
-                    >
-                      ({isProfit ? "+" : ""}
-                      {h.profit_rate.toFixed(2)}%)
-                    </span>
-                  </div>
+                  {hasPrice ? (
+                    <div>
+                      {h.current_price}{" "}
+                      <span
+                        style={{
+                          color: isProfit ? "#16a34a" : "#dc2626",
+                          fontWeight: 600,
+                        }}
+                      >
+                        ({isProfit ? "+" : ""}
+                        {(h.profit_rate ?? 0).toFixed(2)}%)
+                      </span>
+                    </div>
+                  ) : (
+                    <div style={label}>暫無報價</div>
+                  )}
+                  {h.price_stale && h.price_age_seconds != null && (
+                    <div style={{ ...label, fontSize: 12 }}>
+                      延遲報價（{formatAge(h.price_age_seconds)}）
+                    </div>
+                  )}
                 </div>
 
                 <div style={{ textAlign: "right" }}>
@@ -216,8 +249,14 @@ export function PortfolioPage() {
                       color: isProfit ? "#16a34a" : "#dc2626",
                     }}
                   >
-                    {isProfit ? "+" : ""}
-                    {h.profit.toLocaleString()}
+                    {hasPrice ? (
+                      <>
+                        {isProfit ? "+" : ""}
+                        {(h.profit ?? 0).toLocaleString()}
+                      </>
+                    ) : (
+                      "—"
+                    )}
                   </div>
                 </div>
               </div>
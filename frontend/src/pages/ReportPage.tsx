@@ -24,6 +24,50 @@ interface DailyReport {
   personal_actions?: PersonalAction[]
 }
 
+/* ============================= */
+/* SSE 讀取（fetch + stream）     */
+/* ============================= */
+
+async function readEventStream(
+  path: string,
+  method: "GET" | "POST",
+  onEvent: (event: string, data: any) => void
+) {
+  const token = localStorage.getItem("token")
+  const res = await fetch(`${api.defaults.baseURL}${path}`, {
+    method,
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+  })
+  if (!res.ok || !res.body) {
+    throw new Error(`stream failed: ${res.status}`)
+  }
+
+  const reader = res.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ""
+
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    // SSE 以空行分隔每個事件
+    let sep
+    while ((sep = buffer.indexOf("\n\n")) >= 0) {
+      const chunk = buffer.slice(0, sep)
+      buffer = buffer.slice(sep + 2)
+
+      let event = "message"
+      let data = ""
+      for (const line of chunk.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim()
+        else if (line.startsWith("data:")) data += line.slice(5).trim()
+      }
+      if (data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
 /* ============================= */
 /* Component                     */
 /* ============================= */
@@ -33,6 +77,7 @@ export function ReportPage() {
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState("")
   const [regenerating, setRegenerating] = useState(false);
+  const [streamingActions, setStreamingActions] = useState(false)
 
   const regeneratePersonalAdvice = async () => {
   if (!confirm("確定要重新產生今日的個人化持股建議嗎？")) {
@@ -42,17 +87,27 @@ export function ReportPage() {
   try {
     setRegenerating(true);
 
-    const res = await api.post("/reports/personal/regenerate");
+    // GPT 每寫完一檔就顯示；完成後後端才一次寫入 DB
+    let actions: PersonalAction[] = [];
+    let failure = "";
+    setReport((prev) => (prev ? { ...prev, personal_actions: [] } : prev));
 
-    setReport((prev: any) => {
-      if (!prev) return prev;
-      return {
-        ...prev,
-        personal_actions: res.data.personal_actions,
-      };
+    await readEventStream("/reports/personal/regenerate/stream", "POST", (event, data) => {
+      if (event === "action") {
+        actions = [...actions, data];
+        setReport((prev) => (prev ? { ...prev, personal_actions: actions } : prev));
+      } else if (event === "error") {
+        failure = data.detail;
+      }
     });
+
+    if (failure) {
+      alert(failure);
+      await loadReport(); // DB 仍是舊的建議 → 重新載入
+    }
   } catch (err: any) {
-    alert(err.response?.data?.message || "重新產生失敗");
+    alert(err.message || "重新產生失敗");
+    await loadReport();
   } finally {
     setRegenerating(false);
   }
@@ -74,8 +129,49 @@ export function ReportPage() {
     }
   }
 
+  /* ============================= */
+  /* 串流載入（SSE）               */
+  /* 市場報告先顯示，個股建議逐筆補上 */
+  /* ============================= */
+  const streamReport = async () => {
+    setLoading(true)
+    setError("")
+    setStreamingActions(true)
+
+    // 市場報告可能比個股建議晚到 → 先暫存
+    let pendingActions: PersonalAction[] = []
+
+    const handleEvent = (event: string, data: any) => {
+      if (event === "report") {
+        setReport({ ...data, personal_actions: pendingActions })
+        setLoading(false)
+      } else if (event === "action") {
+        pendingActions = [...pendingActions, data]
+        setReport((prev) =>
+          prev ? { ...prev, personal_actions: pendingActions } : prev
+        )
+      } else if (event === "error") {
+        console.error("report stream error:", data)
+        if (data.part === "report") {
+          setError("載入今日報告失敗")
+        }
+      }
+    }
+
+    try {
+      await readEventStream("/reports/today/stream", "GET", handleEvent)
+    } catch (err) {
+      // ⚠️ 瀏覽器 / proxy 不支援串流 → 退回一次載入
+      console.error(err)
+      await loadReport()
+    } finally {
+      setLoading(false)
+      setStreamingActions(false)
+    }
+  }
+
   useEffect(() => {
-    loadReport()
+    streamReport()
   }, [])
 
   return (
@@ -86,8 +182,8 @@ export function ReportPage() {
           <h2 style={{ margin: 0 }}>📈 今日國際市場報告</h2>
           <button
             style={styles.refreshBtn}
-            onClick={loadReport}
-            disabled={loading}
+            onClick={streamReport}
+            disabled={loading || streamingActions}
           >
             {loading ? "更新中…" : "重新整理"}
           </button>
@@ -204,8 +300,16 @@ export function ReportPage() {
                   })}
                 </div>
               ) : (
+                !streamingActions && (
+                  <p style={{ fontSize: 14, color: "#6b7280" }}>
+                    尚未產生與你持股相關的操作建議。
+                  </p>
+                )
+              )}
+
+              {streamingActions && (
                 <p style={{ fontSize: 14, color: "#6b7280" }}>
-                  尚未產生與你持股相關的操作建議。
+                  AI 正在分析你的持股…
                 </p>
               )}
             </section>